@@ -0,0 +1,111 @@
+# api_keys.py - In-memory API key -> tenant map for stateless prediction requests
+import time
+import hashlib
+import secrets
+import threading
+import logging
+
+import config
+from database import SessionLocal, CompanyRequest
+
+logger = logging.getLogger(__name__)
+
+API_KEY_PREFIX = "esp_"
+
+
+def generate_api_key():
+    """Return a new random API key (shown to the company once)"""
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+def hash_api_key(api_key):
+    """Keys are stored as their SHA-256 hex digest, which fits CompanyRequest.api_key (64 chars)"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class ApiTenant:
+    """The parts of a CompanyRequest needed to serve a prediction without a DB query"""
+
+    __slots__ = ("company_id", "company_name", "model_filename", "model_accuracy", "key_hash")
+
+    def __init__(self, company_id, company_name, model_filename, model_accuracy, key_hash):
+        self.company_id = company_id
+        self.company_name = company_name
+        self.model_filename = model_filename
+        self.model_accuracy = model_accuracy
+        self.key_hash = key_hash
+
+
+class ApiKeyRegistry:
+    """
+    Maps hashed API keys to approved companies that have a trained model.
+    The whole map is loaded with one query and replaced atomically:
+    - after invalidate() (key issued/revoked, model retrained, company removed in this worker),
+    - every refresh_seconds, so changes made by other workers are picked up,
+    - on an unknown key, at most once per miss_refresh_seconds.
+    """
+
+    def __init__(self, refresh_seconds, miss_refresh_seconds=1.0):
+        self.refresh_seconds = refresh_seconds
+        self.miss_refresh_seconds = miss_refresh_seconds
+        self._tenants = {}
+        self._loaded_at = None
+        self._stale = True
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def resolve(self, api_key):
+        """Return the ApiTenant for a raw API key, or None"""
+        if not api_key:
+            return None
+        key_hash = hash_api_key(api_key)
+        now = time.monotonic()
+        if self._stale or self._loaded_at is None or now - self._loaded_at > self.refresh_seconds:
+            self.refresh()
+        tenant = self._tenants.get(key_hash)
+        if tenant is None and now - (self._loaded_at or 0) > self.miss_refresh_seconds:
+            # The key may have been issued by another worker since the last load
+            self.refresh()
+            tenant = self._tenants.get(key_hash)
+        return tenant
+
+    def refresh(self):
+        """Reload the key map from the database"""
+        with self._lock:
+            db = SessionLocal()
+            try:
+                rows = db.query(
+                    CompanyRequest.id, CompanyRequest.company_name, CompanyRequest.model_filename,
+                    CompanyRequest.model_accuracy, CompanyRequest.api_key
+                ).filter(
+                    CompanyRequest.api_key.isnot(None),
+                    CompanyRequest.status == "approved",
+                    CompanyRequest.model_filename.isnot(None)
+                ).all()
+                self._tenants = {
+                    row.api_key: ApiTenant(row.id, row.company_name, row.model_filename, row.model_accuracy, row.api_key)
+                    for row in rows
+                }
+                self._stale = False
+                self.refreshes += 1
+            except Exception as e:
+                # Keep serving the previous map; retry on the next lookup
+                logger.error(f"❌ Failed to refresh API keys: {e}")
+            finally:
+                self._loaded_at = time.monotonic()
+                db.close()
+
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        self._stale = True
+
+    def stats(self):
+        return {
+            'keys': len(self._tenants),
+            'refreshes': self.refreshes,
+            'refresh_seconds': self.refresh_seconds
+        }
+
+
+# Initialize API key registry
+api_key_registry = ApiKeyRegistry(config.API_KEY_REFRESH_SECONDS)
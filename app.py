@@ -1,17 +1,37 @@
 # app.py - FINAL CORRECTED VERSION
 # update test - force commit
-from flask import Flask, request, jsonify, send_from_directory, render_template, session, redirect, url_for, send_file
+from flask import Flask, request, jsonify, send_from_directory, render_template, session, redirect, url_for, send_file, Response, stream_with_context, g
 from joblib import load
 import pandas as pd
 import numpy as np
 import json
 from pathlib import Path
 import os
+import weakref
+import itertools
+import math
+import time
+import threading
 # Add these with your other imports
 from dataset_validator import DatasetValidator
 from dataset_history import dataset_manager
+from model_cache import model_cache, model_version
+from prediction_cache import prediction_cache, canonicalize_input
+from prediction_counter import prediction_counter
+from prediction_log import prediction_log_writer
+from compiled_model import load_compiled_model, COMPILED_MAX_ROWS
+from feature_encoder import FeatureEncoder, DERIVED_FEATURES, DERIVED_INPUTS
+from micro_batcher import MicroBatcher
+from api_keys import api_key_registry, generate_api_key, hash_api_key
+from warmup import model_warmup, warmup_record
+from input_validator import input_validators, options_path_for, PREDICTION_FIELDS, NUMERIC_PREDICTION_FIELDS
+from model_registry import model_registry, company_slug
+from json_cache import json_file_cache
+from upload_store import upload_store
+from training_jobs import training_jobs
+from training_executor import training_executor
 from automation_system import AutomationSystem, AutomationMode
-from database import get_db, CompanyRequest, CompanyUser, AdminUser  # Added AdminUser
+from database import get_db, SessionLocal, CompanyRequest, CompanyUser, AdminUser, CompanyDataset, TrainingJob  # Added AdminUser
 from sqlalchemy.orm import Session
 import secrets
 import string
@@ -86,6 +106,22 @@ def admin_login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def api_key_required(f):
+    """Decorator for server-to-server routes: resolves the API key to a tenant without touching the DB or session"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key')
+        if not api_key:
+            auth_header = request.headers.get('Authorization', '')
+            if auth_header.startswith('Bearer '):
+                api_key = auth_header[len('Bearer '):].strip()
+        tenant = api_key_registry.resolve(api_key)
+        if tenant is None:
+            return jsonify({"error": "Invalid or missing API key"}), 401
+        g.api_tenant = tenant
+        return f(*args, **kwargs)
+    return decorated_function
+
 def is_company_logged_in():
     """Check if company is logged in with session validation"""
     if not session.get('company_logged_in'):
@@ -116,6 +152,8 @@ def is_company_logged_in():
             session['company_request_id'] = company_request.id
             session['model_accuracy'] = company_request.model_accuracy
 
+        db.close()
+
         # Update session lifetime
         session.permanent = True
         app.permanent_session_lifetime = timedelta(hours=24)
@@ -162,23 +200,119 @@ def validate_dataset(file_path):
     except Exception as e:
         return False, f"Error reading dataset: {str(e)}"
 
-def load_company_model(company_id):
+def process_dataset_upload(file):
+    """
+    Validate and prepare an uploaded dataset CSV through the content-addressed upload store.
+    A byte-identical file that was processed before reuses its stored outcome and prepared blob.
+    Returns a dict with error/error_stage ('columns', 'processing', 'dataset'; None if usable),
+    quality_error, file_hash, file_size and records.
+    """
+    temp_path, raw_hash, raw_size = upload_store.stage(file)
+    try:
+        result = upload_store.processed(raw_hash)
+        if result is not None:
+            logger.info(f"♻️ Duplicate upload {raw_hash[:12]}: reusing stored dataset and validation result")
+            return result
+
+        result = {"raw_hash": raw_hash, "raw_size": raw_size, "error": None, "error_stage": None, "quality_error": None}
+
+        # 1. Validate Columns
+        valid, msg, mapping = DatasetValidator.validate_required_columns(temp_path)
+        if not valid:
+            return dict(result, error=msg, error_stage="columns")
+
+        # 2. Check Data Quality (enforced on new requests only)
+        quality_ok, quality_msg = DatasetValidator.check_data_quality(temp_path, mapping)
+        if not quality_ok:
+            result["quality_error"] = quality_msg
+
+        # 3. Standardize Headers
+        prepared_path = upload_store.temp_path()
+        try:
+            clean_df = DatasetValidator.prepare_mapped_dataset(temp_path, mapping)
+            clean_df.to_csv(prepared_path, index=False)
+        except Exception as e:
+            prepared_path.unlink(missing_ok=True)
+            # Not stored: may be transient
+            return dict(result, error=f"Dataset processing error: {e}", error_stage="processing")
+
+        is_valid, message = validate_dataset(prepared_path)
+        if not is_valid:
+            prepared_path.unlink(missing_ok=True)
+            return dict(result, error=message, error_stage="dataset")
+
+        result["records"] = len(clean_df)
+        return upload_store.record(raw_hash, result, prepared_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+def add_company_dataset(db, company_id, upload, original_filename, dataset_type, uploaded_by=None):
+    """Record a processed upload as the company's active dataset (a new reference to its blob)"""
+    db.query(CompanyDataset).filter(
+        CompanyDataset.company_id == company_id, CompanyDataset.is_active == True
+    ).update({CompanyDataset.is_active: False}, synchronize_session=False)
+    dataset = CompanyDataset(
+        company_id=company_id,
+        filename=original_filename,
+        file_path=upload_store.blob_name(upload["file_hash"]),
+        file_size=upload.get("file_size"),
+        records_count=upload.get("records"),
+        is_active=True,
+        dataset_type=dataset_type,
+        dataset_metadata=json.dumps({"raw_hash": upload["raw_hash"], "quality_warning": upload.get("quality_error")}),
+        uploaded_by=uploaded_by,
+        file_hash=upload["file_hash"]
+    )
+    db.add(dataset)
+    return dataset
+
+def delete_company_datasets(db, company_id):
+    """Delete a company's dataset rows; returns the blob hashes to release once committed"""
+    datasets = db.query(CompanyDataset).filter(CompanyDataset.company_id == company_id).all()
+    for dataset in datasets:
+        db.delete(dataset)
+    return {dataset.file_hash for dataset in datasets if dataset.file_hash}
+
+def load_cached_company_model(company_id):
+    """Return (CachedModel, message) holding the company pipeline and its compiled form"""
     try:
         db: Session = next(get_db())
         company_request = db.query(CompanyRequest).filter(CompanyRequest.id == company_id).first()
+        model_filename = company_request.model_filename if company_request else None
+        # Hand the connection back now; counts are no longer committed on this path
+        db.close()
 
-        if not company_request or not company_request.model_filename:
+        if not model_filename:
             return None, "Model not found"
 
-        model_path = config.COMPANY_MODELS_FOLDER / company_request.model_filename
+        # Active registry version; a publish or rollback changes the path and reloads the model
+        model_path = model_registry.resolve(model_filename)
         if not model_path.exists():
             return None, "Model file not found"
 
-        company_model = load(model_path)
-        return company_model, "Success"
+        # Served from the in-process cache; reloaded only after a retrain
+        return model_cache.get(company_id, model_path), "Success"
     except Exception as e:
         return None, f"Error loading model: {str(e)}"
 
+def load_company_model(company_id):
+    cached, message = load_cached_company_model(company_id)
+    return (cached.model if cached else None), message
+
+def cached_json_response(entry):
+    """Send a CachedJson body as is: gzipped when the client accepts it, 304 if its ETag matches"""
+    if entry.etag in request.if_none_match:
+        response = Response(status=304)
+    elif 'gzip' in request.accept_encodings:
+        response = Response(entry.gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 def get_enhanced_default_options():
     """Enhanced default options with comprehensive data"""
     return {
@@ -386,40 +520,93 @@ def send_company_credentials(company_request, username, password):
         logger.error(f"send_company_credentials error: {e}")
         return False
 
-# --- Load Artifacts ---
 # --- Load Artifacts ---
 try:
-    # Attempt to load the model
-    model = load(MODEL_PATH)
-    
     with open(OPTIONS_PATH, "r") as f:
         options = json.load(f)
     with open(METADATA_PATH, "r") as f:
         metadata = json.load(f)
-        
-    print("✅ Model and metadata loaded successfully.")
     print(f"📊 Model expects {len(metadata.get('numeric_cols', []))} numeric and {len(metadata.get('categorical_cols', []))} categorical features")
 
 except (FileNotFoundError, Exception) as e:
-    # Catching generic Exception handles the KeyError: 118 (corruption)
-    print(f"❌ Error loading model artifacts: {e}")
-    print("⚠️  The system will start in LIMITED mode. Please run 'python train.py' to generate/fix the model.")
-    
+    print(f"❌ Error loading model metadata: {e}")
+
     # Create dummy data to prevent crashes so the server still runs
     options = {"categorical": {}, "numeric_meta": {}}
     metadata = {"numeric_cols": [], "categorical_cols": [], "model_name": "Demo"}
-    model = None
+
+# Main model and its fast inference paths; filled in by load_main_model()
+model = None
+compiled_model = None
+main_model_version = None
+feature_encoder = None
+
+def load_main_model():
+    """Load the main pipeline plus its compiled engine / fast encoder into the module globals"""
+    global model, compiled_model, main_model_version, feature_encoder
+    try:
+        loaded_model = load(MODEL_PATH)
+    except Exception as e:
+        # Catching generic Exception handles the KeyError: 118 (corruption)
+        print(f"❌ Error loading model artifacts: {e}")
+        print("⚠️  The system will start in LIMITED mode. Please run 'python train.py' to generate/fix the model.")
+        return None
+
+    mtime_ns = MODEL_PATH.stat().st_mtime_ns
+    # Compiled (pure NumPy) form of the main model, if train.py could produce one
+    loaded_compiled = load_compiled_model(MODEL_PATH, mtime_ns)
+    if loaded_compiled is not None:
+        print("⚡ Compiled inference engine loaded for main model.")
+
+    # Publish the fast paths before the model itself so requests never mix versions
+    compiled_model = loaded_compiled
+    feature_encoder = loaded_compiled.encoder if loaded_compiled is not None else FeatureEncoder.from_pipeline(loaded_model)
+    # Version of the main model used to key cached predictions
+    main_model_version = model_version(MODEL_PATH, mtime_ns)
+    model = loaded_model
+    print("✅ Model and metadata loaded successfully.")
+    return model
+
+# With warm-up enabled the main model is loaded on the warm-up thread instead of at import
+if not config.WARMUP_ENABLED:
+    load_main_model()
 
 # ---------------------------
 # NEW: Helper to prepare input
 # ---------------------------
+# Expected feature order per loaded model, resolved once from feature_names_in_
+_expected_features_cache = weakref.WeakKeyDictionary()
+
+def _numeric_column(df, col):
+    """Return a column as a float64 array; unparseable values become NaN, a missing column is all 0"""
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=np.float64)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+def get_model_feature_names(model_obj):
+    """Return the model's feature_names_in_ as a list of str (or None), cached per model object"""
+    try:
+        return _expected_features_cache[model_obj]
+    except (KeyError, TypeError):
+        pass
+
+    # sklearn estimators or pipelines often expose feature_names_in_
+    expected = getattr(model_obj, "feature_names_in_", None)
+    if expected is not None:
+        expected = [str(x) for x in expected]
+    try:
+        _expected_features_cache[model_obj] = expected
+    except TypeError:
+        pass  # object does not support weak references
+    return expected
+
 def prepare_input_for_model(input_df, model_obj=None, metadata_obj=None):
     """
     Ensure input_df contains all columns the model expects.
-    - If model_obj has .feature_names_in_, use that.
+    - If model_obj has .feature_names_in_, use that (resolved once per model).
     - Else, try to use metadata_obj['feature_names'] (if available).
     - For missing features:
-        * If derivable (experience_squared, age_experience_ratio), compute them.
+        * If derivable (experience_squared, age_experience_ratio), compute them column-wise.
         * Else fill with median from metadata if available, else 0.
     - Reorder columns to match expected order.
     Returns the prepared DataFrame.
@@ -429,10 +616,7 @@ def prepare_input_for_model(input_df, model_obj=None, metadata_obj=None):
     # Determine expected features
     expected = None
     if model_obj is not None:
-        # sklearn estimators or pipelines often expose feature_names_in_
-        expected = getattr(model_obj, "feature_names_in_", None)
-        if expected is not None:
-            expected = list(expected)
+        expected = get_model_feature_names(model_obj)
 
     if expected is None and metadata_obj is not None:
         # metadata may contain numeric_cols + categorical_cols or a combined list
@@ -440,41 +624,21 @@ def prepare_input_for_model(input_df, model_obj=None, metadata_obj=None):
             expected = list(metadata_obj["feature_names"])
         else:
             expected = list(metadata_obj.get("numeric_cols", [])) + list(metadata_obj.get("categorical_cols", []))
+        expected = [str(x) for x in expected]
 
     # If still not available, just use columns present in df
     if expected is None:
-        expected = list(df.columns)
-
-    expected = [str(x) for x in expected]
-
-    # Known derivable features mapping
-    # If your training pipeline created other engineered features, add them here with generator funcs
-    def derive_experience_squared(row):
-        try:
-            return float(row.get("experience", 0)) ** 2
-        except Exception:
-            return 0.0
-
-    def derive_age_experience_ratio(row):
-        try:
-            exp = float(row.get("experience", 0))
-            age = float(row.get("age", 0))
-            return age / (exp + 1.0)  # +1 to avoid divide-by-zero
-        except Exception:
-            return 0.0
-
-    # Compute derivable columns if missing
-    derivable_map = {
-        "experience_squared": derive_experience_squared,
-        "age_experience_ratio": derive_age_experience_ratio
-    }
+        expected = [str(x) for x in df.columns]
 
     missing = [col for col in expected if col not in df.columns]
 
     # If columns are missing but derivable, compute them
-    for col in list(missing):
-        if col in derivable_map:
-            df[col] = df.apply(lambda r: derivable_map[col](r), axis=1)
+    derivable = [col for col in missing if col in DERIVED_FEATURES]
+    if derivable:
+        inputs = {col: _numeric_column(df, col) for col in DERIVED_INPUTS}
+        for col in derivable:
+            derive, _ = DERIVED_FEATURES[col]
+            df[col] = derive(inputs, len(df))
             missing.remove(col)
 
     # For any remaining missing columns, fill with median from metadata (if present) or 0
@@ -503,6 +667,227 @@ def prepare_input_for_model(input_df, model_obj=None, metadata_obj=None):
 
     return df
 
+def validate_prediction_input(data):
+    """
+    Validate a single prediction record.
+    Returns (input_data, error) where input_data holds only the prediction fields
+    in the expected order with numeric fields converted to float.
+    """
+    if not isinstance(data, dict):
+        return None, "Record must be a JSON object"
+
+    missing_fields = [field for field in PREDICTION_FIELDS if field not in data or data[field] is None or data[field] == '']
+    if missing_fields:
+        return None, f"Missing required fields: {', '.join(missing_fields)}"
+
+    input_data = {}
+    for field in PREDICTION_FIELDS:
+        if field in NUMERIC_PREDICTION_FIELDS:
+            try:
+                input_data[field] = float(data[field])
+            except (ValueError, TypeError):
+                return None, f"Invalid value for {field}. Must be a number."
+        else:
+            input_data[field] = str(data[field])
+    return input_data, None
+
+def validate_model_input(options_path, data):
+    """
+    Validate a record with the validator compiled from a model's options.json
+    (known categories, numeric ranges); falls back to the generic checks without one.
+    """
+    validator = input_validators.get(options_path)
+    if validator is None:
+        return validate_prediction_input(data)
+    return validator.validate(data)
+
+def parse_sweep_axes(axes, company_options=None):
+    """
+    Parse the axes of a what-if sweep.
+    Each axis is {"field", "values": [...]} or, for numeric fields, {"field", "start", "stop", "step"};
+    a categorical axis without values sweeps every option the company model knows.
+    Returns (axes as [(field, values)], error).
+    """
+    if not isinstance(axes, list) or not 1 <= len(axes) <= 2:
+        return None, "Provide one or two axes to vary"
+
+    parsed = []
+    for axis in axes:
+        field = axis.get("field") if isinstance(axis, dict) else None
+        if field not in PREDICTION_FIELDS:
+            return None, f"Axis field must be one of: {', '.join(PREDICTION_FIELDS)}"
+        if any(field == other for other, _ in parsed):
+            return None, f"Field '{field}' is used by both axes"
+
+        if field in NUMERIC_PREDICTION_FIELDS:
+            if "values" in axis:
+                try:
+                    values = [float(v) for v in axis["values"]]
+                except (TypeError, ValueError):
+                    return None, f"Values for {field} must be numbers"
+                if not all(math.isfinite(v) for v in values):
+                    return None, f"Values for {field} must be finite numbers"
+            else:
+                try:
+                    start, stop, step = float(axis["start"]), float(axis["stop"]), float(axis.get("step", 1))
+                except (KeyError, TypeError, ValueError):
+                    return None, f"Numeric axis '{field}' needs start, stop and step (or values)"
+                if not all(math.isfinite(v) for v in (start, stop, step)):
+                    return None, f"Numeric axis '{field}' needs finite start, stop and step"
+                if step <= 0 or stop < start:
+                    return None, f"Numeric axis '{field}' needs step > 0 and stop >= start"
+                count = int(np.floor((stop - start) / step + 1e-9)) + 1
+                if count > config.SWEEP_MAX_POINTS:
+                    return None, f"Sweep too large: more than {config.SWEEP_MAX_POINTS} points"
+                values = np.round(start + np.arange(count) * step, 10).tolist()
+        else:
+            values = axis.get("values")
+            if values is None:
+                values = (company_options or {}).get("categorical", {}).get(field, [])
+            if not isinstance(values, list):
+                return None, f"Values for {field} must be a list"
+            values = [str(v) for v in values]
+
+        if not values:
+            return None, f"Axis '{field}' has no values"
+        parsed.append((field, values))
+
+    points = int(np.prod([len(values) for _, values in parsed]))
+    if points > config.SWEEP_MAX_POINTS:
+        return None, f"Sweep too large: {points} points (maximum {config.SWEEP_MAX_POINTS})"
+    return parsed, None
+
+def validate_sweep_axes(options_path, base, axes):
+    """
+    Validate a sweep's base record and every axis value with the model's input validator:
+    categories are normalized to the model's spelling, numbers range-checked, and unknown
+    values rejected (strict mode). Each value is checked once, not once per grid point.
+    Returns (base_input, axes, error).
+    """
+    base_input, error = validate_model_input(options_path, dict(base, **{field: values[0] for field, values in axes}))
+    if error:
+        return None, None, error
+
+    validated = []
+    for field, values in axes:
+        normalized = []
+        for value in values:
+            record, error = validate_model_input(options_path, dict(base_input, **{field: value}))
+            if error:
+                return None, None, error
+            normalized.append(record[field])
+        validated.append((field, normalized))
+    return base_input, validated, None
+
+def score_csv_chunk(chunk, column_mapping, model_obj, compiled=None, lookup=None):
+    """
+    Score one chunk of an uploaded CSV.
+    column_mapping maps standard field names -> CSV headers.
+    Rows with missing/invalid fields get NaN. Returns (predictions, scored_count).
+    """
+    features = pd.DataFrame({field: chunk[column_mapping[field]] for field in PREDICTION_FIELDS})
+    valid = features.notna().all(axis=1)
+    for field in NUMERIC_PREDICTION_FIELDS:
+        features[field] = pd.to_numeric(features[field], errors='coerce')
+        valid &= features[field].notna()
+    for field in PREDICTION_FIELDS:
+        if field not in NUMERIC_PREDICTION_FIELDS:
+            features[field] = features[field].astype(str)
+
+    predictions = np.full(len(chunk), np.nan)
+    valid_mask = valid.to_numpy()
+    scored = int(valid_mask.sum())
+    if lookup is not None and valid_mask.any():
+        # Rows on the precomputed grid need no model call
+        columns = {field: features[field].to_numpy()[valid_mask] for field in PREDICTION_FIELDS}
+        looked_up = lookup.lookup_columns(columns, int(valid_mask.sum()))
+        predictions[valid_mask] = looked_up
+        valid_mask = valid_mask.copy()
+        valid_mask[np.flatnonzero(valid_mask)[~np.isnan(looked_up)]] = False
+    if valid_mask.any():
+        if compiled is not None and (valid_mask.sum() <= COMPILED_MAX_ROWS or not compiled.matches_pipeline):
+            columns = {field: features[field].to_numpy()[valid_mask] for field in PREDICTION_FIELDS}
+            predictions[valid_mask] = compiled.predict_columns(columns)
+        else:
+            prepared = prepare_input_for_model(features[valid_mask], model_obj=model_obj, metadata_obj=metadata)
+            predictions[valid_mask] = model_obj.predict(prepared)
+    return predictions, scored
+
+def predict_record(model_obj, record, compiled=None, encoder=None):
+    """
+    Predict a single record dict.
+    Prefers the compiled engine, then the fast encoder + fitted regressor,
+    and falls back to the pandas pipeline path.
+    """
+    if compiled is not None:
+        return compiled.predict_one(record)
+    if encoder is not None:
+        return float(model_obj.named_steps["regressor"].predict(encoder.encode_row(record))[0])
+
+    prepared = prepare_input_for_model(pd.DataFrame([record]), model_obj=model_obj, metadata_obj=metadata)
+    if prepared.shape[1] == 0:
+        raise ValueError("Prepared input is empty; cannot predict.")
+    return float(model_obj.predict(prepared)[0])
+
+def predict_records(model_obj, records, compiled=None, encoder=None, lookup=None):
+    """
+    Predict a list of record dicts.
+    Rows on a precomputed lookup grid are answered from it; of the rest, small batches use
+    the compiled NumPy engine when available, large ones the sklearn pipeline.
+    """
+    if lookup is not None and not any(name in record for record in records for name in lookup.imputed_inputs):
+        columns = {field: [record.get(field) for record in records] for field in PREDICTION_FIELDS}
+        predictions = lookup.lookup_columns(columns, len(records))
+        missing = np.flatnonzero(np.isnan(predictions))
+        if len(missing):
+            predictions[missing] = predict_records(
+                model_obj, [records[i] for i in missing], compiled=compiled, encoder=encoder
+            )
+        return predictions
+
+    # A depth-limited (compacted) artifact is the model of record, so it serves every size
+    if compiled is not None and (len(records) <= COMPILED_MAX_ROWS or not compiled.matches_pipeline):
+        return compiled.predict_records(records)
+    if encoder is not None:
+        return model_obj.named_steps["regressor"].predict(encoder.encode_records(records))
+
+    prepared = prepare_input_for_model(pd.DataFrame(records), model_obj=model_obj, metadata_obj=metadata)
+    if prepared.shape[1] == 0:
+        raise ValueError("Prepared input is empty; cannot predict.")
+    return model_obj.predict(prepared)
+
+def predict_company_record(cached, record):
+    """
+    Predict one record with a cached company model:
+    precomputed lookup grid first, then the micro-batcher (if enabled) or the direct fast path.
+    """
+    if cached.lookup is not None:
+        prediction = cached.lookup.lookup(record)
+        if prediction is not None:
+            return prediction
+    batcher = get_micro_batcher(cached)
+    if batcher is not None:
+        # Coalesced with concurrent requests into one vectorized predict
+        return batcher.predict(record)
+    return predict_record(cached.model, record, compiled=cached.compiled, encoder=cached.encoder)
+
+_batcher_lock = threading.Lock()
+
+def get_micro_batcher(cached):
+    """Return the MicroBatcher for a cached company model, or None if micro-batching is disabled"""
+    if config.MICRO_BATCH_WINDOW_MS <= 0:
+        return None
+    if cached.batcher is None:
+        with _batcher_lock:
+            if cached.batcher is None:
+                cached.batcher = MicroBatcher(
+                    lambda records: predict_records(cached.model, records, compiled=cached.compiled, encoder=cached.encoder),
+                    lambda record: predict_record(cached.model, record, compiled=cached.compiled, encoder=cached.encoder),
+                    config.MICRO_BATCH_WINDOW_MS / 1000.0,
+                    config.MICRO_BATCH_MAX_SIZE
+                )
+    return cached.batcher
+
 # --- Routes ---
 @app.route('/')
 def index():
@@ -650,34 +1035,14 @@ def submit_company_request():
         if not file.filename.lower().endswith('.csv'):
             return jsonify({"error": "Only CSV files are allowed"}), 400
 
-        filename = f"{company_name.replace(' ', '_')}_{secrets.token_hex(8)}.csv"
-        file_path = config.UPLOAD_FOLDER / filename
-        file.save(file_path)
-        
-        # --- VALIDATOR ADDITION START ---
-        # 1. Validate Columns
-        valid, msg, mapping = DatasetValidator.validate_required_columns(file_path)
-        if not valid:
-            file_path.unlink() # Delete invalid file
-            return jsonify({"error": msg}), 400
-        
-        # 2. Check Data Quality
-        quality_ok, quality_msg = DatasetValidator.check_data_quality(file_path, mapping)
-        if not quality_ok:
-            file_path.unlink()
-            return jsonify({"error": f"Data Quality: {quality_msg}"}), 400
-        # 3. Standardize Headers
-        try:
-            clean_df = DatasetValidator.prepare_mapped_dataset(file_path, mapping)
-            clean_df.to_csv(file_path, index=False)
-        except Exception as e:
-            file_path.unlink()
-            return jsonify({"error": f"Dataset processing error: {e}"}), 500
-        
-        is_valid, message = validate_dataset(file_path)
-        if not is_valid:
-            file_path.unlink(missing_ok=True)
-            return jsonify({"error": message}), 400
+        # Stored by content hash; a resubmitted file reuses its earlier validation
+        upload = process_dataset_upload(file)
+        if upload["error_stage"] == "processing":
+            return jsonify({"error": upload["error"]}), 500
+        if upload["error"]:
+            return jsonify({"error": upload["error"]}), 400
+        if upload["quality_error"]:
+            return jsonify({"error": f"Data Quality: {upload['quality_error']}"}), 400
 
         db: Session = next(get_db())
         company_request = CompanyRequest(
@@ -685,12 +1050,14 @@ def submit_company_request():
             contact_person=contact_person,
             email=email,
             phone=phone,
-            dataset_filename=filename,
+            dataset_filename=upload_store.blob_name(upload["file_hash"]),
             status="pending"
         )
         db.add(company_request)
         db.commit()
         db.refresh(company_request)
+        add_company_dataset(db, company_request.id, upload, file.filename, "original", uploaded_by=contact_person)
+        db.commit()
 
         send_admin_notification(company_request, db)
 
@@ -779,17 +1146,14 @@ def get_company_options():
             return jsonify({'error': 'Company not found in session'}), 401
 
         # Load company-specific options
-        options_filename = f"{company_name.replace(' ', '_').lower()}_options.json"
-        options_path = config.COMPANY_MODELS_FOLDER / options_filename
+        options_path = model_registry.artifact_path(company_name, "_options.json")
 
-        logger.info(f"🔍 Looking for options file: {options_path}")
-
-        if options_path.exists():
-            with open(options_path, 'r') as f:
-                options_data = json.load(f)
-            logger.info(f"✅ Loaded company-specific options for {company_name}")
-            return jsonify(options_data)
+        # Parsed and pre-serialized once per options file version
+        options_entry = json_file_cache.entry(options_path)
+        if options_entry is not None:
+            return cached_json_response(options_entry)
         else:
+            logger.info(f"🔍 Options file not found: {options_path}")
             # Try to extract from dataset if present
             db: Session = next(get_db())
             company_request = db.query(CompanyRequest).filter(CompanyRequest.company_name == company_name).first()
@@ -1168,44 +1532,58 @@ def get_company_datasets_history_route():
 def download_company_dataset_route(dataset_id):
     """Download a specific historical dataset"""
     try:
-        path = dataset_manager.download_dataset(session.get('company_name'), dataset_id)
+        path, download_name = dataset_manager.download_dataset(session.get('company_name'), dataset_id)
         if path and path.exists():
-            return send_file(path, as_attachment=True, download_name=path.name, mimetype='text/csv')
+            return send_file(path, as_attachment=True, download_name=download_name, mimetype='text/csv')
         return jsonify({"error": "File not found"}), 404
     except Exception as e:
         logger.error(f"Error downloading dataset: {e}")
         return jsonify({"error": "Download error"}), 500
 
+# --- COMPANY PREDICTION ROUTES ---
+
 @app.route('/api/company/predict', methods=['POST'])
 @company_login_required
 def company_predict():
     try:
         data = request.get_json()
         company_request_id = session.get('company_request_id')
-        company_model, message = load_company_model(company_request_id)
-        if not company_model:
+        cached, message = load_cached_company_model(company_request_id)
+        if not cached:
             return jsonify({"error": message}), 400
 
-        # Build input dataframe from provided json data
-        input_df = pd.DataFrame([data])
-
-        # Prepare the input to match the model's expected features
-        prepared = prepare_input_for_model(input_df, model_obj=company_model, metadata_obj=metadata)
+        request_started = time.perf_counter()
 
-        # If prepared has zero columns, return error
-        if prepared.shape[1] == 0:
-            return jsonify({"error": "Prepared input is empty; cannot predict."}), 400
+        # Rejected or normalized before any model work
+        input_data, error = validate_model_input(options_path_for(cached.model_path), data)
+        if error:
+            return jsonify({"error": error}), 400
 
-        # Make prediction
-        prediction = company_model.predict(prepared)
-
-        # Update predictions count in database
-        db: Session = next(get_db())
-        company_request = db.query(CompanyRequest).filter(CompanyRequest.id == company_request_id).first()
-        if company_request:
-            company_request.predictions_count = (company_request.predictions_count or 0) + 1
-            company_request.updated_at = datetime.now(timezone.utc)
-            db.commit()
+        # Repeated form submissions are served from the result cache
+        model_id = f"company:{company_request_id}"
+        input_key = canonicalize_input(input_data, PREDICTION_FIELDS, NUMERIC_PREDICTION_FIELDS)
+        cached_prediction = prediction_cache.get(model_id, cached.version, input_key)
+        if cached_prediction is not None:
+            prediction = [cached_prediction]
+        else:
+            # Compiled engine / fast encoder predict straight from the validated dict
+            started = time.perf_counter()
+            try:
+                prediction = [predict_company_record(cached, input_data)]
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            prediction_cache.put(model_id, cached.version, input_key, float(prediction[0]), time.perf_counter() - started)
+
+        # Buffered; flushed to predictions_count in bulk
+        prediction_counter.increment(company_request_id)
+        prediction_log_writer.log(
+            company_request_id,
+            input_data,
+            {"predicted_salary": float(prediction[0])},
+            model_version=cached.version,
+            processing_time=time.perf_counter() - request_started,
+            ip_address=request.remote_addr
+        )
 
         return jsonify({
             "predicted_salary": float(prediction[0]),
@@ -1219,6 +1597,328 @@ def company_predict():
         traceback.print_exc()
         return jsonify({"error": f"Prediction error: {str(e)}"}), 500
 
+@app.route('/api/company/predict/batch', methods=['POST'])
+@company_login_required
+def company_predict_batch():
+    """Score a JSON array of employee records with a single model call"""
+    try:
+        records = request.get_json()
+        if not isinstance(records, list) or not records:
+            return jsonify({"error": "Request body must be a non-empty JSON array of records"}), 400
+
+        max_records = config.BATCH_PREDICT_MAX_RECORDS
+        if len(records) > max_records:
+            return jsonify({"error": f"Batch too large: {len(records)} records (maximum {max_records})"}), 400
+
+        company_request_id = session.get('company_request_id')
+        cached, message = load_cached_company_model(company_request_id)
+        if not cached:
+            return jsonify({"error": message}), 400
+
+        # Validate every record up front; invalid rows are reported, not predicted
+        options_path = options_path_for(cached.model_path)
+        results = [None] * len(records)
+        valid_rows = []
+        valid_indexes = []
+        for index, record in enumerate(records):
+            input_data, error = validate_model_input(options_path, record)
+            if error:
+                results[index] = {"index": index, "error": error}
+            else:
+                valid_rows.append(input_data)
+                valid_indexes.append(index)
+
+        if valid_rows:
+            started = time.perf_counter()
+            predictions = predict_records(cached.model, valid_rows, compiled=cached.compiled, encoder=cached.encoder, lookup=cached.lookup)
+            per_row_seconds = (time.perf_counter() - started) / len(valid_rows)
+            for index, input_data, prediction in zip(valid_indexes, valid_rows, predictions):
+                results[index] = {"index": index, "predicted_salary": float(prediction)}
+                prediction_log_writer.log(
+                    company_request_id, input_data, {"predicted_salary": float(prediction)},
+                    model_version=cached.version, processing_time=per_row_seconds,
+                    ip_address=request.remote_addr
+                )
+
+            # One counter increment for the whole batch
+            prediction_counter.increment(company_request_id, len(valid_rows))
+
+        return jsonify({
+            "results": results,
+            "total": len(records),
+            "succeeded": len(valid_rows),
+            "failed": len(records) - len(valid_rows),
+            "model_accuracy": session.get('model_accuracy', 0.85),
+            "company_name": session.get('company_name', 'Your Company')
+        })
+
+    except Exception as e:
+        logger.error(f"❌ Batch prediction error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": f"Batch prediction error: {str(e)}"}), 500
+
+@app.route('/api/company/predict/sweep', methods=['POST'])
+@company_login_required
+def company_predict_sweep():
+    """
+    What-if sweep: vary one or two fields of a base profile over a grid and predict
+    every point in a single vectorized model call (for salary curves/heatmaps).
+    """
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object with 'base' and 'axes'"}), 400
+
+        company_request_id = session.get('company_request_id')
+        cached, message = load_cached_company_model(company_request_id)
+        if not cached:
+            return jsonify({"error": message}), 400
+
+        axes, error = parse_sweep_axes(data.get("axes"), train_company.get_company_options(session.get('company_name')))
+        if error:
+            return jsonify({"error": error}), 400
+
+        # The base profile must be complete once the swept fields are filled in; every swept value is validated too
+        base = data.get("base") if isinstance(data.get("base"), dict) else {}
+        base_input, axes, error = validate_sweep_axes(options_path_for(cached.model_path), base, axes)
+        if error:
+            return jsonify({"error": error}), 400
+
+        grid = itertools.product(*[values for _, values in axes])
+        fields = [field for field, _ in axes]
+        records = [dict(base_input, **dict(zip(fields, point))) for point in grid]
+        predictions = predict_records(cached.model, records, compiled=cached.compiled, encoder=cached.encoder, lookup=cached.lookup)
+
+        shape = [len(values) for _, values in axes]
+        prediction_counter.increment(company_request_id, len(records))
+
+        return jsonify({
+            "base": base_input,
+            "axes": [{"field": field, "values": values} for field, values in axes],
+            "predictions": np.asarray(predictions, dtype=np.float64).reshape(shape).tolist(),
+            "points": len(records),
+            "model_version": cached.version
+        })
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Sweep prediction error: {e}")
+        return jsonify({"error": f"Sweep prediction error: {str(e)}"}), 500
+
+@app.route('/api/company/predict/csv', methods=['POST'])
+@company_login_required
+def company_predict_csv():
+    """Score an uploaded employee CSV and stream it back with a predicted_salary column"""
+    try:
+        file = request.files.get('dataset')
+        if not file or not file.filename.lower().endswith('.csv'):
+            return jsonify({"error": "Valid CSV file required"}), 400
+
+        company_request_id = session.get('company_request_id')
+        cached, message = load_cached_company_model(company_request_id)
+        if not cached:
+            return jsonify({"error": message}), 400
+
+        # Spool the upload to disk so it outlives the request body while the response streams
+        temp_path = config.UPLOAD_FOLDER / f"scoring_{secrets.token_hex(8)}.csv"
+        file.save(temp_path)
+        reader = None
+
+        def cleanup():
+            # Idempotent: runs from the generator and again when the response is closed
+            if reader is not None:
+                reader.close()
+            temp_path.unlink(missing_ok=True)
+
+        # Read the first chunk eagerly so header problems are reported as JSON errors
+        try:
+            reader = pd.read_csv(temp_path, chunksize=config.CSV_SCORING_CHUNK_SIZE)
+            first_chunk = next(reader)
+            valid, msg, column_mapping = DatasetValidator.map_prediction_columns(first_chunk.columns)
+        except (StopIteration, pd.errors.EmptyDataError):
+            cleanup()
+            return jsonify({"error": "Dataset is empty"}), 400
+        except Exception:
+            cleanup()
+            raise
+
+        if not valid:
+            cleanup()
+            return jsonify({"error": msg}), 400
+
+        def generate():
+            scored = 0
+            try:
+                for chunk_number, chunk in enumerate(itertools.chain([first_chunk], reader)):
+                    predictions, count = score_csv_chunk(chunk, column_mapping, cached.model, compiled=cached.compiled, lookup=cached.lookup)
+                    chunk['predicted_salary'] = predictions
+                    scored += count
+                    yield chunk.to_csv(index=False, header=(chunk_number == 0))
+            except Exception as e:
+                logger.error(f"❌ CSV scoring error after {scored} rows: {e}")
+                raise
+            finally:
+                cleanup()
+                # Count every row that was actually scored, even if the stream was cut short
+                if scored:
+                    prediction_counter.increment(company_request_id, scored)
+                    logger.info(f"📄 Scored {scored} CSV rows for company {company_request_id}")
+
+        download_name = f"{Path(file.filename).stem}_scored.csv"
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/csv',
+            headers={"Content-Disposition": f"attachment; filename={download_name}"}
+        )
+        # The generator's finally never runs if the client goes away before streaming starts
+        response.call_on_close(cleanup)
+        return response
+
+    except Exception as e:
+        logger.error(f"❌ CSV scoring error: {e}")
+        return jsonify({"error": f"CSV scoring error: {str(e)}"}), 500
+
+# --- API KEY ROUTES ---
+
+@app.route('/api/v1/predict', methods=['POST'])
+@api_key_required
+def api_predict():
+    """
+    Stateless prediction API for server-to-server use (X-API-Key or Bearer header).
+    Accepts one record or a JSON array of records; no session or DB lookups on this path.
+    """
+    try:
+        tenant = g.api_tenant
+        data = request.get_json(silent=True)
+        single = isinstance(data, dict)
+        records = [data] if single else data
+        if not isinstance(records, list) or not records:
+            return jsonify({"error": "Request body must be a JSON record or a non-empty array of records"}), 400
+
+        max_records = config.BATCH_PREDICT_MAX_RECORDS
+        if len(records) > max_records:
+            return jsonify({"error": f"Batch too large: {len(records)} records (maximum {max_records})"}), 400
+
+        try:
+            cached = model_cache.get(tenant.company_id, model_registry.resolve(tenant.model_filename))
+        except FileNotFoundError:
+            return jsonify({"error": "Model file not found"}), 400
+
+        request_started = time.perf_counter()
+
+        options_path = options_path_for(cached.model_path)
+        if single:
+            input_data, error = validate_model_input(options_path, data)
+            if error:
+                return jsonify({"error": error}), 400
+
+            model_id = f"company:{tenant.company_id}"
+            input_key = canonicalize_input(input_data, PREDICTION_FIELDS, NUMERIC_PREDICTION_FIELDS)
+            prediction = prediction_cache.get(model_id, cached.version, input_key)
+            if prediction is None:
+                prediction = predict_company_record(cached, input_data)
+                prediction_cache.put(model_id, cached.version, input_key, float(prediction), time.perf_counter() - request_started)
+
+            prediction_counter.increment(tenant.company_id)
+            prediction_log_writer.log(
+                tenant.company_id, input_data, {"predicted_salary": float(prediction)},
+                model_version=cached.version, processing_time=time.perf_counter() - request_started,
+                api_key_used=tenant.key_hash, ip_address=request.remote_addr
+            )
+            return jsonify({
+                "predicted_salary": float(prediction),
+                "model_version": cached.version,
+                "model_accuracy": tenant.model_accuracy,
+                "company_name": tenant.company_name
+            })
+
+        results = [None] * len(records)
+        valid_rows = []
+        valid_indexes = []
+        for index, record in enumerate(records):
+            input_data, error = validate_model_input(options_path, record)
+            if error:
+                results[index] = {"index": index, "error": error}
+            else:
+                valid_rows.append(input_data)
+                valid_indexes.append(index)
+
+        if valid_rows:
+            predictions = predict_records(cached.model, valid_rows, compiled=cached.compiled, encoder=cached.encoder, lookup=cached.lookup)
+            per_row_seconds = (time.perf_counter() - request_started) / len(valid_rows)
+            for index, input_data, prediction in zip(valid_indexes, valid_rows, predictions):
+                results[index] = {"index": index, "predicted_salary": float(prediction)}
+                prediction_log_writer.log(
+                    tenant.company_id, input_data, {"predicted_salary": float(prediction)},
+                    model_version=cached.version, processing_time=per_row_seconds,
+                    api_key_used=tenant.key_hash, ip_address=request.remote_addr
+                )
+            prediction_counter.increment(tenant.company_id, len(valid_rows))
+
+        return jsonify({
+            "results": results,
+            "total": len(records),
+            "succeeded": len(valid_rows),
+            "failed": len(records) - len(valid_rows),
+            "model_version": cached.version,
+            "company_name": tenant.company_name
+        })
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ API prediction error: {e}")
+        return jsonify({"error": f"Prediction error: {str(e)}"}), 500
+
+@app.route('/api/company/api-key', methods=['POST'])
+@company_login_required
+def create_company_api_key():
+    """Issue (or rotate) the company's API key; the key itself is only returned once"""
+    try:
+        db: Session = next(get_db())
+        company_request = db.query(CompanyRequest).filter(CompanyRequest.id == session.get('company_request_id')).first()
+        if not company_request:
+            return jsonify({"error": "Company not found"}), 404
+
+        api_key = generate_api_key()
+        company_request.api_key = hash_api_key(api_key)
+        company_request.updated_at = datetime.now(timezone.utc)
+        db.commit()
+        api_key_registry.invalidate()
+
+        logger.info(f"🔑 API key issued for: {company_request.company_name}")
+        return jsonify({
+            "api_key": api_key,
+            "message": "Store this key securely; it will not be shown again. Any previous key is now revoked."
+        })
+
+    except Exception as e:
+        logger.error(f"❌ API key generation error: {e}")
+        return jsonify({"error": f"API key generation failed: {str(e)}"}), 500
+
+@app.route('/api/company/api-key', methods=['DELETE'])
+@company_login_required
+def revoke_company_api_key():
+    """Revoke the company's API key"""
+    try:
+        db: Session = next(get_db())
+        company_request = db.query(CompanyRequest).filter(CompanyRequest.id == session.get('company_request_id')).first()
+        if not company_request:
+            return jsonify({"error": "Company not found"}), 404
+
+        company_request.api_key = None
+        db.commit()
+        api_key_registry.invalidate()
+
+        logger.info(f"🔑 API key revoked for: {company_request.company_name}")
+        return jsonify({"message": "API key revoked"})
+
+    except Exception as e:
+        logger.error(f"❌ API key revocation error: {e}")
+        return jsonify({"error": f"API key revocation failed: {str(e)}"}), 500
+
 # --- NEW: Settings and Analytics Routes ---
 @app.route('/api/company/change-password', methods=['POST'])
 @company_login_required
@@ -1266,9 +1966,8 @@ def change_company_password():
 @app.route('/api/company/retrain', methods=['POST'])
 @company_login_required
 def retrain_company_model():
-    # Initialize variables to None
-    filename = None
-    file_path = None
+    """Validate and store the uploaded dataset, then queue retraining (202 + job id)"""
+    upload = None
     
     try:
         if 'dataset' not in request.files:
@@ -1279,36 +1978,133 @@ def retrain_company_model():
             return jsonify({"error": "Valid CSV file required"}), 400
         
         company_name = session.get('company_name')
-        filename = f"{company_name.replace(' ', '_')}_retrain_{secrets.token_hex(4)}.csv"
-        file_path = config.UPLOAD_FOLDER / filename
-        file.save(file_path)
-        
-        # Validate Dataset
-        valid, msg, mapping = DatasetValidator.validate_required_columns(file_path)
-        if not valid: 
-            if file_path.exists(): file_path.unlink()
-            return jsonify({"error": msg}), 400
-            
-        DatasetValidator.prepare_mapped_dataset(file_path, mapping).to_csv(file_path, index=False)
-        
-        # Train Model
-        model_filename, accuracy = train_company.train_company_model(file_path, company_name)
-        
-        # Update DB
         db: Session = next(get_db())
         req = db.query(CompanyRequest).filter(CompanyRequest.company_name == company_name).first()
+        if not req:
+            return jsonify({"error": "Company record not found"}), 404
+
+        active_job = training_jobs.active_job(db, req.id)
+        if active_job:
+            return jsonify({
+                "error": "A training job is already in progress",
+                "job_id": active_job.id,
+                "status_url": f"/api/company/training-jobs/{active_job.id}"
+            }), 409
+        
+        # 'full' replaces the training data, 'incremental' adds the upload to it
+        mode = request.form.get('mode', 'full')
+        if mode not in ('full', 'incremental'):
+            return jsonify({"error": "mode must be 'full' or 'incremental'"}), 400
+        
+        # Validate Dataset (stored by content hash; a re-uploaded file is not re-validated)
+        upload = process_dataset_upload(file)
+        if upload["error"]:
+            return jsonify({"error": upload["error"]}), 500 if upload["error_stage"] == "processing" else 400
+        
+        # Train Model in the background (published as a new version when done)
+        job = training_jobs.enqueue(db, req.id, "retrain", payload={
+            "company_name": company_name,
+            "mode": mode,
+            "upload": upload,
+            "filename": file.filename,
+            "uploaded_by": session.get('company_username')
+        }, requested_by=session.get('company_username'))
+        
+        return jsonify({
+            "message": "Retraining queued",
+            "job_id": job.id,
+            "status_url": f"/api/company/training-jobs/{job.id}"
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Retrain Error: {e}")
+        release_upload(upload)
+        return jsonify({"error": str(e)}), 500
+
+def release_upload(upload):
+    """Drop a processed upload's blob unless a dataset row uses it"""
+    if upload and upload.get("file_hash"):
+        db = SessionLocal()
+        try:
+            upload_store.release(db, upload["file_hash"])
+        finally:
+            db.close()
+
+def training_history_paths(db, company):
+    """
+    Dataset files behind a company's active model, oldest first: its latest full dataset
+    and the incremental updates uploaded since
+    """
+    datasets = db.query(CompanyDataset).filter(
+        CompanyDataset.company_id == company.id
+    ).order_by(CompanyDataset.upload_date.desc(), CompanyDataset.id.desc()).all()
+    paths = []
+    for dataset in datasets:
+        paths.append(config.UPLOAD_FOLDER / dataset.file_path)
+        if dataset.dataset_type != "update":
+            break
+    else:
+        # Companies approved before dataset rows were recorded
+        if company.dataset_filename:
+            paths.append(config.UPLOAD_FOLDER / company.dataset_filename)
+    return [path for path in reversed(paths) if path.exists()]
+
+def run_retrain_job(job_id, payload, report, cores):
+    """Training job: retrain on a stored upload (full or incremental) and record it as the active dataset"""
+    upload = payload["upload"]
+    incremental = payload.get("mode") == "incremental"
+    try:
+        file_path = upload_store.blob_path(upload["file_hash"])
+        history_paths = []
+        if incremental:
+            db = SessionLocal()
+            try:
+                req = db.query(CompanyRequest).filter(CompanyRequest.company_name == payload["company_name"]).first()
+                history_paths = training_history_paths(db, req)
+            finally:
+                db.close()
+        result = training_executor.train(
+            job_id, file_path, payload["company_name"], cores,
+            incremental=incremental, history_paths=history_paths
+        )
+        model_filename, accuracy = result["model_filename"], result["accuracy"]
+    except Exception:
+        release_upload(upload)
+        raise
+
+    # Update DB
+    db = SessionLocal()
+    try:
+        req = db.query(CompanyRequest).filter(CompanyRequest.company_name == payload["company_name"]).first()
         req.model_filename = model_filename
         req.model_accuracy = accuracy
         req.updated_at = datetime.now(timezone.utc)
+        add_company_dataset(
+            db, req.id, upload, payload["filename"], "update" if incremental else "retrain",
+            uploaded_by=payload.get("uploaded_by")
+        )
         db.commit()
-        
-        return jsonify({"message": "Retraining successful", "new_accuracy": accuracy})
+        prediction_cache.invalidate_model(f"company:{req.id}")
+        api_key_registry.invalidate()
+        return {"new_accuracy": accuracy, "mode": payload.get("mode", "full"), "summary": result.get("summary")}
+    finally:
+        db.close()
 
+@app.route('/api/company/training-jobs/<int:job_id>')
+@company_login_required
+def get_company_training_job(job_id):
+    """Status/progress of one of the company's training jobs"""
+    try:
+        db: Session = next(get_db())
+        job = db.query(TrainingJob).filter(
+            TrainingJob.id == job_id, TrainingJob.company_id == session.get('company_request_id')
+        ).first()
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        # Approval results hold the generated username; credentials are sent by email
+        return jsonify(job.to_dict(include_result=job.job_type != "approval"))
     except Exception as e:
-        logger.error(f"Retrain Error: {e}")
-        # Cleanup on error
-        if file_path and file_path.exists():
-            file_path.unlink()
+        logger.error(f"❌ Error loading training job: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/company/delete-account', methods=['POST'])
@@ -1400,21 +2196,22 @@ def get_company_analytics():
             "hyperparameters": "Optimized"
         }
 
-        metadata_path = config.COMPANY_MODELS_FOLDER / f"{company_name.replace(' ', '_').lower()}_metadata.json"
-        if metadata_path.exists():
+        metadata_path = model_registry.artifact_path(company_name, "_metadata.json")
+        # Summary metadata only; per-category analysis lives in the detail file
+        metadata = json_file_cache.load(metadata_path)
+        if metadata is not None:
             try:
-                with open(metadata_path, "r") as f:
-                    metadata = json.load(f)
                 numeric = len(metadata.get("features_used", {}).get("numeric", []))
                 categorical = len(metadata.get("features_used", {}).get("categorical", []))
                 model_details["features_count"] = numeric + categorical
+                model_details["version"] = model_registry.active_version(company_slug(company_name))
             except Exception as e:
                 logger.warning(f"Metadata parsing failed for {company_name}: {e}")
 
         analytics = {
             "company_name": company_request.company_name,
             "data_points": company_request.data_points or 0,
-            "predictions_count": company_request.predictions_count or 0,
+            "predictions_count": (company_request.predictions_count or 0) + prediction_counter.pending(company_request.id),
             "days_active": days_active,
             "model_accuracy": (
                 round(float(company_request.model_accuracy) * 100, 2)
@@ -1433,6 +2230,23 @@ def get_company_analytics():
         logger.error(f"❌ Error loading analytics for company: {e}", exc_info=True)
         return jsonify({"error": f"Failed to load analytics: {str(e)}"}), 500
 
+@app.route('/api/company/analytics/details')
+@company_login_required
+def get_company_analytics_details():
+    """Return the detailed training metadata (dataset analysis, model parameters, compaction report)"""
+    try:
+        company_name = session.get('company_name')
+        detail_entry = json_file_cache.entry(model_registry.artifact_path(company_name, "_metadata_detail.json"))
+        if detail_entry is None:
+            # Models trained before the split keep everything in the metadata file
+            detail_entry = json_file_cache.entry(model_registry.artifact_path(company_name, "_metadata.json"))
+        if detail_entry is None:
+            return jsonify({"error": "Model metadata not found"}), 404
+        return cached_json_response(detail_entry)
+    except Exception as e:
+        logger.error(f"❌ Error loading analytics details for company: {e}")
+        return jsonify({"error": f"Failed to load analytics details: {str(e)}"}), 500
+
 @app.route('/api/company/profile')
 @company_login_required
 def get_company_profile():
@@ -1458,7 +2272,8 @@ def get_company_profile():
             "approved_at": company_request.approved_at.isoformat() if company_request.approved_at else None,
             "last_training": company_request.updated_at.isoformat() if company_request.updated_at else None,
             "data_points": company_request.data_points or 0,
-            "predictions_count": company_request.predictions_count or 0,
+            "predictions_count": (company_request.predictions_count or 0) + prediction_counter.pending(company_request.id),
+            "has_api_key": bool(company_request.api_key),
             "model_accuracy": (
                 f"{round(float(company_request.model_accuracy) * 100, 2)}%"
                 if company_request.model_accuracy else "0%"
@@ -1647,6 +2462,7 @@ def get_company_requests():
 @app.route('/api/admin/approve/<int:request_id>', methods=['POST'])
 @admin_login_required
 def approve_company_request(request_id):
+    """Queue model training for a pending request; the job approves it and sends credentials"""
     try:
         db: Session = next(get_db())
         company_request = db.query(CompanyRequest).filter(CompanyRequest.id == request_id).first()
@@ -1657,28 +2473,76 @@ def approve_company_request(request_id):
         if company_request.status == "approved":
             return jsonify({"error": "Request already approved"}), 400
 
-        # Generate credentials
-        username = f"{company_request.company_name.replace(' ', '').lower()}_{secrets.token_hex(4)}"
-        password = generate_password()
+        active_job = training_jobs.active_job(db, request_id)
+        if active_job:
+            return jsonify({
+                "error": "Training is already in progress for this request",
+                "job_id": active_job.id,
+                "status_url": f"/api/admin/training-jobs/{active_job.id}"
+            }), 409
+
+        job = training_jobs.enqueue(
+            db, request_id, "approval",
+            payload={"approved_by": session.get('admin_username')}, requested_by=session.get('admin_username')
+        )
+
+        return jsonify({
+            "message": "Approval queued; the model is being trained",
+            "job_id": job.id,
+            "status_url": f"/api/admin/training-jobs/{job.id}"
+        }), 202
+
+    except Exception as e:
+        logger.error(f"❌ Approval error: {e}")
+        return jsonify({"error": f"Approval error: {str(e)}"}), 500
 
-        # Train model with company's dataset
+def run_approval_job(job_id, payload, report, cores):
+    """Training job: train the company's first model, approve the request and send credentials"""
+    # Read what training needs, then let go of the session: training can take minutes
+    db = SessionLocal()
+    try:
+        company_id = db.query(TrainingJob.company_id).filter(TrainingJob.id == job_id).scalar()
+        company_request = db.query(CompanyRequest).filter(CompanyRequest.id == company_id).first()
+        if not company_request:
+            raise ValueError("Request not found")
+        if company_request.status == "approved":
+            raise ValueError("Request already approved")
+        status = company_request.status
+        company_name = company_request.company_name
         dataset_path = config.UPLOAD_FOLDER / company_request.dataset_filename
-        
-        # Count data points from the dataset
-        try:
-            df = pd.read_csv(dataset_path)
-            data_points = len(df)
-            logger.info(f"📊 Dataset has {data_points} records")
-        except Exception as e:
-            logger.warning(f"Could not count data points: {e}")
-            data_points = 0
-        
-        # Train the model
-        model_filename, accuracy = train_company.train_company_model(dataset_path, company_request.company_name)
+    finally:
+        db.close()
+
+    # Count data points from the dataset
+    try:
+        df = pd.read_csv(dataset_path)
+        data_points = len(df)
+        logger.info(f"📊 Dataset has {data_points} records")
+    except Exception as e:
+        logger.warning(f"Could not count data points: {e}")
+        data_points = 0
+
+    # Train the model in a core-limited process (progress is reported by the child)
+    result = training_executor.train(job_id, dataset_path, company_name, cores)
+    model_filename, accuracy = result["model_filename"], result["accuracy"]
+
+    db = SessionLocal()
+    try:
+        # The request may have been rejected or deleted while the model was training
+        company_request = db.query(CompanyRequest).filter(CompanyRequest.id == company_id).first()
+        if not company_request:
+            raise ValueError("Request was deleted during training")
+        if company_request.status != status:
+            raise ValueError(f"Request was {company_request.status} during training; not approved")
+
+        # Generate credentials
+        username = f"{company_name.replace(' ', '').lower()}_{secrets.token_hex(4)}"
+        password = generate_password()
 
         # Update company request with REAL data
         company_request.status = "approved"
         company_request.approved_at = datetime.now(timezone.utc)
+        company_request.approved_by = payload.get("approved_by")
         company_request.username = username
         company_request.password = password
         company_request.model_filename = model_filename
@@ -1689,7 +2553,7 @@ def approve_company_request(request_id):
 
         # Create company user
         company_user = CompanyUser(
-            company_name=company_request.company_name,
+            company_name=company_name,
             username=username,
             password=password,
             email=company_request.email,
@@ -1702,19 +2566,17 @@ def approve_company_request(request_id):
         # Send credentials to company
         send_company_credentials(company_request, username, password)
 
-        logger.info(f"✅ Approved company {company_request.company_name} with accuracy {accuracy} and {data_points} data points")
+        logger.info(f"✅ Approved company {company_name} with accuracy {accuracy} and {data_points} data points")
 
-        return jsonify({
-            "message": "Company approved successfully",
+        # The job result is stored and served by the job status endpoints, so the password is
+        # left out of it; the company receives it by email
+        return {
             "username": username,
-            "password": password,
             "model_accuracy": accuracy,
             "data_points": data_points
-        })
-
-    except Exception as e:
-        logger.error(f"❌ Approval error: {e}")
-        return jsonify({"error": f"Approval error: {str(e)}"}), 500
+        }
+    finally:
+        db.close()
 
 @app.route('/api/admin/reject/<int:request_id>', methods=['POST'])
 @admin_login_required
@@ -1759,9 +2621,13 @@ def delete_company_request(request_id):
             if company_user:
                 db.delete(company_user)
 
-        # Delete company request
+        # Delete dataset references and company request
+        dataset_hashes = delete_company_datasets(db, request_id)
         db.delete(company_request)
         db.commit()
+        model_cache.invalidate(request_id)
+        prediction_cache.invalidate_model(f"company:{request_id}")
+        api_key_registry.invalidate()
 
         # Clean up files
         try:
@@ -1777,11 +2643,16 @@ def delete_company_request(request_id):
             if options_path.exists():
                 options_path.unlink()
             
-            # Delete dataset file
-            if dataset_filename:
+            # Delete all registry versions
+            model_registry.remove(company_slug(company_name))
+            
+            # Delete dataset file (unreferenced stored blobs go now if idle, otherwise in the hourly sweep)
+            if dataset_filename and not upload_store.is_blob(dataset_filename):
                 dataset_path = config.UPLOAD_FOLDER / dataset_filename
                 if dataset_path.exists():
                     dataset_path.unlink()
+            for file_hash in dataset_hashes:
+                upload_store.release(db, file_hash)
                     
         except Exception as e:
             logger.warning(f"File cleanup warning for company {company_name}: {e}")
@@ -1852,9 +2723,13 @@ def force_delete_company(company_id):
             if company_user:
                 db.delete(company_user)
         
-        # Delete company request
+        # Delete dataset references and company request
+        dataset_hashes = delete_company_datasets(db, company_id)
         db.delete(company_request)
         db.commit()
+        model_cache.invalidate(company_id)
+        prediction_cache.invalidate_model(f"company:{company_id}")
+        api_key_registry.invalidate()
         
         # Clean up files
         files_deleted = []
@@ -1880,12 +2755,20 @@ def force_delete_company(company_id):
                 metadata_path.unlink()
                 files_deleted.append("Metadata file")
             
-            # Delete dataset file
-            if dataset_filename:
+            # Delete all registry versions
+            if model_registry.versions(company_slug(company_name)):
+                model_registry.remove(company_slug(company_name))
+                files_deleted.append("Model versions")
+            
+            # Delete dataset file (unreferenced stored blobs go now if idle, otherwise in the hourly sweep)
+            if dataset_filename and not upload_store.is_blob(dataset_filename):
                 dataset_path = config.UPLOAD_FOLDER / dataset_filename
                 if dataset_path.exists():
                     dataset_path.unlink()
                     files_deleted.append("Dataset file")
+            released = sum(1 for file_hash in dataset_hashes if upload_store.release(db, file_hash))
+            if released:
+                files_deleted.append(f"Dataset files ({released})")
                     
         except Exception as e:
             logger.warning(f"File cleanup warning for company {company_name}: {e}")
@@ -1904,6 +2787,152 @@ def force_delete_company(company_id):
         logger.error(f"❌ Force deletion error: {e}")
         return jsonify({"error": f"Force deletion failed: {str(e)}"}), 500
 
+# --- Training Jobs ---
+@app.route('/api/admin/training-jobs')
+@admin_login_required
+def list_training_jobs():
+    """Most recent training jobs (optionally ?status=queued|running|succeeded|failed)"""
+    try:
+        db: Session = next(get_db())
+        query = db.query(TrainingJob)
+        if request.args.get('status'):
+            query = query.filter(TrainingJob.status == request.args['status'])
+        jobs = query.order_by(TrainingJob.id.desc()).limit(min(request.args.get('limit', 50, type=int), 500)).all()
+        return jsonify({
+            "jobs": [job.to_dict(include_result=False) for job in jobs],
+            "queue": training_jobs.stats(),
+            "executor": training_executor.stats()
+        })
+    except Exception as e:
+        logger.error(f"❌ Error loading training jobs: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/training-jobs/<int:job_id>')
+@admin_login_required
+def get_training_job(job_id):
+    """Status/progress of a training job; includes the generated credentials once an approval succeeds"""
+    try:
+        db: Session = next(get_db())
+        job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job.to_dict())
+    except Exception as e:
+        logger.error(f"❌ Error loading training job: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# --- Model Versions ---
+@app.route('/api/admin/model-versions/<int:company_id>')
+@admin_login_required
+def get_company_model_versions(company_id):
+    """List the kept model versions of a company, newest first"""
+    try:
+        db: Session = next(get_db())
+        company_request = db.query(CompanyRequest).filter(CompanyRequest.id == company_id).first()
+        if not company_request:
+            return jsonify({"error": "Company not found"}), 404
+
+        slug = company_slug(company_request.company_name)
+        return jsonify({
+            "company_name": company_request.company_name,
+            "active_version": model_registry.active_version(slug),
+            "versions": model_registry.versions(slug)
+        })
+    except Exception as e:
+        logger.error(f"❌ Error loading model versions: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/model-versions/<int:company_id>/rollback', methods=['POST'])
+@admin_login_required
+def rollback_company_model(company_id):
+    """Activate an earlier model version (the previous one unless 'version' is given)"""
+    try:
+        db: Session = next(get_db())
+        company_request = db.query(CompanyRequest).filter(CompanyRequest.id == company_id).first()
+        if not company_request:
+            return jsonify({"error": "Company not found"}), 404
+
+        data = request.get_json(silent=True) or {}
+        slug = company_slug(company_request.company_name)
+        try:
+            version = model_registry.rollback(slug, data.get('version'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Workers switch on their next request; keep the reported accuracy in step
+        manifest = next((v for v in model_registry.versions(slug) if v["version"] == version), {})
+        if manifest.get("model_accuracy") is not None:
+            company_request.model_accuracy = manifest["model_accuracy"]
+        company_request.model_filename = f"{slug}_model.pkl"
+        company_request.updated_at = datetime.now(timezone.utc)
+        db.commit()
+        prediction_cache.invalidate_model(f"company:{company_id}")
+        api_key_registry.invalidate()
+
+        logger.info(f"⏪ Rolled back model for {company_request.company_name} to {version}")
+        return jsonify({"message": "Model version activated", "active_version": version})
+    except Exception as e:
+        logger.error(f"❌ Model rollback error: {e}")
+        return jsonify({"error": f"Rollback failed: {str(e)}"}), 500
+
+# --- Model Serving Stats ---
+@app.route('/api/admin/model-cache/stats')
+@admin_login_required
+def get_model_cache_stats():
+    """Return hit/miss/eviction counters of this worker's company model cache"""
+    try:
+        return jsonify(model_cache.stats())
+    except Exception as e:
+        logger.error(f"❌ Error loading model cache stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/prediction-cache/stats')
+@admin_login_required
+def get_prediction_cache_stats():
+    """Return hit ratio and saved compute time of this worker's prediction result cache"""
+    try:
+        return jsonify(prediction_cache.stats())
+    except Exception as e:
+        logger.error(f"❌ Error loading prediction cache stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/json-cache/stats')
+@admin_login_required
+def get_json_cache_stats():
+    """Return hit ratio and size of this worker's options/metadata JSON cache"""
+    try:
+        return jsonify(json_file_cache.stats())
+    except Exception as e:
+        logger.error(f"❌ Error loading JSON cache stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/api-keys/stats')
+@admin_login_required
+def get_api_key_stats():
+    """Return the size and refresh count of this worker's API key map"""
+    try:
+        return jsonify(api_key_registry.stats())
+    except Exception as e:
+        logger.error(f"❌ Error loading API key stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/prediction-log/stats')
+@admin_login_required
+def get_prediction_log_stats():
+    """Return queue depth and written/spilled/dropped counters of this worker's prediction log writer"""
+    try:
+        return jsonify(prediction_log_writer.stats())
+    except Exception as e:
+        logger.error(f"❌ Error loading prediction log stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/health/ready')
+def readiness():
+    """Readiness probe: 200 once model warm-up has finished, 503 while it is still running"""
+    progress = model_warmup.progress() if config.WARMUP_ENABLED else {"status": "disabled", "ready": True}
+    progress["main_model_loaded"] = model is not None
+    return jsonify(progress), (200 if progress["ready"] else 503)
+
 # --- Static file serving ---
 @app.route('/static/<path:path>')
 def serve_static(path):
@@ -2045,37 +3074,27 @@ def predict():
 
         logger.info(f"📥 Received prediction request: {data}")
 
-        # Check for required fields
-        required_fields = ['age', 'experience', 'gender', 'role', 'sector', 'company', 'department', 'education']
-        missing_fields = [field for field in required_fields if field not in data or data[field] is None or data[field] == '']
-
-        if missing_fields:
-            return jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400
-
-        # Create input DataFrame with only the required fields in correct order
-        input_data = {}
-        for field in required_fields:
-            if field in ['age', 'experience']:
-                # Convert numeric fields
-                try:
-                    input_data[field] = float(data[field])
-                except (ValueError, TypeError):
-                    return jsonify({"error": f"Invalid value for {field}. Must be a number."}), 400
-            else:
-                input_data[field] = str(data[field])
-
-        input_df = pd.DataFrame([input_data])
+        # Check required fields and convert numeric ones
+        input_data, error = validate_model_input(OPTIONS_PATH, data)
+        if error:
+            return jsonify({"error": error}), 400
 
         logger.info(f"🔧 Processed input data: {input_data}")
-        logger.info(f"📊 Input DataFrame shape: {input_df.shape}")
-
-        # Prepare input for model (handles missing engineered features)
-        prepared_df = prepare_input_for_model(input_df, model_obj=model, metadata_obj=metadata)
 
-        logger.info(f"Prepared DataFrame columns: {prepared_df.columns.tolist()}")
+        if model is None:
+            if not model_warmup.ready:
+                return jsonify({"error": "Model is still loading, please retry shortly"}), 503
+            return jsonify({"error": "Model not available. Please run 'python train.py'."}), 503
 
-        # Make prediction
-        prediction = model.predict(prepared_df)
+        input_key = canonicalize_input(input_data, PREDICTION_FIELDS, NUMERIC_PREDICTION_FIELDS)
+        cached_prediction = prediction_cache.get("main", main_model_version, input_key)
+        if cached_prediction is not None:
+            prediction = [cached_prediction]
+        else:
+            # Make prediction (compiled engine / fast encoder when available)
+            started = time.perf_counter()
+            prediction = [predict_record(model, input_data, compiled=compiled_model, encoder=feature_encoder)]
+            prediction_cache.put("main", main_model_version, input_key, float(prediction[0]), time.perf_counter() - started)
 
         logger.info(f"🎯 Prediction result: {prediction[0]}")
 
@@ -2107,6 +3126,49 @@ def not_found(error):
 @app.errorhandler(500)
 def internal_error(error):
     return "Internal server error.", 500
+# --- Model Warm-up ---
+def warm_main_model():
+    """Load the main model and run one dummy prediction through it"""
+    if load_main_model() is None:
+        raise RuntimeError("Main model could not be loaded")
+    predict_record(model, warmup_record(options), compiled=compiled_model, encoder=feature_encoder)
+
+def warm_company_model(company_id, company_name, model_filename):
+    """Load a company model into the model cache and push dummy predictions through it"""
+    cached = model_cache.get(company_id, model_registry.resolve(model_filename))
+    record = warmup_record(train_company.get_company_options(company_name))
+    predict_company_record(cached, record)
+    predict_records(cached.model, [record] * 2, compiled=cached.compiled, encoder=cached.encoder)
+
+def model_warmup_plan():
+    """Main model first, then the most recently active companies (last login, then prediction volume)"""
+    steps = [("main model", warm_main_model)]
+    if config.WARMUP_COMPANY_COUNT <= 0:
+        return steps
+
+    db = SessionLocal()
+    try:
+        companies = db.query(
+            CompanyRequest.id, CompanyRequest.company_name, CompanyRequest.model_filename
+        ).outerjoin(
+            CompanyUser, CompanyUser.username == CompanyRequest.username
+        ).filter(
+            CompanyRequest.status == "approved",
+            CompanyRequest.model_filename.isnot(None)
+        ).order_by(
+            CompanyUser.last_login_date.desc().nulls_last(),
+            CompanyRequest.predictions_count.desc().nulls_last()
+        ).limit(config.WARMUP_COMPANY_COUNT).all()
+    finally:
+        db.close()
+
+    for company in companies:
+        steps.append((
+            f"company:{company.id} ({company.company_name})",
+            lambda company=company: warm_company_model(company.id, company.company_name, company.model_filename)
+        ))
+    return steps
+
 def scheduled_automation_task():
     """
     This runs automatically every 1 hour.
@@ -2137,18 +3199,41 @@ def scheduled_automation_task():
         except Exception as e:
             logger.error(f"❌ Automated Task Failed: {e}")
 
+def scheduled_upload_sweep():
+    """Delete dataset blobs that no dataset row or active training job references any more"""
+    db = SessionLocal()
+    try:
+        removed = upload_store.sweep(db)
+        if removed:
+            logger.info(f"🧹 Upload sweep removed {removed} unreferenced dataset blob(s)")
+    except Exception as e:
+        logger.error(f"❌ Upload sweep failed: {e}")
+    finally:
+        db.close()
+
 # Initialize Scheduler
 # We use Asia/Kolkata timezone to ensure logs match your local time
 scheduler = BackgroundScheduler(timezone=pytz.timezone('Asia/Kolkata'))
 
 # Add the job to run every 60 minutes
 scheduler.add_job(func=scheduled_automation_task, trigger="interval", minutes=60)
+scheduler.add_job(func=scheduled_upload_sweep, trigger="interval", minutes=60)
 
 # Start the scheduler
 scheduler.start()
 
 # Ensure scheduler shuts down when app exits
 atexit.register(lambda: scheduler.shutdown())
+
+# Run queued approvals/retrains in background threads (also picks up jobs left by a crashed worker)
+training_jobs.register("approval", run_approval_job)
+training_jobs.register("retrain", run_retrain_job)
+training_jobs.start()
+
+# Preload models off the boot path; /api/health/ready reports progress
+if config.WARMUP_ENABLED:
+    model_warmup.start(model_warmup_plan)
+
 if __name__ == '__main__':
     print("🚀 Starting AI Salary Predictor...")
     print("=" * 60)
@@ -0,0 +1,67 @@
+# benchmark_micro_batch.py - Concurrent single-row throughput with and without micro-batching
+#
+# Usage:
+#   python benchmark_micro_batch.py company_models/ndp_model.pkl uploads/NDP_xxx.csv --threads 16 --requests 2000
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from joblib import load
+
+from feature_encoder import FeatureEncoder
+from compiled_model import load_compiled_model
+from micro_batcher import MicroBatcher
+from input_validator import PREDICTION_FIELDS
+
+
+def run_concurrent(predict, records, threads):
+    """Fire every record from a thread pool; returns requests per second"""
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(predict, records))
+        elapsed = time.perf_counter() - start
+    return len(records) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batching of concurrent predictions")
+    parser.add_argument('model_path', help="Path to a saved pipeline .pkl")
+    parser.add_argument('dataset', help="CSV with prediction fields to sample requests from")
+    parser.add_argument('--requests', type=int, default=2000, help="Number of single-row requests")
+    parser.add_argument('--threads', type=int, default=16, help="Concurrent request threads")
+    parser.add_argument('--window-ms', type=float, default=2.0, help="Micro-batch window in milliseconds")
+    parser.add_argument('--max-batch', type=int, default=64, help="Maximum micro-batch size")
+    args = parser.parse_args()
+
+    pipeline = load(args.model_path)
+    # Single-threaded sklearn inside each call, as in a web worker
+    pipeline.named_steps['regressor'].set_params(n_jobs=1)
+    encoder = FeatureEncoder.from_pipeline(pipeline)
+    if encoder is None:
+        print("❌ Pipeline has no supported ColumnTransformer preprocessor")
+        return
+    regressor = pipeline.named_steps['regressor']
+    compiled = load_compiled_model(args.model_path)
+
+    df = pd.read_csv(args.dataset)
+    records = df[list(PREDICTION_FIELDS)].sample(args.requests, replace=True, random_state=0).to_dict('records')
+
+    engines = [("sklearn regressor", lambda r: float(regressor.predict(encoder.encode_row(r))[0]),
+                lambda rows: regressor.predict(encoder.encode_records(rows)))]
+    if compiled is not None:
+        engines.append(("compiled engine", compiled.predict_one, compiled.predict_records))
+
+    print(f"⏱️  {args.requests} requests from {args.threads} threads "
+          f"(window {args.window_ms} ms, max batch {args.max_batch})")
+    print("=" * 72)
+    for label, predict_one, predict_batch in engines:
+        unbatched = run_concurrent(predict_one, records, args.threads)
+        batcher = MicroBatcher(predict_batch, predict_one, args.window_ms / 1000.0, args.max_batch)
+        batched = run_concurrent(batcher.predict, records, args.threads)
+        stats = batcher.stats()
+        print(f"{label:<20} off: {unbatched:>9.0f} req/s   on: {batched:>9.0f} req/s   "
+              f"x{batched / unbatched:.2f}  (mean batch {stats['mean_batch_size']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# benchmark_predict.py - Per-request encode/predict timings for a saved model pipeline
+#
+# Usage:
+#   python benchmark_predict.py company_models/ndp_model.pkl uploads/NDP_xxx.csv --requests 1000
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from joblib import load
+
+from feature_encoder import FeatureEncoder, DERIVED_FEATURES
+from compiled_model import load_compiled_model
+from input_validator import PREDICTION_FIELDS
+
+
+def pandas_encode(pipeline, record):
+    """The DataFrame path used before FeatureEncoder: build frame, derive, reorder, transform"""
+    df = pd.DataFrame([record])
+    for name, (derive, _) in DERIVED_FEATURES.items():
+        numeric = {col: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) for col in ('age', 'experience') if col in df}
+        df[name] = derive(numeric, len(df))
+    expected = [str(c) for c in getattr(pipeline, 'feature_names_in_', df.columns)]
+    for col in expected:
+        if col not in df.columns:
+            df[col] = 0
+    return pipeline.named_steps['preprocessor'].transform(df[expected])
+
+
+def time_per_call(func, records):
+    start = time.perf_counter()
+    for record in records:
+        func(record)
+    return (time.perf_counter() - start) / len(records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request encoding and prediction")
+    parser.add_argument('model_path', help="Path to a saved pipeline .pkl")
+    parser.add_argument('dataset', help="CSV with prediction fields to sample requests from")
+    parser.add_argument('--requests', type=int, default=500, help="Number of single-row requests to time")
+    args = parser.parse_args()
+
+    pipeline = load(args.model_path)
+    encoder = FeatureEncoder.from_pipeline(pipeline)
+    if encoder is None:
+        print("❌ Pipeline has no supported ColumnTransformer preprocessor")
+        return
+    compiled = load_compiled_model(args.model_path)
+
+    df = pd.read_csv(args.dataset)
+    records = df[list(PREDICTION_FIELDS)].head(args.requests).to_dict('records')
+
+    # Sanity check: both encoders must agree
+    max_diff = max(
+        float(np.max(np.abs(pandas_encode(pipeline, r) - encoder.encode_row(r)))) for r in records[:50]
+    )
+    print(f"🔍 Max encode difference (pandas vs FeatureEncoder): {max_diff:.3e}")
+
+    regressor = pipeline.named_steps['regressor']
+    results = [
+        ("encode: DataFrame + preprocessor.transform", time_per_call(lambda r: pandas_encode(pipeline, r), records)),
+        ("encode: FeatureEncoder.encode_row", time_per_call(encoder.encode_row, records)),
+        ("predict: pandas encode + regressor", time_per_call(lambda r: regressor.predict(pandas_encode(pipeline, r)), records)),
+        ("predict: FeatureEncoder + regressor", time_per_call(lambda r: regressor.predict(encoder.encode_row(r)), records)),
+    ]
+    if compiled is not None:
+        results.append(("predict: compiled engine", time_per_call(compiled.predict_one, records)))
+
+    print(f"\n⏱️  Per-request timings over {len(records)} requests")
+    print("=" * 60)
+    for label, micros in results:
+        print(f"{label:<45} {micros:>10.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+# compiled_model.py - Pure NumPy inference for fitted RandomForest pipelines
+import os
+import json
+import zipfile
+import numpy as np
+from pathlib import Path
+import logging
+from feature_encoder import FeatureEncoder, encoder_spec_from_pipeline
+
+logger = logging.getLogger(__name__)
+
+COMPILED_SUFFIX = "_compiled.npz"
+
+# Rows traversed at once; bounds the (rows x trees) index matrices
+PREDICT_CHUNK_ROWS = 2048
+
+# Above this many rows sklearn's Cython traversal is faster than the NumPy one,
+# so callers should hand large batches to the pipeline instead
+COMPILED_MAX_ROWS = 256
+
+
+def compiled_path_for(model_path):
+    """Location of the compiled artifact that sits next to a .pkl model"""
+    model_path = Path(model_path)
+    return model_path.with_name(f"{model_path.stem}{COMPILED_SUFFIX}")
+
+
+# ---------------------------
+# Compilation
+# ---------------------------
+def _node_depths(tree):
+    """Depth of every node of a fitted sklearn tree (root = 0)"""
+    depth = np.zeros(tree.node_count, dtype=np.int64)
+    frontier = np.array([0])
+    level = 0
+    while frontier.size:
+        depth[frontier] = level
+        children = np.concatenate([tree.children_left[frontier], tree.children_right[frontier]])
+        frontier = children[children != -1]
+        level += 1
+    return depth
+
+
+def _tree_arrays(tree, depth_limit=None):
+    """
+    Flat (left, right, feature, threshold, value) arrays for one tree with local node ids.
+    With depth_limit, nodes deeper than the limit are dropped and the nodes at the limit
+    become leaves predicting their (training-mean) value.
+    """
+    left, right = tree.children_left, tree.children_right
+    feature, threshold, value = tree.feature, tree.threshold, tree.value[:, 0, 0]
+    is_leaf = left == -1
+
+    if depth_limit is not None and tree.max_depth > depth_limit:
+        depth = _node_depths(tree)
+        keep = depth <= depth_limit
+        new_ids = np.cumsum(keep) - 1
+        is_leaf = (is_leaf | (depth == depth_limit))[keep]
+        left = np.where(left[keep] == -1, -1, new_ids[np.maximum(left[keep], 0)])
+        right = np.where(right[keep] == -1, -1, new_ids[np.maximum(right[keep], 0)])
+        feature, threshold, value = feature[keep], threshold[keep], value[keep]
+
+    node_ids = np.arange(len(left), dtype=np.int64)
+    # Leaves point to themselves so traversal can run a fixed number of steps
+    return (
+        np.where(is_leaf, node_ids, left),
+        np.where(is_leaf, node_ids, right),
+        np.where(is_leaf, 0, feature),
+        np.where(is_leaf, np.inf, threshold),
+        value
+    )
+
+
+def _float32_thresholds(threshold):
+    """
+    Downcast split thresholds to float32 without changing any decision:
+    features are compared as float32, and x <= t holds for a float32 x exactly when
+    x <= the largest float32 not above t, so round every threshold down.
+    """
+    downcast = threshold.astype(np.float32)
+    rounded_up = downcast.astype(np.float64) > threshold
+    downcast[rounded_up] = np.nextafter(downcast[rounded_up], np.float32(-np.inf))
+    return downcast
+
+
+def compile_pipeline(pipeline, depth_limit=None, compact=False):
+    """
+    Flatten a fitted Pipeline(preprocessor=ColumnTransformer, regressor=forest) into
+    a JSON encoding spec plus contiguous tree arrays.
+    depth_limit truncates every tree at that depth; compact stores int32 node ids,
+    decision-preserving float32 thresholds and float32 leaf values.
+    Raises ValueError for pipelines that cannot be compiled.
+    """
+    if not hasattr(pipeline, "named_steps"):
+        raise ValueError(f"Expected an sklearn Pipeline, got {type(pipeline).__name__}")
+    regressor = pipeline.named_steps.get("regressor")
+    if regressor is None:
+        raise ValueError("Pipeline must have a fitted 'regressor' step")
+
+    # --- Encoder ---
+    encoder_spec = encoder_spec_from_pipeline(pipeline)
+
+    # --- Trees ---
+    if hasattr(regressor, "tree_"):
+        trees = [regressor]
+    elif type(regressor).__name__ in ("RandomForestRegressor", "ExtraTreesRegressor"):
+        trees = list(regressor.estimators_)
+    else:
+        raise ValueError(f"Unsupported regressor: {type(regressor).__name__}")
+
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in trees:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only single-output trees are supported")
+        left, right, feature, threshold, value = _tree_arrays(tree, depth_limit)
+        lefts.append(left + offset)
+        rights.append(right + offset)
+        features.append(feature)
+        thresholds.append(threshold)
+        values.append(value)
+        roots.append(offset)
+        offset += len(left)
+        tree_depth = int(tree.max_depth)
+        max_depth = max(max_depth, min(tree_depth, depth_limit) if depth_limit is not None else tree_depth)
+
+    spec = {
+        "format_version": 1,
+        "n_features": encoder_spec["n_features"],
+        "blocks": encoder_spec["blocks"],
+        "max_depth": max_depth,
+        "n_trees": len(trees),
+        "regressor": type(regressor).__name__,
+        "depth_limit": depth_limit,
+        "compact": bool(compact)
+    }
+    index_dtype = np.int32 if compact and offset < np.iinfo(np.int32).max else np.int64
+    threshold = np.concatenate(thresholds).astype(np.float64)
+    arrays = {
+        "left": np.concatenate(lefts).astype(index_dtype),
+        "right": np.concatenate(rights).astype(index_dtype),
+        "feature": np.concatenate(features).astype(index_dtype),
+        "threshold": _float32_thresholds(threshold) if compact else threshold,
+        "value": np.concatenate(values).astype(np.float32 if compact else np.float64),
+        "roots": np.asarray(roots, dtype=index_dtype)
+    }
+    return spec, arrays
+
+
+def save_compiled_model(pipeline, model_path, depth_limit=None, compact=False):
+    """
+    Compile a saved pipeline and write the artifact next to its .pkl.
+    Returns the compiled path, or None if the pipeline is not compilable.
+    A stale artifact from a previous model is removed in that case.
+    """
+    compiled_path = compiled_path_for(model_path)
+    try:
+        spec, arrays = compile_pipeline(pipeline, depth_limit=depth_limit, compact=compact)
+    except Exception as e:
+        logger.info(f"ℹ️ Skipping compiled model for {Path(model_path).name}: {e}")
+        compiled_path.unlink(missing_ok=True)
+        return None
+
+    temp_path = compiled_path.with_name(compiled_path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        np.savez(f, spec=np.array(json.dumps(spec)), **arrays)
+    os.replace(temp_path, compiled_path)
+    logger.info(f"⚡ Compiled model saved to: {compiled_path} ({spec['n_trees']} trees)")
+    return compiled_path
+
+
+# ---------------------------
+# Memory-mapped loading
+# ---------------------------
+def _read_npy_header(f):
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+
+def load_npz_arrays(path, mmap_mode="r"):
+    """
+    Load the arrays of an uncompressed .npz (as written by np.savez).
+    With mmap_mode, numeric arrays are memory-mapped straight from the archive,
+    so every worker process shares the same read-only page-cache pages instead
+    of holding a private copy. Small/non-numeric members are read normally.
+    """
+    arrays = {}
+    with np.load(path, allow_pickle=False) as data:
+        members = list(data.files)
+        if not mmap_mode:
+            return {key: data[key] for key in members}
+
+        with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+            for info in archive.infolist():
+                key = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+                if info.compress_type != zipfile.ZIP_STORED:
+                    arrays[key] = data[key]
+                    continue
+                # Skip the zip local file header to reach the .npy payload
+                f.seek(info.header_offset + 26)
+                name_length = int.from_bytes(f.read(2), "little")
+                extra_length = int.from_bytes(f.read(2), "little")
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                shape, fortran_order, dtype = _read_npy_header(f)
+                if dtype.hasobject or dtype.kind == "U" or not shape:
+                    arrays[key] = data[key]
+                    continue
+                arrays[key] = np.memmap(
+                    path, dtype=dtype, mode=mmap_mode, offset=f.tell(), shape=shape,
+                    order="F" if fortran_order else "C"
+                )
+    return arrays
+
+
+# ---------------------------
+# Runtime
+# ---------------------------
+class CompiledModel:
+    """Predicts from plain dicts/arrays using the compiled encoder spec and tree arrays"""
+
+    def __init__(self, spec, arrays):
+        self.spec = spec
+        self.encoder = FeatureEncoder(spec)
+        self.max_depth = spec["max_depth"]
+        # A depth-limited artifact no longer predicts exactly like the .pkl it came from
+        self.matches_pipeline = spec.get("depth_limit") is None
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.left, self.right, self.feature, self.threshold, self.value, self.roots))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        arrays = load_npz_arrays(path, mmap_mode)
+        spec = json.loads(str(arrays.pop("spec")))
+        return cls(spec, arrays)
+
+    def _leaf_nodes(self, rows):
+        """(rows x trees) index of the leaf each row reaches in every tree"""
+        row_ids = np.arange(rows.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (rows.shape[0], self.roots.shape[0]))
+        for _ in range(self.max_depth):
+            go_left = rows[row_ids, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_matrix(self, X):
+        """Average the leaf values reached in every tree for each encoded row"""
+        # Trees compare float32 features against float64 thresholds, as sklearn does
+        X = X.astype(np.float32).astype(np.float64)
+        predictions = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], PREDICT_CHUNK_ROWS):
+            rows = X[start:start + PREDICT_CHUNK_ROWS]
+            predictions[start:start + rows.shape[0]] = self.value[self._leaf_nodes(rows)].mean(axis=1, dtype=np.float64)
+        return predictions
+
+    def predict_trees(self, X):
+        """Per-tree predictions (rows x trees) for each encoded row"""
+        X = X.astype(np.float32).astype(np.float64)
+        per_tree = np.empty((X.shape[0], self.roots.shape[0]), dtype=np.float64)
+        for start in range(0, X.shape[0], PREDICT_CHUNK_ROWS):
+            rows = X[start:start + PREDICT_CHUNK_ROWS]
+            per_tree[start:start + rows.shape[0]] = self.value[self._leaf_nodes(rows)]
+        return per_tree
+
+    def predict_columns(self, columns):
+        """Predict from a dict of column name -> equal-length sequences"""
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        return self.predict_matrix(self.encoder.encode_columns(columns, n_rows))
+
+    def predict_records(self, records):
+        """Predict from a list of dicts"""
+        if len(records) == 1:
+            return self.predict_matrix(self.encoder.encode_row(records[0]))
+        return self.predict_matrix(self.encoder.encode_records(records))
+
+    def predict_one(self, record):
+        """Predict a single record (dict of field -> value)"""
+        return float(self.predict_matrix(self.encoder.encode_row(record))[0])
+
+
+def load_compiled_model(model_path, model_mtime_ns=None, mmap_mode="r"):
+    """
+    Load the compiled artifact for a .pkl if it exists and is not older than the model.
+    Tree arrays are memory-mapped unless mmap_mode is None.
+    Returns None when unavailable so callers fall back to the sklearn pipeline.
+    """
+    compiled_path = compiled_path_for(model_path)
+    try:
+        if not compiled_path.exists():
+            return None
+        if model_mtime_ns is not None and compiled_path.stat().st_mtime_ns < model_mtime_ns:
+            logger.warning(f"⚠️ Ignoring stale compiled model {compiled_path.name}")
+            return None
+        return CompiledModel.load(compiled_path, mmap_mode)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load compiled model {compiled_path.name}: {e}")
+        return None
@@ -23,6 +23,105 @@ EMAIL_CONFIG = {
 UPLOAD_FOLDER = BASE_DIR / 'uploads'
 COMPANY_MODELS_FOLDER = BASE_DIR / 'company_models'
 ALLOWED_EXTENSIONS = {'csv'}
+# Unreferenced dataset blobs are only deleted after being idle this long (every reuse
+# refreshes the idle time), so a concurrent upload of the same content keeps its blob
+UPLOAD_BLOB_GRACE_SECONDS = float(os.environ.get('UPLOAD_BLOB_GRACE_SECONDS', 3600))
+
+# Versioned company model artifacts: each training run is published as a new version
+# and made active atomically; this many older versions are kept for rollback
+MODEL_REGISTRY_FOLDER = COMPANY_MODELS_FOLDER / 'versions'
+MODEL_REGISTRY_KEEP_VERSIONS = int(os.environ.get('MODEL_REGISTRY_KEEP_VERSIONS', 3))
+
+# Model cache configuration
+# Upper bound (in bytes) for company models kept loaded in memory per worker
+MODEL_CACHE_MAX_BYTES = int(os.environ.get('MODEL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Memory-map compiled trees / lookup grids (shared page cache across gunicorn workers) and
+# unpickle the sklearn pipeline only when a request needs it
+MODEL_MMAP_ENABLED = os.environ.get('MODEL_MMAP_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# Prediction result cache configuration (set max entries to 0 to disable)
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 20000))
+PREDICTION_CACHE_TTL_SECONDS = int(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', 3600))
+
+# Batch prediction configuration
+# Maximum number of records accepted by /api/company/predict/batch
+BATCH_PREDICT_MAX_RECORDS = int(os.environ.get('BATCH_PREDICT_MAX_RECORDS', 1000))
+# Rows read and scored at a time by the CSV bulk-scoring endpoint
+CSV_SCORING_CHUNK_SIZE = int(os.environ.get('CSV_SCORING_CHUNK_SIZE', 5000))
+
+# API key prediction path: seconds between reloads of the in-memory key -> company map
+API_KEY_REFRESH_SECONDS = float(os.environ.get('API_KEY_REFRESH_SECONDS', 30))
+
+# Model warm-up: load the main model and the N most recently active company models
+# in a background thread after start (disable to load the main model at import time)
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', '1').lower() not in ('0', 'false', 'no')
+WARMUP_COMPANY_COUNT = int(os.environ.get('WARMUP_COMPANY_COUNT', 10))
+
+# Background training jobs (approvals/retrains): worker threads per process, queue poll
+# interval, and how long a running job may go without a heartbeat before it is requeued
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', 1))
+TRAINING_JOB_POLL_SECONDS = float(os.environ.get('TRAINING_JOB_POLL_SECONDS', 2))
+TRAINING_JOB_STALE_SECONDS = float(os.environ.get('TRAINING_JOB_STALE_SECONDS', 120))
+TRAINING_JOB_MAX_ATTEMPTS = int(os.environ.get('TRAINING_JOB_MAX_ATTEMPTS', 3))
+# CPU budget for training: TRAINING_RESERVED_CORES are left to serving; each job runs in its own
+# process limited to TRAINING_CORES_PER_JOB cores, and jobs that do not fit the budget stay queued
+TRAINING_RESERVED_CORES = int(os.environ.get('TRAINING_RESERVED_CORES', 1))
+TRAINING_CPU_BUDGET = int(os.environ.get('TRAINING_CPU_BUDGET', max(1, (os.cpu_count() or 1) - TRAINING_RESERVED_CORES)))
+TRAINING_CORES_PER_JOB = int(os.environ.get('TRAINING_CORES_PER_JOB', 2))
+# Scheduling niceness of training processes (higher yields more CPU to serving)
+TRAINING_NICE = int(os.environ.get('TRAINING_NICE', 10))
+# Company model evaluation: 'oob' fits once and reports the forest's out-of-bag R² as cv_accuracy;
+# 'cv' runs TRAINING_CV_FOLDS fold fits, one of which (trained on the 80% split) becomes the model
+TRAINING_EVAL_MODE = os.environ.get('TRAINING_EVAL_MODE', 'oob').lower()
+TRAINING_CV_FOLDS = int(os.environ.get('TRAINING_CV_FOLDS', 5))
+# Incremental retrain: add TRAINING_INCREMENTAL_TREES trees fit on the new rows plus up to
+# TRAINING_INCREMENTAL_HISTORY_RATIO x as many earlier rows; oldest trees beyond the cap are dropped
+TRAINING_INCREMENTAL_TREES = int(os.environ.get('TRAINING_INCREMENTAL_TREES', 50))
+TRAINING_INCREMENTAL_MAX_TREES = int(os.environ.get('TRAINING_INCREMENTAL_MAX_TREES', 400))
+TRAINING_INCREMENTAL_HISTORY_RATIO = float(os.environ.get('TRAINING_INCREMENTAL_HISTORY_RATIO', 1.0))
+
+# Post-training compaction: prune trees/depth while validation R² drops by at most
+# MODEL_COMPACT_MAX_R2_DROP, store compiled trees as float32/int32, compress the .pkl
+MODEL_COMPACTION_ENABLED = os.environ.get('MODEL_COMPACTION_ENABLED', '1').lower() not in ('0', 'false', 'no')
+MODEL_COMPACT_MAX_R2_DROP = float(os.environ.get('MODEL_COMPACT_MAX_R2_DROP', 0.002))
+MODEL_COMPACT_COMPRESS_LEVEL = int(os.environ.get('MODEL_COMPACT_COMPRESS_LEVEL', 3))
+# Share of the training split held out to choose the compaction (the test split stays unseen)
+MODEL_COMPACT_VALIDATION_FRACTION = float(os.environ.get('MODEL_COMPACT_VALIDATION_FRACTION', 0.1))
+# Smaller validation sets are too noisy to prune on; compaction is skipped below this
+MODEL_COMPACT_MIN_VALIDATION_ROWS = int(os.environ.get('MODEL_COMPACT_MIN_VALIDATION_ROWS', 200))
+
+# Precomputed lookup tables: largest grid (categorical values x age x experience steps)
+# evaluated after training; larger grids are served by the live model (0 disables)
+LOOKUP_TABLE_MAX_CELLS = int(os.environ.get('LOOKUP_TABLE_MAX_CELLS', 500000))
+
+# Micro-batching of concurrent single predictions per company model
+# Requests arriving within the window are predicted together (0 disables micro-batching)
+MICRO_BATCH_WINDOW_MS = float(os.environ.get('MICRO_BATCH_WINDOW_MS', 0))
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 64))
+
+# Prediction input validation compiled from options.json: strict mode also rejects
+# unknown categories and numbers outside the model's min/max (lenient only normalizes)
+INPUT_VALIDATION_STRICT = os.environ.get('INPUT_VALIDATION_STRICT', '1').lower() not in ('0', 'false', 'no')
+
+# Parsed company options/metadata JSON (with pre-gzipped response bodies) kept per worker
+JSON_CACHE_MAX_ENTRIES = int(os.environ.get('JSON_CACHE_MAX_ENTRIES', 256))
+
+# Largest grid (product of axis lengths) accepted by the what-if sweep endpoint
+SWEEP_MAX_POINTS = int(os.environ.get('SWEEP_MAX_POINTS', 2000))
+
+# predictions_count write-behind: flush every N seconds or once N predictions are pending
+PREDICTION_COUNT_FLUSH_SECONDS = float(os.environ.get('PREDICTION_COUNT_FLUSH_SECONDS', 5))
+PREDICTION_COUNT_FLUSH_THRESHOLD = int(os.environ.get('PREDICTION_COUNT_FLUSH_THRESHOLD', 500))
+
+# Prediction logging (prediction_logs table), written asynchronously in batches
+# Fraction of predictions logged: 1.0 logs all, 0 disables logging
+PREDICTION_LOG_SAMPLE_RATE = float(os.environ.get('PREDICTION_LOG_SAMPLE_RATE', 1.0))
+PREDICTION_LOG_MAX_QUEUE = int(os.environ.get('PREDICTION_LOG_MAX_QUEUE', 10000))
+PREDICTION_LOG_BATCH_SIZE = int(os.environ.get('PREDICTION_LOG_BATCH_SIZE', 500))
+PREDICTION_LOG_FLUSH_SECONDS = float(os.environ.get('PREDICTION_LOG_FLUSH_SECONDS', 2))
+# Rows that do not fit in the queue are appended here and replayed later (empty = drop them)
+PREDICTION_LOG_SPILL_PATH = os.environ.get('PREDICTION_LOG_SPILL_PATH', str(BASE_DIR / 'prediction_log_spill.jsonl')) or None
 
 # Required dataset columns
 REQUIRED_COLUMNS = [
@@ -281,6 +281,50 @@ class PredictionLog(Base):
     company = relationship("CompanyRequest", backref="prediction_logs")
 
 
+# ============================================================
+#  TRAINING JOB TABLE (background approvals / retrains)
+# ============================================================
+class TrainingJob(Base):
+    __tablename__ = 'training_jobs'
+    
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey('company_requests.id', ondelete='CASCADE'), nullable=False, index=True)
+    job_type = Column(String(20), nullable=False)  # 'approval', 'retrain'
+    status = Column(String(20), default='queued', index=True)  # queued, running, succeeded, failed
+    progress = Column(Float, default=0.0)  # 0..1
+    stage = Column(String(100), nullable=True)
+    payload = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    cores = Column(Integer, default=0)  # CPU cores reserved while running
+    worker_id = Column(String(100), nullable=True)
+    requested_by = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=get_current_utc_time)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def to_dict(self, include_result=True):
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': self.progress,
+            'stage': self.stage,
+            'result': self.result if include_result else None,
+            'error': self.error,
+            'attempts': self.attempts,
+            'cores': self.cores,
+            'requested_by': self.requested_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
 # ============================================================
 #  SCHEMA VERIFICATION (Auto-fix missing columns)
 # ============================================================
@@ -296,7 +340,7 @@ def verify_database_schema():
     if not os.path.exists(db_path):
         Base.metadata.create_all(bind=engine)
         print("✅ Created new database with full schema")
-        print("✅ Created tables: admin_users, company_requests, company_users, company_datasets, audit_logs, prediction_logs")
+        print("✅ Created tables: admin_users, company_requests, company_users, company_datasets, audit_logs, prediction_logs, training_jobs")
         return
 
     try:
@@ -310,7 +354,7 @@ def verify_database_schema():
         # Check if all required tables exist
         required_tables = {
             'admin_users', 'company_requests', 'company_users', 
-            'company_datasets', 'audit_logs', 'prediction_logs'
+            'company_datasets', 'audit_logs', 'prediction_logs', 'training_jobs'
         }
         missing_tables = required_tables - existing_tables
         
@@ -353,6 +397,11 @@ def verify_database_schema():
             'prediction_logs': [
                 "id", "company_id", "timestamp", "input_data", "prediction_result",
                 "model_version", "processing_time", "api_key_used", "ip_address"
+            ],
+            'training_jobs': [
+                "id", "company_id", "job_type", "status", "progress", "stage",
+                "payload", "result", "error", "attempts", "cores", "worker_id", "requested_by",
+                "created_at", "started_at", "heartbeat_at", "finished_at"
             ]
         }
         
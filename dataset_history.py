@@ -6,6 +6,7 @@ from datetime import datetime
 import json
 from sqlalchemy.orm import Session
 from database import get_db, CompanyRequest, CompanyDataset
+from upload_store import upload_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,8 +32,21 @@ class DatasetHistoryManager:
             # Get all datasets for this company
             datasets = []
             
-            # Original dataset
-            if company_request.dataset_filename:
+            # Uploads kept in the content-addressed store
+            for dataset in db.query(CompanyDataset).filter(CompanyDataset.company_id == company_request.id).all():
+                datasets.append({
+                    'id': f"dataset_{dataset.id}",
+                    'filename': dataset.filename,
+                    'size': dataset.file_size or 0,
+                    'upload_date': dataset.upload_date,
+                    'records': dataset.records_count or 0,
+                    'is_active': bool(dataset.is_active),
+                    'type': dataset.dataset_type,
+                    'file_hash': dataset.file_hash
+                })
+            
+            # Original dataset (uploaded before the store)
+            if company_request.dataset_filename and not upload_store.is_blob(company_request.dataset_filename):
                 original_path = self.upload_folder / company_request.dataset_filename
                 if original_path.exists():
                     datasets.append({
@@ -83,9 +97,23 @@ class DatasetHistoryManager:
             return []
     
     def download_dataset(self, company_name, dataset_id):
-        """Download a specific dataset"""
+        """Locate a specific dataset; returns (path, download filename) or (None, None)"""
+        file_path = None
+        download_name = None
         try:
-            if dataset_id.startswith('original_'):
+            if dataset_id.startswith('dataset_'):
+                # Stored upload; only the owning company may download it
+                db: Session = next(get_db())
+                dataset = db.query(CompanyDataset).join(CompanyRequest).filter(
+                    CompanyDataset.id == int(dataset_id.replace('dataset_', '')),
+                    CompanyRequest.company_name == company_name
+                ).first()
+                if not dataset:
+                    return None, None
+                file_path = self.upload_folder / dataset.file_path
+                download_name = dataset.filename
+                
+            elif dataset_id.startswith('original_'):
                 # Original dataset
                 db: Session = next(get_db())
                 company_request = db.query(CompanyRequest).filter(
@@ -93,7 +121,7 @@ class DatasetHistoryManager:
                 ).first()
                 
                 if not company_request or not company_request.dataset_filename:
-                    return None
+                    return None, None
                 
                 file_path = self.upload_folder / company_request.dataset_filename
                 
@@ -107,17 +135,17 @@ class DatasetHistoryManager:
                         file_path = retrain_file
                         break
                 else:
-                    return None
+                    return None, None
             else:
-                return None
+                return None, None
             
             if file_path and file_path.exists():
-                return file_path
+                return file_path, download_name or file_path.name
                 
         except Exception as e:
             logger.error(f"Error locating dataset: {e}")
         
-        return None
+        return None, None
 
 # Initialize dataset history manager
 from config import UPLOAD_FOLDER, COMPANY_MODELS_FOLDER
@@ -16,6 +16,9 @@ class DatasetValidator:
         'company', 'department', 'education', 'salary'
     }
     
+    # Columns needed to score a dataset (target not required)
+    PREDICTION_COLUMNS = REQUIRED_COLUMNS - {'salary'}
+    
     # Common alternative column names mapping
     COLUMN_MAPPINGS = {
         'age': ['age', 'employee_age', 'staff_age', 'age_years', 'dob'],
@@ -71,6 +74,31 @@ class DatasetValidator:
             logger.error(f"Error validating columns: {e}")
             return False, f"Error reading dataset: {str(e)}", {}
     
+    @staticmethod
+    def map_prediction_columns(columns) -> Tuple[bool, str, Dict[str, str]]:
+        """
+        Map raw CSV headers to the standard feature names needed for prediction.
+        Returns: (is_valid, message, column_mapping) where column_mapping maps
+        standard name -> header exactly as it appears in the file.
+        """
+        normalized = {str(col).strip().lower(): col for col in columns}
+        column_mapping = {}
+        missing_columns = []
+        
+        for required_col in sorted(DatasetValidator.PREDICTION_COLUMNS):
+            candidates = [required_col] + DatasetValidator.COLUMN_MAPPINGS.get(required_col, [])
+            for candidate in candidates:
+                if candidate in normalized:
+                    column_mapping[required_col] = normalized[candidate]
+                    break
+            else:
+                missing_columns.append(required_col)
+        
+        if missing_columns:
+            return False, f"Missing required columns: {', '.join(missing_columns)}", {}
+        
+        return True, "All prediction columns found", column_mapping
+    
     @staticmethod
     def check_data_quality(file_path: str, column_mapping: Dict[str, str]) -> Tuple[bool, str]:
         """
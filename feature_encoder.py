@@ -0,0 +1,261 @@
+# feature_encoder.py - Pandas-free encoder extracted from a fitted ColumnTransformer
+import threading
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------
+# Derived features
+# ---------------------------
+# The one definition of the engineered features, used for training (train_company.create_features),
+# the DataFrame serving path (app.prepare_input_for_model) and this encoder: divide by
+# (experience + 1), fall back to 0 when an input is missing/invalid or the denominator is zero.
+def _derive_experience_squared(columns, n_rows):
+    exp = columns.get("experience", np.zeros(n_rows))
+    return np.where(np.isnan(exp), 0.0, exp ** 2)
+
+
+def _derive_age_experience_ratio(columns, n_rows):
+    exp = columns.get("experience", np.zeros(n_rows))
+    age = columns.get("age", np.zeros(n_rows))
+    denominator = exp + 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = age / denominator
+    invalid = np.isnan(exp) | np.isnan(age) | (denominator == 0)
+    return np.where(invalid, 0.0, ratio)
+
+
+def _derive_experience_squared_value(values):
+    exp = values.get("experience", 0.0)
+    return 0.0 if exp != exp else exp ** 2
+
+
+def _derive_age_experience_ratio_value(values):
+    exp = values.get("experience", 0.0)
+    age = values.get("age", 0.0)
+    if exp != exp or age != age or exp + 1.0 == 0:
+        return 0.0
+    return age / (exp + 1.0)
+
+
+# name -> (column-wise function, single-row function)
+DERIVED_FEATURES = {
+    "experience_squared": (_derive_experience_squared, _derive_experience_squared_value),
+    "age_experience_ratio": (_derive_age_experience_ratio, _derive_age_experience_ratio_value)
+}
+
+# Raw inputs the derived features are computed from
+DERIVED_INPUTS = ("age", "experience")
+
+
+def _to_builtin(value):
+    """Convert numpy scalars (e.g. category values) to JSON-serializable Python values"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _to_float(value):
+    """float() with None/NaN -> NaN, like pandas does for a numeric column"""
+    if value is None:
+        return np.nan
+    return float(value)
+
+
+# ---------------------------
+# Spec extraction
+# ---------------------------
+def _block_spec(name, transformer, columns):
+    """Describe one ColumnTransformer block as plain imputer/scaler/one-hot parameters"""
+    steps = [transformer] if not hasattr(transformer, "steps") else [step for _, step in transformer.steps]
+    block = {"name": name, "columns": [str(c) for c in columns]}
+    fill_values = None
+
+    for step in steps:
+        step_type = type(step).__name__
+        if step_type == "SimpleImputer":
+            fill_values = [_to_builtin(v) for v in step.statistics_]
+        elif step_type == "StandardScaler":
+            n = len(columns)
+            block["mean"] = [float(v) for v in step.mean_] if step.mean_ is not None else [0.0] * n
+            block["scale"] = [float(v) for v in step.scale_] if step.scale_ is not None else [1.0] * n
+        elif step_type == "OneHotEncoder":
+            if getattr(step, "drop_idx_", None) is not None or getattr(step, "_infrequent_enabled", False):
+                raise ValueError("OneHotEncoder with drop/infrequent categories is not supported")
+            block["categories"] = [[_to_builtin(v) for v in cats] for cats in step.categories_]
+            block["handle_unknown"] = step.handle_unknown
+        else:
+            raise ValueError(f"Unsupported transformer in block '{name}': {step_type}")
+
+    block["kind"] = "categorical" if "categories" in block else "numeric"
+    if fill_values is not None:
+        block["fill_values"] = fill_values
+    return block
+
+
+def encoder_spec_from_pipeline(pipeline):
+    """
+    Extract a JSON-serializable encoder spec from a fitted Pipeline whose
+    'preprocessor' step is a ColumnTransformer of imputer/scaler/one-hot blocks.
+    Raises ValueError for anything else.
+    """
+    preprocessor = getattr(pipeline, "named_steps", {}).get("preprocessor")
+    if preprocessor is None or not hasattr(preprocessor, "transformers_"):
+        raise ValueError("Pipeline must have a fitted 'preprocessor' ColumnTransformer")
+
+    blocks = []
+    n_features = 0
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        if transformer == "passthrough":
+            block = {"name": name, "kind": "numeric", "columns": [str(c) for c in columns]}
+        else:
+            block = _block_spec(name, transformer, columns)
+        block["offset"] = n_features
+        n_features += sum(len(c) for c in block["categories"]) if block["kind"] == "categorical" else len(block["columns"])
+        blocks.append(block)
+
+    return {"n_features": n_features, "blocks": blocks}
+
+
+# ---------------------------
+# Encoder
+# ---------------------------
+class FeatureEncoder:
+    """
+    Reproduces preprocessor.transform without pandas.
+    Category -> column index dicts, imputer fill values and scaler parameters are
+    precomputed once; single requests are written into a per-thread preallocated
+    float64 row buffer.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.n_features = spec["n_features"]
+        self.blocks = []
+        self._local = threading.local()
+
+        # Flat per-feature plans for the single-row path
+        self._numeric_plan = []      # (position, column, fill, mean, scale)
+        self._categorical_plan = []  # (offset, column, index, fill, handle_unknown)
+        numeric_inputs = set(DERIVED_INPUTS)
+
+        for block in spec["blocks"]:
+            block = dict(block)
+            offset = block["offset"]
+            if block["kind"] == "categorical":
+                block["index"] = [{category: i for i, category in enumerate(cats)} for cats in block["categories"]]
+                fill_values = block.get("fill_values")
+                for j, col in enumerate(block["columns"]):
+                    fill = fill_values[j] if fill_values is not None else None
+                    self._categorical_plan.append((offset, col, block["index"][j], fill, block["handle_unknown"]))
+                    offset += len(block["index"][j])
+            else:
+                n = len(block["columns"])
+                block["fill_array"] = np.asarray(block.get("fill_values", [np.nan] * n), dtype=np.float64)
+                block["mean_array"] = np.asarray(block.get("mean", [0.0] * n), dtype=np.float64)
+                block["scale_array"] = np.asarray(block.get("scale", [1.0] * n), dtype=np.float64)
+                for j, col in enumerate(block["columns"]):
+                    self._numeric_plan.append((
+                        offset + j, col, float(block["fill_array"][j]),
+                        float(block["mean_array"][j]), float(block["scale_array"][j])
+                    ))
+                    if col not in DERIVED_FEATURES:
+                        numeric_inputs.add(col)
+            self.blocks.append(block)
+
+        self.numeric_inputs = sorted(numeric_inputs)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Build an encoder for a fitted pipeline, or None if it is not supported"""
+        try:
+            return cls(encoder_spec_from_pipeline(pipeline))
+        except Exception as e:
+            logger.info(f"ℹ️ No fast encoder for {type(pipeline).__name__}: {e}")
+            return None
+
+    def _row_buffer(self):
+        buffer = getattr(self._local, "row", None)
+        if buffer is None:
+            buffer = np.empty((1, self.n_features), dtype=np.float64)
+            self._local.row = buffer
+        return buffer
+
+    def encode_row(self, record):
+        """
+        Encode one record (dict of field -> value) into this thread's row buffer.
+        The returned (1, n_features) array is reused by the next call on the same thread.
+        """
+        row = self._row_buffer()
+        row.fill(0.0)
+        out = row[0]
+
+        values = {}
+        for col in self.numeric_inputs:
+            if col in record:
+                values[col] = _to_float(record[col])
+        for name, (_, derive_value) in DERIVED_FEATURES.items():
+            values[name] = derive_value(values)
+
+        for position, col, fill, mean, scale in self._numeric_plan:
+            value = values.get(col, np.nan)
+            if value != value:
+                value = fill
+            out[position] = (value - mean) / scale
+
+        for offset, col, index, fill, handle_unknown in self._categorical_plan:
+            value = record.get(col)
+            if value is None or value != value:
+                value = fill
+            position = index.get(value)
+            if position is not None:
+                out[offset + position] = 1.0
+            elif handle_unknown == "error":
+                raise ValueError(f"Unknown category {value!r} for '{col}'")
+        return row
+
+    def encode_columns(self, columns, n_rows):
+        """Build a new float64 feature matrix from a dict of column -> sequence"""
+        numeric = {}
+        for col in self.numeric_inputs:
+            if col in columns:
+                numeric[col] = np.asarray(columns[col], dtype=np.float64).reshape(n_rows)
+        for name, (derive, _) in DERIVED_FEATURES.items():
+            numeric[name] = derive(numeric, n_rows)
+
+        X = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        for block in self.blocks:
+            offset = block["offset"]
+            if block["kind"] == "numeric":
+                values = np.column_stack([
+                    numeric.get(col, np.full(n_rows, np.nan)) for col in block["columns"]
+                ]) if block["columns"] else np.zeros((n_rows, 0))
+                values = np.where(np.isnan(values), block["fill_array"], values)
+                X[:, offset:offset + values.shape[1]] = (values - block["mean_array"]) / block["scale_array"]
+            else:
+                fill_values = block.get("fill_values")
+                for j, col in enumerate(block["columns"]):
+                    index = block["index"][j]
+                    fill = fill_values[j] if fill_values is not None else None
+                    raw = columns.get(col)
+                    if raw is None:
+                        raw = [None] * n_rows
+                    # None/NaN -> imputer fill value; unknown categories -> -1
+                    positions = np.fromiter(
+                        (index.get(fill if (v is None or v != v) else v, -1) for v in raw),
+                        dtype=np.int64, count=n_rows
+                    )
+                    known = positions >= 0
+                    if block["handle_unknown"] == "error" and not known.all():
+                        raise ValueError(f"Unknown category for '{col}'")
+                    X[np.nonzero(known)[0], offset + positions[known]] = 1.0
+                    offset += len(index)
+        return X
+
+    def encode_records(self, records):
+        """Encode a list of dicts into a new feature matrix"""
+        names = {key for record in records for key in record}
+        columns = {name: [record.get(name) for record in records] for name in names}
+        return self.encode_columns(columns, len(records))
@@ -0,0 +1,137 @@
+# input_validator.py - Prediction input validators compiled from options.json
+import json
+import math
+import threading
+from pathlib import Path
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_FIELDS = ('age', 'experience', 'gender', 'role', 'sector', 'company', 'department', 'education')
+NUMERIC_PREDICTION_FIELDS = frozenset(('age', 'experience'))
+
+# Unknown categories listed in an error message
+MAX_LISTED_CATEGORIES = 10
+
+
+def options_path_for(model_path):
+    """The options.json saved next to a company model ({name}_model.pkl -> {name}_options.json)"""
+    model_path = Path(model_path)
+    stem = model_path.stem[:-len("_model")] if model_path.stem.endswith("_model") else model_path.stem
+    return model_path.with_name(f"{stem}_options.json")
+
+
+class InputValidator:
+    """
+    Validates and normalizes one prediction record using rules compiled once from options.json:
+    - numeric fields are converted to float and (in strict mode) checked against min/max,
+    - categorical values are stripped and matched exactly, then case-insensitively,
+      against the model's known categories (frozensets); in strict mode unknown ones are rejected.
+    validate() returns (input_data, error) like app.validate_prediction_input.
+    """
+
+    def __init__(self, options, strict=True):
+        self.strict = strict
+        self.numeric_ranges = {}
+        self.categories = {}
+        self.category_lookup = {}
+
+        rules = options.get("validation_rules", {})
+        numeric_meta = options.get("numeric_meta", {})
+        for field in NUMERIC_PREDICTION_FIELDS:
+            meta = rules.get(field) or numeric_meta.get(field) or {}
+            low, high = meta.get("min"), meta.get("max")
+            self.numeric_ranges[field] = (
+                float(low) if low is not None else -math.inf,
+                float(high) if high is not None else math.inf
+            )
+
+        for field, values in options.get("categorical", {}).items():
+            if field not in PREDICTION_FIELDS or not values:
+                continue
+            allowed = frozenset(str(v) for v in values)
+            self.categories[field] = allowed
+            self.category_lookup[field] = {value.strip().lower(): value for value in allowed}
+
+        self._plan = tuple(
+            (field, field in NUMERIC_PREDICTION_FIELDS, self.numeric_ranges.get(field),
+             self.categories.get(field), self.category_lookup.get(field))
+            for field in PREDICTION_FIELDS
+        )
+
+    def validate(self, data):
+        if not isinstance(data, dict):
+            return None, "Record must be a JSON object"
+
+        missing_fields = [field for field in PREDICTION_FIELDS if data.get(field) is None or data.get(field) == '']
+        if missing_fields:
+            return None, f"Missing required fields: {', '.join(missing_fields)}"
+
+        input_data = {}
+        for field, is_numeric, value_range, allowed, lookup in self._plan:
+            value = data[field]
+            if is_numeric:
+                try:
+                    value = float(value)
+                except (ValueError, TypeError):
+                    return None, f"Invalid value for {field}. Must be a number."
+                if not math.isfinite(value):
+                    return None, f"Invalid value for {field}. Must be a number."
+                if self.strict and not value_range[0] <= value <= value_range[1]:
+                    return None, f"Invalid value for {field}. Must be between {value_range[0]:g} and {value_range[1]:g}."
+            else:
+                if isinstance(value, (dict, list)):
+                    return None, f"Invalid value for {field}. Must be text."
+                value = str(value)
+                if allowed is not None and value not in allowed:
+                    value = lookup.get(value.strip().lower(), value)
+                    if self.strict and value not in allowed:
+                        listed = sorted(allowed)[:MAX_LISTED_CATEGORIES]
+                        more = ", ..." if len(allowed) > MAX_LISTED_CATEGORIES else ""
+                        return None, f"Unknown {field} '{value}'. Allowed: {', '.join(listed)}{more}"
+            input_data[field] = value
+        return input_data, None
+
+
+class ValidatorCache:
+    """Compiled validators keyed on options file; rebuilt when the file's mtime changes"""
+
+    def __init__(self, strict=True):
+        self.strict = strict
+        self._validators = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, options_path):
+        """Return the InputValidator for an options.json, or None if it is missing/unreadable"""
+        options_path = Path(options_path)
+        try:
+            mtime_ns = options_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+        entry = self._validators.get(options_path)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry[1]
+
+        try:
+            with open(options_path, "r") as f:
+                validator = InputValidator(json.load(f), strict=self.strict)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not build input validator from {options_path.name}: {e}")
+            return None
+
+        with self._lock:
+            self._validators[options_path] = (mtime_ns, validator)
+            self.builds += 1
+        logger.info(f"🧾 Input validator compiled from {options_path.name}")
+        return validator
+
+    def for_model(self, model_path):
+        return self.get(options_path_for(model_path))
+
+
+# Initialize validator cache
+input_validators = ValidatorCache(strict=config.INPUT_VALIDATION_STRICT)
@@ -0,0 +1,117 @@
+# json_cache.py - Parsed JSON files (company options/metadata) with ready-to-send response bytes
+import os
+import json
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class CachedJson:
+    """
+    One parsed JSON file plus its serialized and gzipped response bodies.
+    data is shared between requests and must be treated as read-only.
+    """
+
+    __slots__ = ("path", "data", "body", "gzip_body", "etag", "mtime_ns")
+
+    def __init__(self, path, data, mtime_ns, compress_level=6):
+        self.path = path
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.body = json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=compress_level, mtime=0)
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+
+
+class JsonFileCache:
+    """
+    LRU cache of JSON files keyed by path.
+    - Files under an immutable root (published model registry versions) are never re-checked:
+      a new version has a new path.
+    - Other files are re-read when their mtime changes (one stat per lookup).
+    """
+
+    def __init__(self, max_entries, immutable_roots=()):
+        self.max_entries = max_entries
+        self.immutable_roots = tuple(Path(os.path.abspath(root)) for root in immutable_roots)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_immutable(self, path):
+        return any(root in path.parents for root in self.immutable_roots)
+
+    def entry(self, path):
+        """Return the CachedJson for a file, or None if it is missing or not valid JSON"""
+        path = Path(os.path.abspath(path))
+        with self._lock:
+            cached = self._entries.get(path)
+        immutable = cached is not None and self._is_immutable(path)
+
+        if immutable:
+            mtime_ns = cached.mtime_ns
+        else:
+            try:
+                mtime_ns = path.stat().st_mtime_ns
+            except OSError:
+                return None
+
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            with self._lock:
+                if path in self._entries:
+                    self._entries.move_to_end(path)
+                self.hits += 1
+            return cached
+
+        try:
+            with open(path, "r") as f:
+                cached = CachedJson(path, json.load(f), mtime_ns)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Could not load {path.name}: {e}")
+            return None
+
+        with self._lock:
+            self.misses += 1
+            self._entries[path] = cached
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def load(self, path):
+        """Parsed (read-only) contents of a JSON file, or None"""
+        cached = self.entry(path)
+        return cached.data if cached is not None else None
+
+    def invalidate(self, path=None):
+        """Forget one file, or every file"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(Path(os.path.abspath(path)), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'body_bytes': sum(len(entry.body) for entry in self._entries.values()),
+                'gzip_bytes': sum(len(entry.gzip_body) for entry in self._entries.values())
+            }
+
+
+# Initialize company JSON cache
+json_file_cache = JsonFileCache(config.JSON_CACHE_MAX_ENTRIES, immutable_roots=(config.MODEL_REGISTRY_FOLDER,))
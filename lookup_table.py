@@ -0,0 +1,292 @@
+# lookup_table.py - Precomputed prediction grids for low-cardinality company models
+#
+# Build (or rebuild with a larger budget) for a company's active model; the active version's
+# artifacts are copied into a new version with the new table, which is then published:
+#   python lookup_table.py NDP --max-cells 3000000
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+from pathlib import Path
+import logging
+
+from feature_encoder import FeatureEncoder, DERIVED_FEATURES
+from compiled_model import load_npz_arrays, load_compiled_model
+from input_validator import PREDICTION_FIELDS
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_SUFFIX = "_lookup.npz"
+
+# Grid rows predicted per model call while building
+BUILD_CHUNK_ROWS = 50000
+
+# Raw inputs a lookup table can be keyed on
+NUMERIC_AXES = ("age", "experience")
+
+
+def lookup_path_for(model_path):
+    """Location of the lookup table that sits next to a .pkl model"""
+    model_path = Path(model_path)
+    return model_path.with_name(f"{model_path.stem}{LOOKUP_SUFFIX}")
+
+
+def grid_axes_from_options(options):
+    """
+    Describe the prediction grid from a company's options.json:
+    one axis per categorical field (its known values) and per numeric field
+    (min..max in the form's step). Returns a list of axis dicts.
+    """
+    axes = []
+    for field, values in options.get("categorical", {}).items():
+        axes.append({"field": field, "kind": "categorical", "values": [str(v) for v in values]})
+    for field in NUMERIC_AXES:
+        meta = options.get("numeric_meta", {}).get(field)
+        if meta is None:
+            continue
+        step = float(meta.get("step") or 1)
+        start = float(meta["min"])
+        count = int(round((float(meta["max"]) - start) / step)) + 1
+        axes.append({"field": field, "kind": "numeric", "start": start, "step": step, "count": count})
+    return axes
+
+
+def _axis_size(axis):
+    return len(axis["values"]) if axis["kind"] == "categorical" else axis["count"]
+
+
+def grid_cells(axes):
+    """Number of predictions needed to fill the grid"""
+    return int(np.prod([_axis_size(axis) for axis in axes], dtype=np.int64)) if axes else 0
+
+
+def _axis_values(axis, indexes):
+    if axis["kind"] == "categorical":
+        return np.asarray(axis["values"], dtype=object)[indexes]
+    return axis["start"] + indexes * axis["step"]
+
+
+def build_lookup_table(pipeline, options, max_cells, prediction_fields=PREDICTION_FIELDS, compiled=None):
+    """
+    Evaluate a fitted pipeline over every cell of its options grid.
+    Model inputs that are not prediction fields (and so are always imputed at
+    serving time) are imputed on the grid too.
+    If a compiled model that does not match the pipeline (depth-limited) is given,
+    the grid is evaluated with it, since it is what serves single requests.
+    Returns (axes, imputed_inputs, values) or None when the grid exceeds
+    max_cells or misses a prediction field the model uses.
+    """
+    axes = grid_axes_from_options(options)
+    cells = grid_cells(axes)
+    if cells > max_cells:
+        logger.info(f"ℹ️ Skipping lookup table: {cells:,} cells exceeds budget of {max_cells:,}")
+        return None
+
+    fields = {axis["field"] for axis in axes}
+    model_inputs = [str(c) for c in getattr(pipeline, "feature_names_in_", [])]
+    uncovered = [c for c in model_inputs if c not in fields and c not in DERIVED_FEATURES]
+    missing_fields = [c for c in uncovered if c in prediction_fields]
+    if not axes or not model_inputs or missing_fields:
+        logger.info(f"ℹ️ Skipping lookup table: prediction fields not on the grid: {missing_fields}")
+        return None
+    imputed_inputs = [c for c in uncovered if c not in prediction_fields]
+
+    encoder = FeatureEncoder.from_pipeline(pipeline)
+    if encoder is None:
+        return None
+    regressor = pipeline.named_steps["regressor"]
+    shape = tuple(_axis_size(axis) for axis in axes)
+    values = np.empty(cells, dtype=np.float64)
+
+    for start in range(0, cells, BUILD_CHUNK_ROWS):
+        flat = np.arange(start, min(start + BUILD_CHUNK_ROWS, cells))
+        indexes = np.unravel_index(flat, shape)
+        columns = {axis["field"]: _axis_values(axis, idx) for axis, idx in zip(axes, indexes)}
+        X = encoder.encode_columns(columns, len(flat))
+        if compiled is not None and not compiled.matches_pipeline:
+            values[start:start + len(flat)] = compiled.predict_matrix(X)
+        else:
+            values[start:start + len(flat)] = regressor.predict(X)
+
+    return axes, imputed_inputs, values.reshape(shape)
+
+
+def save_lookup_table(pipeline, options, model_path, max_cells, compiled=None):
+    """
+    Build and write the lookup table next to a .pkl.
+    Returns the path, or None if no table was built (a stale one is removed).
+    """
+    table_path = lookup_path_for(model_path)
+    try:
+        built = build_lookup_table(pipeline, options, max_cells, compiled=compiled) if max_cells > 0 else None
+    except Exception as e:
+        logger.warning(f"⚠️ Could not build lookup table for {Path(model_path).name}: {e}")
+        built = None
+    if built is None:
+        table_path.unlink(missing_ok=True)
+        return None
+
+    axes, imputed_inputs, values = built
+    spec = {"format_version": 1, "axes": axes, "imputed_inputs": imputed_inputs}
+    temp_path = table_path.with_name(table_path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        np.savez(f, spec=np.array(json.dumps(spec)), values=values)
+    os.replace(temp_path, table_path)
+    logger.info(f"🧮 Lookup table saved to: {table_path} ({values.size:,} cells, {values.nbytes / 1024 / 1024:.1f} MB)")
+    return table_path
+
+
+class LookupTable:
+    """
+    Answers predictions for inputs that land exactly on a grid cell.
+    Records that carry a value for an imputed input are left to the live model.
+    """
+
+    def __init__(self, axes, values, imputed_inputs=()):
+        self.axes = axes
+        self.values = values
+        self.imputed_inputs = tuple(imputed_inputs)
+        self._plan = []
+        for axis in axes:
+            if axis["kind"] == "categorical":
+                self._plan.append((axis["field"], {v: i for i, v in enumerate(axis["values"])}, None, None, None))
+            else:
+                self._plan.append((axis["field"], None, axis["start"], axis["step"], axis["count"]))
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        arrays = load_npz_arrays(path, mmap_mode)
+        spec = json.loads(str(arrays["spec"]))
+        return cls(spec["axes"], arrays["values"], spec.get("imputed_inputs", ()))
+
+    def lookup(self, record):
+        """Return the precomputed prediction for a record dict, or None if it is off the grid"""
+        if any(record.get(name) is not None for name in self.imputed_inputs):
+            return None
+        index = []
+        try:
+            for field, categories, start, step, count in self._plan:
+                value = record[field]
+                if categories is not None:
+                    position = categories.get(value) if isinstance(value, str) else None
+                else:
+                    offset = (float(value) - start) / step
+                    position = int(round(offset))
+                    if abs(offset - position) > 1e-9 or not 0 <= position < count:
+                        position = None
+                if position is None:
+                    return None
+                index.append(position)
+        except (KeyError, TypeError, ValueError):
+            return None
+        return float(self.values[tuple(index)])
+
+    def lookup_columns(self, columns, n_rows):
+        """
+        Vectorized lookup for a dict of column -> sequence.
+        Returns a float64 array with NaN for rows that are off the grid.
+        """
+        on_grid = np.ones(n_rows, dtype=bool)
+        index = []
+        for field, categories, start, step, count in self._plan:
+            raw = columns.get(field)
+            if raw is None:
+                return np.full(n_rows, np.nan)
+            if categories is not None:
+                positions = np.fromiter(
+                    (categories.get(v, -1) if isinstance(v, str) else -1 for v in raw),
+                    dtype=np.int64, count=n_rows
+                )
+            else:
+                with np.errstate(invalid="ignore"):
+                    offsets = (np.asarray(raw, dtype=np.float64).reshape(n_rows) - start) / step
+                    positions = np.rint(offsets)
+                    exact = np.abs(offsets - positions) <= 1e-9
+                positions = np.where(exact & (positions >= 0) & (positions < count), positions, -1).astype(np.int64)
+            on_grid &= positions >= 0
+            index.append(np.where(positions >= 0, positions, 0))
+
+        result = np.full(n_rows, np.nan)
+        if on_grid.any():
+            result[on_grid] = self.values[tuple(positions[on_grid] for positions in index)]
+        return result
+
+
+def load_lookup_table(model_path, model_mtime_ns=None, mmap_mode="r"):
+    """
+    Load the lookup table for a .pkl if present and not older than the model, else None.
+    The grid is memory-mapped unless mmap_mode is None.
+    """
+    table_path = lookup_path_for(model_path)
+    try:
+        if not table_path.exists():
+            return None
+        if model_mtime_ns is not None and table_path.stat().st_mtime_ns < model_mtime_ns:
+            logger.warning(f"⚠️ Ignoring stale lookup table {table_path.name}")
+            return None
+        return LookupTable.load(table_path, mmap_mode)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load lookup table {table_path.name}: {e}")
+        return None
+
+
+def main():
+    from joblib import load
+    import config
+    from model_registry import model_registry, company_slug, MANIFEST_FILENAME
+
+    parser = argparse.ArgumentParser(description="Precompute the prediction lookup table for a company's active model")
+    parser.add_argument('company', help="Company name (as registered, e.g. 'NDP')")
+    parser.add_argument('--max-cells', type=int, default=config.LOOKUP_TABLE_MAX_CELLS, help="Cell budget for the grid")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    slug = company_slug(args.company)
+    active_model = model_registry.artifact_path(args.company, "_model.pkl")
+    if not active_model.exists():
+        raise SystemExit(f"❌ No model found for {args.company} ({active_model})")
+
+    # Published versions are never modified: build into a copy and publish it as a new version
+    active_version = model_registry.active_version(slug)
+    staging_dir = model_registry.staging_dir(slug)
+    try:
+        sources = [p for p in active_model.parent.glob(f"{slug}_*") if p.is_file() and p.name != MANIFEST_FILENAME]
+        for source in sources:
+            shutil.copy2(source, staging_dir / source.name)
+
+        model_path = staging_dir / active_model.name
+        with open(staging_dir / f"{slug}_options.json") as f:
+            options = json.load(f)
+        axes = grid_axes_from_options(options)
+        dimensions = " x ".join(f"{axis['field']}={_axis_size(axis)}" for axis in axes)
+        print(f"🧮 Grid for {model_path.name}: {grid_cells(axes):,} cells ({dimensions})")
+        table_path = save_lookup_table(load(model_path), options, model_path, args.max_cells, compiled=load_compiled_model(model_path))
+        if table_path is None:
+            print("❌ No lookup table written; active version unchanged")
+            model_registry.discard(staging_dir)
+            return
+
+        metadata_path = staging_dir / f"{slug}_metadata.json"
+        if metadata_path.exists():
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+            metadata["lookup_table"] = table_path.name if table_path else None
+            with open(metadata_path, "w") as f:
+                json.dump(metadata, f, indent=2, default=str)
+
+        previous = next((v for v in model_registry.versions(slug) if v["version"] == active_version), {})
+        info = {key: value for key, value in previous.items() if key not in ("version", "content_hash", "created_at", "files", "size_bytes", "active")}
+        version = model_registry.publish(slug, staging_dir, dict(info, lookup_rebuilt_from=active_version, lookup_max_cells=args.max_cells))
+        print(f"✅ Published {slug}/{version} (was {active_version or 'unversioned'})")
+    except BaseException:
+        model_registry.discard(staging_dir)
+        raise
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# micro_batcher.py - Coalesce concurrent single-row predictions into one vectorized call
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingPrediction:
+    __slots__ = ("record", "result", "error", "done")
+
+    def __init__(self, record):
+        self.record = record
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects predict requests that arrive within window_seconds (up to max_batch)
+    and runs them through a single predict_batch(records) call.
+    The first caller of a batch waits out the window and predicts on behalf of
+    everyone who joined; the others block until their result is ready.
+    If the batch call fails, records are retried one by one with predict_one so
+    a bad input only fails its own request.
+    """
+
+    def __init__(self, predict_batch, predict_one, window_seconds, max_batch):
+        self.predict_batch = predict_batch
+        self.predict_one = predict_one
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, int(max_batch))
+        self._pending = []
+        self._lock = threading.Lock()
+        self._batch_full = threading.Event()
+        self.requests = 0
+        self.batches = 0
+        self.fallbacks = 0
+
+    def predict(self, record):
+        """Predict one record, possibly together with concurrent callers"""
+        pending = _PendingPrediction(record)
+        with self._lock:
+            self._pending.append(pending)
+            is_leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_batch:
+                self._batch_full.set()
+
+        if is_leader:
+            self._batch_full.wait(self.window_seconds)
+            with self._lock:
+                batch = self._pending
+                self._pending = []
+                self._batch_full.clear()
+            for start in range(0, len(batch), self.max_batch):
+                self._run(batch[start:start + self.max_batch])
+        else:
+            pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self, batch):
+        try:
+            predictions = self.predict_batch([pending.record for pending in batch])
+            for pending, prediction in zip(batch, predictions):
+                pending.result = float(prediction)
+        except Exception as e:
+            logger.debug(f"Micro-batch of {len(batch)} failed, predicting rows individually: {e}")
+            self.fallbacks += 1
+            for pending in batch:
+                try:
+                    pending.result = float(self.predict_one(pending.record))
+                except Exception as row_error:
+                    pending.error = row_error
+        finally:
+            with self._lock:
+                self.requests += len(batch)
+                self.batches += 1
+            for pending in batch:
+                pending.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'window_ms': round(self.window_seconds * 1000, 3),
+                'max_batch': self.max_batch,
+                'requests': self.requests,
+                'batches': self.batches,
+                'fallbacks': self.fallbacks,
+                'mean_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0
+            }
@@ -0,0 +1,292 @@
+# model_cache.py - In-process cache for loaded company models
+import re
+import hashlib
+import warnings
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from joblib import load
+import logging
+
+import config
+from compiled_model import load_compiled_model
+from feature_encoder import FeatureEncoder
+from lookup_table import load_lookup_table
+
+logger = logging.getLogger(__name__)
+
+# Per-node arrays stored by every fitted sklearn tree
+TREE_NODE_ATTRIBUTES = (
+    'children_left', 'children_right', 'feature', 'threshold',
+    'impurity', 'n_node_samples', 'weighted_n_node_samples'
+)
+
+
+def iter_fitted_trees(model):
+    """Yield every fitted sklearn tree estimator contained in a model/pipeline"""
+    if hasattr(model, 'tree_'):
+        yield model
+        return
+
+    if hasattr(model, 'steps'):
+        for _, step in model.steps:
+            yield from iter_fitted_trees(step)
+        return
+
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        return
+    for estimator in estimators:
+        # GradientBoosting stores a 2D array of trees
+        if hasattr(estimator, '__iter__') and not hasattr(estimator, 'fit'):
+            for sub_estimator in estimator:
+                yield from iter_fitted_trees(sub_estimator)
+        else:
+            yield from iter_fitted_trees(estimator)
+
+
+def estimate_model_bytes(model, fallback=0):
+    """
+    Estimate the in-memory footprint of a fitted model.
+    Tree based models are measured from their node/value arrays, which dominate
+    their size. Anything else falls back to the given size (usually the file size).
+    """
+    total = 0
+    try:
+        for estimator in iter_fitted_trees(model):
+            tree = estimator.tree_
+            total += sum(getattr(tree, attr).nbytes for attr in TREE_NODE_ATTRIBUTES)
+            total += tree.value.nbytes
+    except Exception as e:
+        logger.warning(f"Could not measure model size: {e}")
+        total = 0
+    return total or int(fallback)
+
+
+def process_memory():
+    """
+    Resident memory of this worker from /proc: rss_bytes counts every resident page,
+    private_bytes only pages not shared with other processes (e.g. other gunicorn workers).
+    Returns zeros where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            status = f.read()
+        fields = {key: int(value) * 1024 for key, value in re.findall(r"^(\w+):\s+(\d+) kB", status, re.M)}
+        return {
+            'rss_bytes': fields.get('Rss', 0),
+            'private_bytes': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+        }
+    except OSError:
+        return {'rss_bytes': 0, 'private_bytes': 0}
+
+
+class LazyPipeline:
+    """
+    Stand-in for a pickled pipeline that is only unpickled on first use.
+    When a compiled artifact exists, single and small-batch requests never touch the
+    sklearn forest, so workers that only serve those never hold a private copy of it.
+    Attribute access (predict, named_steps, ...) loads and delegates to the real pipeline.
+    on_load(size_bytes), if set, is called once with the loaded pipeline's estimated size.
+    """
+
+    def __init__(self, model_path, mmap_mode=None, on_load=None):
+        self._model_path = Path(model_path)
+        self._mmap_mode = mmap_mode
+        self._model = None
+        self._lock = threading.Lock()
+        self.on_load = on_load
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    model = load_pipeline(self._model_path, mmap_mode=self._mmap_mode)
+                    self._model = model
+                    size_bytes = estimate_model_bytes(model, fallback=self._model_path.stat().st_size)
+                    logger.info(f"📦 Loaded sklearn pipeline {self._model_path.name} on demand ({size_bytes / 1024 / 1024:.1f} MB)")
+                    if self.on_load is not None:
+                        self.on_load(size_bytes)
+        return self._model
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+def load_pipeline(model_path, mmap_mode=None):
+    """joblib.load a pipeline; compacted .pkl files are compressed and silently loaded without mmap"""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="mmap_mode .* not compatible with compressed file")
+        return load(model_path, mmap_mode=mmap_mode)
+
+
+def model_version(model_path, mtime_ns):
+    """Short hash identifying one saved version of a model file (the parent is the registry version directory)"""
+    model_path = Path(model_path)
+    return hashlib.sha1(f"{model_path.parent.name}/{model_path.name}:{mtime_ns}".encode()).hexdigest()[:16]
+
+
+class CachedModel:
+    """
+    A loaded model together with the file version it was loaded from.
+    compiled/encoder hold the fast pandas-free inference paths when the pipeline supports them;
+    lookup holds the precomputed prediction grid if one was built for the model.
+    """
+
+    def __init__(self, company_id, model, model_path, mtime_ns, size_bytes, compiled=None, encoder=None, lookup=None):
+        self.company_id = company_id
+        self.model = model
+        self.compiled = compiled
+        self.encoder = encoder
+        self.lookup = lookup
+        self.model_path = Path(model_path)
+        self.model_filename = self.model_path.name
+        self.mtime_ns = mtime_ns
+        self.size_bytes = size_bytes
+        self.version = model_version(model_path, mtime_ns)
+        # MicroBatcher for this model, created on first use when micro-batching is enabled
+        self.batcher = None
+
+    def matches(self, model_path, mtime_ns):
+        """True if this entry was loaded from the given file version"""
+        return self.model_path == Path(model_path) and self.mtime_ns == mtime_ns
+
+
+class ModelCache:
+    """
+    LRU cache of loaded company models keyed by company id.
+    - Entries are invalidated when the model filename or file mtime changes (retrain).
+    - Least recently used entries are evicted once the memory budget is exceeded.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, company_id, model_path):
+        """Return the CachedModel for company_id, loading it from model_path if needed"""
+        model_path = Path(model_path)
+        stat = model_path.stat()
+
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry is not None:
+                if entry.matches(model_path, stat.st_mtime_ns):
+                    self._entries.move_to_end(company_id)
+                    self.hits += 1
+                    return entry
+                # Model was retrained or renamed since it was cached
+                self._remove(company_id)
+                self.invalidations += 1
+            self.misses += 1
+
+        # Load outside the lock so other companies are not blocked by a slow load
+        memory_before = process_memory()
+        mmap_mode = "r" if config.MODEL_MMAP_ENABLED else None
+        compiled = load_compiled_model(model_path, stat.st_mtime_ns, mmap_mode=mmap_mode)
+        if compiled is not None and config.MODEL_MMAP_ENABLED:
+            # Memory-mapped compiled trees serve most requests; the forest is unpickled only if needed
+            model = LazyPipeline(model_path, mmap_mode=mmap_mode)
+            size_bytes = compiled.nbytes
+        else:
+            model = load_pipeline(model_path, mmap_mode=mmap_mode)
+            size_bytes = estimate_model_bytes(model, fallback=stat.st_size)
+            if compiled is not None:
+                size_bytes += compiled.nbytes
+        lookup = load_lookup_table(model_path, stat.st_mtime_ns, mmap_mode=mmap_mode)
+        if lookup is not None:
+            size_bytes += lookup.nbytes
+        encoder = compiled.encoder if compiled is not None else FeatureEncoder.from_pipeline(model)
+        entry = CachedModel(company_id, model, model_path, stat.st_mtime_ns, size_bytes, compiled, encoder, lookup)
+        if isinstance(model, LazyPipeline):
+            model.on_load = lambda loaded_bytes: self._add_loaded_bytes(entry, loaded_bytes)
+        memory_after = process_memory()
+
+        with self._lock:
+            if company_id in self._entries:
+                self._remove(company_id)
+            self._entries[company_id] = entry
+            self.total_bytes += entry.size_bytes
+            self._evict()
+
+        logger.info(
+            f"📦 Cached model {entry.model_filename} for company {company_id} ({entry.size_bytes / 1024 / 1024:.1f} MB, "
+            f"worker RSS {memory_before['rss_bytes'] / 1024 / 1024:.0f} -> {memory_after['rss_bytes'] / 1024 / 1024:.0f} MB, "
+            f"private {memory_before['private_bytes'] / 1024 / 1024:.0f} -> {memory_after['private_bytes'] / 1024 / 1024:.0f} MB)"
+        )
+        return entry
+
+    def invalidate(self, company_id):
+        """Drop a company's model from the cache (e.g. after deletion)"""
+        with self._lock:
+            if company_id in self._entries:
+                self._remove(company_id)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Return cache counters for sizing/monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'memory': process_memory(),
+                'models': [
+                    {
+                        'company_id': entry.company_id,
+                        'model_filename': entry.model_filename,
+                        'size_bytes': entry.size_bytes,
+                        'pipeline_loaded': not isinstance(entry.model, LazyPipeline) or entry.model.loaded,
+                        'lookup_cells': entry.lookup.values.size if entry.lookup is not None else 0,
+                        'micro_batcher': entry.batcher.stats() if entry.batcher is not None else None
+                    }
+                    for entry in self._entries.values()
+                ]
+            }
+
+    def _add_loaded_bytes(self, entry, loaded_bytes):
+        """Count a lazily unpickled pipeline against the budget and evict if it is now exceeded"""
+        with self._lock:
+            entry.size_bytes += loaded_bytes
+            if self._entries.get(entry.company_id) is entry:
+                self.total_bytes += loaded_bytes
+                self._evict()
+
+    def _remove(self, company_id):
+        entry = self._entries.pop(company_id)
+        self.total_bytes -= entry.size_bytes
+
+    def _evict(self):
+        # Always keep the most recently loaded model, even if it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            company_id, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry.size_bytes
+            self.evictions += 1
+            logger.info(f"♻️ Evicted model {entry.model_filename} for company {company_id} from cache")
+
+
+# Initialize model cache
+model_cache = ModelCache(config.MODEL_CACHE_MAX_BYTES)
@@ -0,0 +1,149 @@
+# model_compaction.py - Post-training compaction of company models
+import time
+import warnings
+import numpy as np
+from pathlib import Path
+from joblib import dump, load
+from sklearn.metrics import r2_score
+import logging
+
+from compiled_model import CompiledModel, compile_pipeline, compiled_path_for, save_compiled_model, load_compiled_model
+
+logger = logging.getLogger(__name__)
+
+# Fractions of the trained forest tried when pruning trees
+TREE_FRACTIONS = (1.0, 0.75, 0.5, 0.375, 0.25)
+MIN_TREES = 20
+
+# Depth limits tried below the trained depth
+DEPTH_STEPS = (0, 3, 6, 9, 12)
+MIN_DEPTH = 8
+
+
+def _file_size(path):
+    path = Path(path)
+    return path.stat().st_size if path.exists() else 0
+
+
+def _timed_load(func, repeats=3):
+    """Best-of-N wall time for a loader"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _latency_percentiles(compiled, records):
+    """p50/p99 single-record predict latency in milliseconds"""
+    timings = []
+    for record in records:
+        start = time.perf_counter()
+        compiled.predict_one(record)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p99_ms": round(float(np.percentile(timings, 99)), 4)
+    }
+
+
+def _measure(model_path, records):
+    compiled = load_compiled_model(model_path)
+    return {
+        "pkl_bytes": _file_size(model_path),
+        "compiled_bytes": _file_size(compiled_path_for(model_path)),
+        "pkl_load_seconds": round(_timed_load(lambda: load(model_path)), 4),
+        "compiled_load_seconds": round(_timed_load(lambda: load_compiled_model(model_path)), 4),
+        "predict_latency": _latency_percentiles(compiled, records) if compiled is not None else None
+    }
+
+
+def choose_compaction(pipeline, X_val, y_val, max_r2_drop):
+    """
+    Pick the smallest (tree count, depth limit) whose validation R² stays within
+    max_r2_drop of the full model. Each depth limit is traversed once; every
+    tree count is then scored from cumulative per-tree predictions.
+    Returns a dict with the choice and the scores of all candidates.
+    """
+    forest = pipeline.named_steps["regressor"]
+    n_trees = len(forest.estimators_)
+    trained_depth = max(int(tree.tree_.max_depth) for tree in forest.estimators_)
+
+    columns = {str(col): X_val[col].to_numpy() for col in X_val.columns}
+    y_val = np.asarray(y_val, dtype=np.float64)
+
+    tree_counts = sorted({max(MIN_TREES, int(round(n_trees * f))) for f in TREE_FRACTIONS if n_trees * f >= 1} | {n_trees})
+    depth_limits = sorted({trained_depth - step for step in DEPTH_STEPS if trained_depth - step >= MIN_DEPTH}, reverse=True)
+
+    candidates = []
+    baseline_r2 = None
+    for depth in depth_limits:
+        compiled = CompiledModel(*compile_pipeline(pipeline, depth_limit=None if depth == trained_depth else depth, compact=True))
+        X = compiled.encoder.encode_columns(columns, len(y_val))
+        cumulative = np.cumsum(compiled.predict_trees(X), axis=1)
+        tree_ends = np.append(compiled.roots[1:], len(compiled.left))
+        for count in tree_counts:
+            if count > n_trees:
+                continue
+            r2 = float(r2_score(y_val, cumulative[:, count - 1] / count))
+            if depth == trained_depth and count == n_trees:
+                baseline_r2 = r2
+            candidates.append({"n_trees": count, "depth_limit": depth, "nodes": int(tree_ends[count - 1]), "r2": r2})
+
+    accepted = [c for c in candidates if c["r2"] >= baseline_r2 - max_r2_drop]
+    best = min(accepted, key=lambda c: (c["nodes"], -c["r2"]))
+    return {
+        "trained_trees": n_trees,
+        "trained_depth": trained_depth,
+        "baseline_r2": baseline_r2,
+        "n_trees": best["n_trees"],
+        "depth_limit": best["depth_limit"] if best["depth_limit"] < trained_depth else None,
+        "r2": best["r2"],
+        "candidates": candidates
+    }
+
+
+def compact_company_model(pipeline, X_val, y_val, model_path, max_r2_drop, compress_level=3, latency_samples=200):
+    """
+    Compact a freshly saved company model in place:
+    - drop trees (applied to both the .pkl and the compiled artifact, so they agree),
+    - truncate tree depth in the compiled artifact (served for single/small requests),
+    - store the compiled artifact with int32 ids and float32 thresholds/values,
+    - rewrite the .pkl with joblib compression (it is only unpickled for large batches).
+    Returns a report with accuracy delta, on-disk sizes, load times and p50/p99 latency
+    before and after, for the model's _metadata.json.
+    """
+    records = X_val.head(latency_samples).to_dict("records")
+    before = _measure(model_path, records)
+
+    choice = choose_compaction(pipeline, X_val, y_val, max_r2_drop)
+    forest = pipeline.named_steps["regressor"]
+    if choice["n_trees"] < len(forest.estimators_):
+        forest.estimators_ = forest.estimators_[:choice["n_trees"]]
+        forest.n_estimators = choice["n_trees"]
+
+    dump(pipeline, model_path, compress=compress_level)
+    save_compiled_model(pipeline, model_path, depth_limit=choice["depth_limit"], compact=True)
+    after = _measure(model_path, records)
+
+    report = {
+        "n_trees": {"before": choice["trained_trees"], "after": choice["n_trees"]},
+        "depth_limit": choice["depth_limit"],
+        "max_r2_drop": max_r2_drop,
+        "validation_r2": {"before": choice["baseline_r2"], "after": choice["r2"]},
+        "accuracy_delta": choice["r2"] - choice["baseline_r2"],
+        "before": before,
+        "after": after,
+        "candidates_evaluated": len(choice["candidates"])
+    }
+    logger.info(
+        f"🗜️ Compacted {Path(model_path).name}: {choice['trained_trees']} -> {choice['n_trees']} trees, "
+        f"depth limit {choice['depth_limit']}, R² {choice['baseline_r2']:.4f} -> {choice['r2']:.4f}, "
+        f"compiled {before['compiled_bytes'] / 1024 / 1024:.1f} -> {after['compiled_bytes'] / 1024 / 1024:.1f} MB, "
+        f"pkl {before['pkl_bytes'] / 1024 / 1024:.1f} -> {after['pkl_bytes'] / 1024 / 1024:.1f} MB"
+    )
+    return report
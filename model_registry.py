@@ -0,0 +1,273 @@
+# model_registry.py - Versioned company model artifacts with an atomically switched active version
+#
+# Layout under config.MODEL_REGISTRY_FOLDER:
+#   {slug}/versions/{version}/{slug}_model.pkl, _model_compiled.npz, _model_lookup.npz,
+#                              _metadata.json, _metadata_detail.json, _options.json, manifest.json
+#   {slug}/ACTIVE             -> {"version": ..., "previous": ..., "activated_at": ...}
+# Version directories are never modified once published; a retrain writes a new one
+# and replaces ACTIVE with os.replace, so readers see either the old or the new version.
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_POINTER = "ACTIVE"
+MANIFEST_FILENAME = "manifest.json"
+STAGING_PREFIX = ".staging-"
+
+# Per-company files looked up by name; compiled/lookup artifacts are found next to the model
+ARTIFACT_SUFFIXES = ("_model.pkl", "_metadata.json", "_metadata_detail.json", "_options.json")
+
+
+def company_slug(company_name):
+    """File name prefix used for a company's artifacts"""
+    return company_name.replace(' ', '_').lower()
+
+
+def _split_artifact_name(filename):
+    """'ndp_model.pkl' -> ('ndp', '_model.pkl'); (None, None) for other names"""
+    for suffix in ARTIFACT_SUFFIXES:
+        if filename.endswith(suffix) and len(filename) > len(suffix):
+            return filename[:-len(suffix)], suffix
+    return None, None
+
+
+def _content_hash(directory):
+    """SHA-256 over the names and bytes of every file in a directory"""
+    digest = hashlib.sha256()
+    for path in sorted(p for p in Path(directory).iterdir() if p.is_file()):
+        digest.update(path.name.encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    """Write JSON to a temp file in the same directory, fsync it and rename it over path"""
+    path = Path(path)
+    fd, temp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except Exception:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+class ModelRegistry:
+    """
+    Company model versions stored under root, with one active version per company.
+    - staging_dir()/publish(): training writes into a private staging directory which is
+      renamed to versions/{timestamp}-{content hash} and then made active.
+    - resolve(): maps a stable artifact name (e.g. 'ndp_model.pkl', as stored in
+      CompanyRequest.model_filename) to the active version's file. Workers re-read the
+      pointer when its inode/mtime changes, so a publish or rollback is picked up on the
+      next request without a restart. Companies never published here resolve to the
+      flat file in legacy_folder.
+    - activate()/rollback(): switch the pointer to any kept version.
+    Besides the active one, keep_versions older versions are kept for rollback.
+    """
+
+    def __init__(self, root, legacy_folder, keep_versions):
+        self.root = Path(root)
+        self.legacy_folder = Path(legacy_folder)
+        self.keep_versions = keep_versions
+        self._pointers = {}
+        self._lock = threading.Lock()
+        self.publishes = 0
+        self.activations = 0
+
+    def _company_dir(self, slug):
+        return self.root / slug
+
+    def _versions_dir(self, slug):
+        return self._company_dir(slug) / "versions"
+
+    def _pointer_path(self, slug):
+        return self._company_dir(slug) / ACTIVE_POINTER
+
+    def _read_pointer(self, slug):
+        """The ACTIVE pointer dict for a company ({} if it has none), cached per pointer file version"""
+        pointer_path = self._pointer_path(slug)
+        try:
+            stat = pointer_path.stat()
+        except OSError:
+            self._pointers.pop(slug, None)
+            return {}
+        signature = (stat.st_ino, stat.st_mtime_ns)
+        cached = self._pointers.get(slug)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(pointer_path, "r") as f:
+                pointer = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Unreadable model pointer {pointer_path}: {e}")
+            return cached[1] if cached is not None else {}
+        self._pointers[slug] = (signature, pointer)
+        return pointer
+
+    def active_version(self, slug):
+        return self._read_pointer(slug).get("version")
+
+    def version_dir(self, slug, version):
+        return self._versions_dir(slug) / version
+
+    def resolve(self, filename):
+        """Path of a company artifact in its active version, or in the legacy folder if unversioned"""
+        slug, _ = _split_artifact_name(filename)
+        if slug is not None:
+            version = self.active_version(slug)
+            if version is not None:
+                return self.version_dir(slug, version) / filename
+        return self.legacy_folder / filename
+
+    def artifact_path(self, company_name, suffix):
+        """resolve() by company name, e.g. artifact_path('NDP', '_options.json')"""
+        return self.resolve(f"{company_slug(company_name)}{suffix}")
+
+    def staging_dir(self, slug):
+        """Create an empty private directory to write a new version into"""
+        company_dir = self._company_dir(slug)
+        company_dir.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=company_dir))
+
+    def discard(self, staging_dir):
+        """Remove a staging directory left behind by a failed training run"""
+        if staging_dir is not None and Path(staging_dir).exists():
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def publish(self, slug, staging_dir, info=None):
+        """
+        Turn a fully written staging directory into a new version and activate it.
+        info (e.g. accuracy) is stored in the version's manifest.json. Returns the version id.
+        """
+        staging_dir = Path(staging_dir)
+        content_hash = _content_hash(staging_dir)
+        version = f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{content_hash[:12]}"
+        manifest = {
+            "version": version,
+            "content_hash": content_hash,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "files": sorted(p.name for p in staging_dir.iterdir() if p.is_file()),
+            "size_bytes": sum(p.stat().st_size for p in staging_dir.iterdir() if p.is_file()),
+            **(info or {})
+        }
+        with open(staging_dir / MANIFEST_FILENAME, "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+
+        target = self.version_dir(slug, version)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            # Identical artifacts published within the same second
+            self.discard(staging_dir)
+        else:
+            os.rename(staging_dir, target)
+
+        self.activate(slug, version)
+        self.publishes += 1
+        self._prune(slug)
+        logger.info(f"📚 Published model version {slug}/{version} ({manifest['size_bytes'] / 1024 / 1024:.1f} MB)")
+        return version
+
+    def activate(self, slug, version):
+        """Atomically make a kept version the active one"""
+        if not (self.version_dir(slug, version) / MANIFEST_FILENAME).exists():
+            raise ValueError(f"Unknown model version '{version}' for {slug}")
+        with self._lock:
+            current = self.active_version(slug)
+            if current == version:
+                return version
+            _write_json_atomic(self._pointer_path(slug), {
+                "version": version,
+                "previous": current,
+                "activated_at": datetime.now(timezone.utc).isoformat()
+            })
+            self._pointers.pop(slug, None)
+            self.activations += 1
+        logger.info(f"🔀 Active model for {slug}: {current} -> {version}")
+        return version
+
+    def rollback(self, slug, version=None):
+        """Activate the given version, or the one that was active before the current one"""
+        if version is None:
+            pointer = self._read_pointer(slug)
+            version = pointer.get("previous")
+            if version is None or not self.version_dir(slug, version).exists():
+                versions = [v["version"] for v in self.versions(slug) if v["version"] != pointer.get("version")]
+                if not versions:
+                    raise ValueError(f"No earlier model version to roll back to for {slug}")
+                version = versions[0]
+        return self.activate(slug, version)
+
+    def versions(self, slug):
+        """Manifests of all kept versions, newest first, flagged with 'active'"""
+        versions_dir = self._versions_dir(slug)
+        if not versions_dir.exists():
+            return []
+        active = self.active_version(slug)
+        manifests = []
+        for version_dir in sorted(versions_dir.iterdir(), reverse=True):
+            try:
+                with open(version_dir / MANIFEST_FILENAME, "r") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            manifest["active"] = manifest.get("version") == active
+            manifests.append(manifest)
+        return manifests
+
+    def remove(self, slug):
+        """Delete every version of a company (account deletion)"""
+        company_dir = self._company_dir(slug)
+        if company_dir.exists():
+            shutil.rmtree(company_dir, ignore_errors=True)
+        self._pointers.pop(slug, None)
+
+    def _prune(self, slug):
+        """Delete versions beyond keep_versions, never the active or previous one"""
+        pointer = self._read_pointer(slug)
+        protected = {pointer.get("version"), pointer.get("previous")}
+        older = [v["version"] for v in self.versions(slug) if v["version"] != pointer.get("version")]
+        for version in older[self.keep_versions:]:
+            if version in protected:
+                continue
+            shutil.rmtree(self.version_dir(slug, version), ignore_errors=True)
+            logger.info(f"🧹 Pruned model version {slug}/{version}")
+
+        # Staging directories of crashed training runs
+        cutoff = time.time() - 24 * 3600
+        for path in self._company_dir(slug).glob(f"{STAGING_PREFIX}*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue
+
+    def stats(self):
+        companies = [p.name for p in self.root.iterdir() if p.is_dir()] if self.root.exists() else []
+        return {
+            'companies': len(companies),
+            'keep_versions': self.keep_versions,
+            'publishes': self.publishes,
+            'activations': self.activations,
+            'active': {slug: self.active_version(slug) for slug in companies}
+        }
+
+
+# Initialize model registry
+model_registry = ModelRegistry(config.MODEL_REGISTRY_FOLDER, config.COMPANY_MODELS_FOLDER, config.MODEL_REGISTRY_KEEP_VERSIONS)
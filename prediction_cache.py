@@ -0,0 +1,114 @@
+# prediction_cache.py - LRU + TTL cache for prediction results
+import time
+import threading
+from collections import OrderedDict
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def canonicalize_input(record, fields, numeric_fields):
+    """
+    Build a hashable, order-independent key for a prediction input.
+    Numeric fields are normalized to float (so 30, "30" and 30.0 share an entry);
+    categorical values must be strings and are kept verbatim, as the encoder sees them.
+    Returns None if the record cannot be keyed (missing/invalid values).
+    """
+    try:
+        key = []
+        for field in fields:
+            value = record[field]
+            if field in numeric_fields:
+                value = float(value)
+                if value != value:
+                    return None
+            elif not isinstance(value, str):
+                # Non-string categories may encode differently; do not cache them
+                return None
+            key.append(value)
+        return tuple(key)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class PredictionCache:
+    """
+    Caches prediction results keyed on (model id, model version, canonical input).
+    - Least recently used entries are dropped beyond max_entries.
+    - Entries expire after ttl_seconds.
+    - A new model version never matches old keys; invalidate_model() also purges them eagerly.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    def get(self, model_id, model_version, input_key):
+        """Return the cached prediction or None"""
+        if input_key is None or self.max_entries <= 0:
+            return None
+        key = (model_id, model_version, input_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, compute_seconds = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_seconds += compute_seconds
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+        return None
+
+    def put(self, model_id, model_version, input_key, value, compute_seconds=0.0):
+        """Store a prediction along with the time it took to compute"""
+        if input_key is None or self.max_entries <= 0:
+            return
+        key = (model_id, model_version, input_key)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, compute_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_model(self, model_id):
+        """Drop every cached result for a model (e.g. after retraining)"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == model_id]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            logger.info(f"🧹 Dropped {len(stale)} cached predictions for {model_id}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'saved_compute_seconds': round(self.saved_seconds, 4)
+            }
+
+
+# Initialize prediction cache
+prediction_cache = PredictionCache(config.PREDICTION_CACHE_MAX_ENTRIES, config.PREDICTION_CACHE_TTL_SECONDS)
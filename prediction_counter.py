@@ -0,0 +1,113 @@
+# prediction_counter.py - Write-behind buffering for predictions_count updates
+import os
+import atexit
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import text
+import logging
+
+import config
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCounter:
+    """
+    Accumulates per-company prediction counts in memory and writes them in one
+    bulk UPDATE every flush_interval seconds or once flush_threshold predictions
+    are pending. Each process flushes only its own deltas with
+    predictions_count = predictions_count + delta, so counts stay exact across workers.
+    """
+
+    def __init__(self, flush_interval, flush_threshold):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = defaultdict(int)
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._owner_pid = None
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def increment(self, company_id, count=1):
+        """Record count predictions for a company"""
+        if not company_id or count <= 0:
+            return
+        with self._lock:
+            self._pending[company_id] += count
+            self._pending_total += count
+            should_flush = self._pending_total >= self.flush_threshold
+        self._ensure_thread()
+        if should_flush:
+            self._wakeup.set()
+
+    def pending(self, company_id):
+        """Predictions recorded by this worker that are not yet in the database"""
+        with self._lock:
+            return self._pending.get(company_id, 0)
+
+    def flush(self):
+        """Write all pending deltas in a single transaction"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                deltas = dict(self._pending)
+                self._pending.clear()
+                self._pending_total = 0
+
+            now = datetime.now(timezone.utc)
+            db = SessionLocal()
+            try:
+                db.execute(
+                    text(
+                        "UPDATE company_requests "
+                        "SET predictions_count = COALESCE(predictions_count, 0) + :delta, updated_at = :now "
+                        "WHERE id = :company_id"
+                    ),
+                    [{"delta": delta, "now": now, "company_id": company_id} for company_id, delta in deltas.items()]
+                )
+                db.commit()
+                self.flushes += 1
+                self.rows_flushed += len(deltas)
+                return len(deltas)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ Failed to flush prediction counts, will retry: {e}")
+                # Put the deltas back so no prediction is lost
+                with self._lock:
+                    for company_id, delta in deltas.items():
+                        self._pending[company_id] += delta
+                        self._pending_total += delta
+                return 0
+            finally:
+                db.close()
+
+    def _ensure_thread(self):
+        # Started lazily so every forked gunicorn worker runs its own flusher
+        if self._thread is not None and self._thread.is_alive() and self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._owner_pid == os.getpid():
+                return
+            self._owner_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="prediction-counter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+# Initialize prediction counter
+prediction_counter = PredictionCounter(config.PREDICTION_COUNT_FLUSH_SECONDS, config.PREDICTION_COUNT_FLUSH_THRESHOLD)
+
+# Write whatever is still buffered when the worker exits
+atexit.register(prediction_counter.flush)
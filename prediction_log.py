@@ -0,0 +1,253 @@
+# prediction_log.py - Asynchronous, sampled PredictionLog writer
+import os
+import json
+import queue
+import random
+import atexit
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from sqlalchemy import insert
+import logging
+
+import config
+from database import SessionLocal, PredictionLog
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no forked workers share the spill file, the thread locks are enough
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionLogWriter:
+    """
+    Queues prediction log rows in memory and bulk-inserts them from a background thread.
+    - Only sample_rate of predictions are logged (1.0 = all, 0 = disabled).
+    - log() never blocks: when the queue is full, rows are appended to spill_path
+      (replayed once the queue drains) or dropped if no spill file is configured.
+    - The spill file is shared by all worker processes; appends and replays take file locks
+      next to it so only one worker replays a given row.
+    """
+
+    def __init__(self, sample_rate, max_queue, batch_size, flush_interval, spill_path=None):
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._owner_pid = None
+        self.enqueued = 0
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def log(self, company_id, input_data, prediction_result, model_version=None,
+            processing_time=None, api_key_used=None, ip_address=None):
+        """Queue a prediction for logging; returns False if it was not queued"""
+        if self.sample_rate <= 0 or not company_id:
+            return False
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+
+        row = {
+            "company_id": company_id,
+            "timestamp": datetime.now(timezone.utc),
+            "input_data": input_data,
+            "prediction_result": prediction_result,
+            "model_version": model_version,
+            "processing_time": processing_time,
+            "api_key_used": api_key_used,
+            "ip_address": ip_address
+        }
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(row)
+            self.enqueued += 1
+        except queue.Full:
+            self._spill(row)
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _spill(self, row):
+        if not self.spill_path:
+            self.dropped += 1
+            return
+        try:
+            line = json.dumps({**row, "timestamp": row["timestamp"].isoformat()})
+            with self._spill_lock, self._file_lock(".lock"):
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            self.spilled += 1
+        except Exception as e:
+            self.dropped += 1
+            logger.warning(f"⚠️ Could not spill prediction log row: {e}")
+
+    def _insert(self, rows):
+        db = SessionLocal()
+        try:
+            db.execute(insert(PredictionLog), rows)
+            db.commit()
+            self.written += len(rows)
+            return True
+        except Exception as e:
+            db.rollback()
+            self.failed_batches += 1
+            logger.error(f"❌ Failed to write {len(rows)} prediction logs: {e}")
+            return False
+        finally:
+            db.close()
+
+    def flush(self):
+        """Drain the queue in batches of batch_size; returns the number of rows written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                rows = []
+                try:
+                    while len(rows) < self.batch_size:
+                        rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                if not rows:
+                    break
+                if not self._insert(rows):
+                    # Keep the rows rather than losing them to a transient DB error
+                    for row in rows:
+                        self._spill(row)
+                    return written
+                written += len(rows)
+            written += self._replay_spill()
+        return written
+
+    @contextmanager
+    def _file_lock(self, suffix, blocking=True):
+        """Exclusive lock on spill_path + suffix across processes; yields False if busy and not blocking"""
+        if fcntl is None:
+            yield True
+            return
+        with open(f"{self.spill_path}{suffix}", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _replay_spill(self):
+        """Insert rows spilled to disk once the in-memory queue has drained"""
+        if not self.spill_path or not self._queue.empty():
+            return 0
+        replay_path = f"{self.spill_path}.replay"
+        with self._file_lock(".replay.lock", blocking=False) as acquired:
+            if not acquired:
+                # Another worker is replaying
+                return 0
+            # A replay file left by a failed attempt is finished before new spills are picked up
+            if not os.path.exists(replay_path):
+                with self._spill_lock, self._file_lock(".lock"):
+                    if not os.path.exists(self.spill_path):
+                        return 0
+                    os.replace(self.spill_path, replay_path)
+            return self._replay_file(replay_path)
+
+    def _replay_file(self, replay_path):
+        written = 0
+        done = 0  # byte offset just past the last row inserted
+        offset = 0
+        batch = []
+        failed = False
+        with open(replay_path, "rb") as f:
+            for line in f:
+                offset += len(line)
+                try:
+                    row = json.loads(line)
+                    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+                except (ValueError, KeyError):
+                    continue
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    if not self._insert(batch):
+                        failed = True
+                        break
+                    written += len(batch)
+                    done = offset
+                    batch = []
+        if not failed and batch:
+            failed = not self._insert(batch)
+            if not failed:
+                written += len(batch)
+
+        if failed:
+            # Keep only the rows not inserted yet so the next attempt does not write any twice
+            if done:
+                with open(replay_path, "rb") as src, open(f"{replay_path}.tmp", "wb") as dst:
+                    src.seek(done)
+                    shutil.copyfileobj(src, dst)
+                os.replace(f"{replay_path}.tmp", replay_path)
+        else:
+            os.remove(replay_path)
+        if written:
+            logger.info(f"📝 Replayed {written} spilled prediction logs")
+        return written
+
+    def _ensure_thread(self):
+        # Started lazily so every forked gunicorn worker runs its own writer
+        if self._thread is not None and self._thread.is_alive() and self._owner_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._owner_pid == os.getpid():
+                return
+            self._owner_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Keep the writer alive; the next flush retries
+                logger.error(f"❌ Prediction log flush error: {e}")
+
+    def stats(self):
+        return {
+            'sample_rate': self.sample_rate,
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'batch_size': self.batch_size,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'spilled': self.spilled,
+            'dropped': self.dropped,
+            'failed_batches': self.failed_batches
+        }
+
+
+# Initialize prediction log writer
+prediction_log_writer = PredictionLogWriter(
+    config.PREDICTION_LOG_SAMPLE_RATE,
+    config.PREDICTION_LOG_MAX_QUEUE,
+    config.PREDICTION_LOG_BATCH_SIZE,
+    config.PREDICTION_LOG_FLUSH_SECONDS,
+    config.PREDICTION_LOG_SPILL_PATH
+)
+
+# Write whatever is still queued when the worker exits
+atexit.register(prediction_log_writer.flush)
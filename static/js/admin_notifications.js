@@ -944,7 +944,11 @@ async function approveRequest(id) {
             headers: {'Content-Type': 'application/json'}
         });
         
-        const result = await response.json();
+        let result = await response.json();
+        if (response.ok && result.status_url) {
+            // The model is trained in the background; wait for the approval job
+            result = await waitForTrainingJob(result.status_url);
+        }
         
         if (response.ok) {
             showModal('Request Approved', `
@@ -961,12 +965,6 @@ async function approveRequest(id) {
                                     ${escapeHtml(result.username)}
                                 </code>
                             </div>
-                            <div>
-                                <label style="display: block; font-size: 0.875rem; color: var(--text-muted); margin-bottom: 0.25rem;">Password</label>
-                                <code style="background: white; padding: 0.5rem 1rem; border-radius: 6px; font-size: 1.1rem; font-weight: 600; display: block; color: var(--primary);">
-                                    ${escapeHtml(result.password)}
-                                </code>
-                            </div>
                         </div>
                     </div>
                     
@@ -1284,4 +1282,4 @@ style.textContent = `
         100% { transform: rotate(360deg); }
     }
 `;
-document.head.appendChild(style);
\ No newline at end of file
+document.head.appendChild(style);
@@ -604,7 +604,11 @@ async function approveRequest(requestId) {
             headers: { 'Content-Type': 'application/json' }
         });
         
-        const result = await response.json();
+        let result = await response.json();
+        if (response.ok && result.status_url) {
+            // The model is trained in the background; wait for the approval job
+            result = await waitForTrainingJob(result.status_url);
+        }
         
         if (response.ok) {
             showModal('Request Approved', `
@@ -615,7 +619,6 @@ async function approveRequest(requestId) {
                 <p><strong>Generated Credentials:</strong></p>
                 <div class="credential-display">
                     <div class="credential-item"><label>Username:</label> <code class="credential-value">${escapeHtml(result.username)}</code></div>
-                    <div class="credential-item"><label>Password:</label> <code class="credential-value">${escapeHtml(result.password)}</code></div>
                     <div class="credential-item"><label>Model Accuracy:</label> <strong class="accuracy-highlight">${(result.model_accuracy * 100).toFixed(1)}%</strong></div>
                 </div>
                 <div class="success-footer">
@@ -1115,4 +1118,4 @@ document.addEventListener('click', function(event) {
     if (event.target === forceDeleteModal) {
         closeForceDeleteModal();
     }
-});
\ No newline at end of file
+});
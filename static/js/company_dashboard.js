@@ -590,6 +590,8 @@ async function uploadAndRetrain() {
 
     const formData = new FormData();
     formData.append('dataset', file);
+    const modeSelect = document.getElementById('retrain-mode');
+    formData.append('mode', modeSelect ? modeSelect.value : 'full');
 
     const progressContainer = document.getElementById('upload-progress');
     const progressFill = document.getElementById('progress-fill');
@@ -610,25 +612,19 @@ async function uploadAndRetrain() {
             throw new Error(err.error || 'Retraining failed');
         }
 
-        // Simulate progress
-        let progress = 0;
-        const progressInterval = setInterval(() => {
-            progress += 10;
-            progressFill.style.width = `${progress}%`;
-            progressText.textContent = `Uploading... ${progress}%`;
-            
-            if (progress >= 100) {
-                clearInterval(progressInterval);
-                progressText.textContent = 'Processing data and retraining model...';
-            }
-        }, 200);
-
-        const res = await response.json();
-        clearInterval(progressInterval);
+        // Training runs in the background; follow the job's progress
+        const queued = await response.json();
+        progressText.textContent = 'Processing data and retraining model...';
+        if (queued.status_url) {
+            await waitForTrainingJob(queued.status_url, job => {
+                progressFill.style.width = `${Math.round((job.progress || 0) * 100)}%`;
+                progressText.textContent = job.stage || 'Retraining model...';
+            });
+        }
         progressFill.style.width = '100%';
         progressText.textContent = 'Complete!';
 
-        showNotification(res.message || 'Model retrained successfully!', 'success');
+        showNotification('Model retrained successfully!', 'success');
         
         setTimeout(() => {
             progressContainer.classList.add('hidden');
@@ -878,4 +874,4 @@ function getNotificationIcon(type) {
         info: 'info-circle'
     };
     return icons[type] || 'info-circle';
-}
\ No newline at end of file
+}
@@ -284,6 +284,8 @@ class EnhancedSettings {
 
         const formData = new FormData();
         formData.append('dataset', fileInput.files[0]);
+        const modeSelect = document.getElementById('retrain-mode');
+        formData.append('mode', modeSelect ? modeSelect.value : 'full');
 
         this.showNotification('Retraining model... This may take a moment.', 'info');
 
@@ -293,10 +295,15 @@ class EnhancedSettings {
                 body: formData
             });
 
-            if (!response.ok) throw new Error('Retraining failed');
-
             const result = await response.json();
-            this.showNotification(result.message, 'success');
+            if (!response.ok) throw new Error(result.error || 'Retraining failed');
+
+            // Training runs in the background; wait for the job to finish
+            this.showNotification(result.message, 'info');
+            if (result.status_url) {
+                await waitForTrainingJob(result.status_url);
+            }
+            this.showNotification('Model retrained successfully!', 'success');
             
             // Clear input
             fileInput.value = '';
@@ -0,0 +1,14 @@
+// static/js/training_jobs.js - Shared helpers for background training jobs
+
+// Poll a background training job until it finishes; resolves with its result
+async function waitForTrainingJob(statusUrl, onProgress) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+        if (!response.ok) throw new Error(job.error || 'Could not load training status');
+        if (onProgress) onProgress(job);
+        if (job.status === 'succeeded') return job.result || {};
+        if (job.status === 'failed') throw new Error(job.error || 'Training failed');
+    }
+}
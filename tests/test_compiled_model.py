@@ -0,0 +1,98 @@
+# tests/test_compiled_model.py - The compiled NumPy forest must predict exactly like the sklearn pipeline
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from compiled_model import CompiledModel, compile_pipeline
+from feature_encoder import DERIVED_FEATURES, DERIVED_INPUTS
+
+NUMERIC = ['age', 'experience', 'experience_squared', 'age_experience_ratio']
+CATEGORICAL = ['gender', 'role', 'department']
+
+
+def with_derived(df):
+    """Add the engineered columns the way training does"""
+    df = df.copy()
+    inputs = {col: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) for col in DERIVED_INPUTS}
+    for name, (derive, _) in DERIVED_FEATURES.items():
+        df[name] = derive(inputs, len(df))
+    return df
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    """A small forest built like train_company.train_company_model builds one"""
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        'age': rng.integers(21, 60, n).astype(float),
+        'experience': rng.integers(0, 30, n).astype(float),
+        'gender': rng.choice(['Male', 'Female'], n),
+        'role': rng.choice(['Analyst', 'Engineer', 'Manager'], n),
+        'department': rng.choice(['HR', 'IT', 'Sales'], n)
+    })
+    salary = 30000 + 1500 * df['experience'] + 8000 * (df['role'] == 'Manager') + rng.normal(0, 3000, n)
+
+    preprocessor = ColumnTransformer([
+        ('num', Pipeline([('imputer', SimpleImputer(strategy='median')), ('scaler', StandardScaler())]), NUMERIC),
+        ('cat', Pipeline([
+            ('imputer', SimpleImputer(strategy='constant', fill_value='Unknown')),
+            ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
+        ]), CATEGORICAL)
+    ])
+    model = Pipeline([
+        ('preprocessor', preprocessor),
+        ('regressor', RandomForestRegressor(n_estimators=20, max_depth=12, random_state=0))
+    ])
+    return model.fit(with_derived(df)[NUMERIC + CATEGORICAL], salary)
+
+
+@pytest.fixture(scope='module')
+def compiled(pipeline):
+    return CompiledModel(*compile_pipeline(pipeline))
+
+
+@pytest.fixture
+def records():
+    return [
+        {'age': 30, 'experience': 5, 'gender': 'Male', 'role': 'Engineer', 'department': 'IT'},
+        {'age': 52.5, 'experience': 27, 'gender': 'Female', 'role': 'Manager', 'department': 'Sales'},
+        # Categories the encoder never saw
+        {'age': 41, 'experience': 12, 'gender': 'Other', 'role': 'Director', 'department': 'Legal'},
+        # Missing numerics are imputed with the training median
+        {'age': np.nan, 'experience': 8, 'gender': 'Female', 'role': 'Analyst', 'department': 'HR'},
+        {'age': 35, 'experience': np.nan, 'gender': 'Male', 'role': 'Manager', 'department': 'IT'},
+        {'age': None, 'experience': None, 'gender': 'Male', 'role': 'Analyst', 'department': 'Sales'}
+    ]
+
+
+def pipeline_predict(pipeline, records):
+    df = pd.DataFrame(records).astype({'age': float, 'experience': float})
+    return pipeline.predict(with_derived(df)[NUMERIC + CATEGORICAL])
+
+
+def test_uncompacted_artifact_matches_pipeline(compiled):
+    assert compiled.matches_pipeline
+
+
+def test_predict_columns_matches_pipeline(pipeline, compiled, records):
+    columns = {field: np.array([record[field] for record in records], dtype=object) for field in records[0]}
+    for field in DERIVED_INPUTS:
+        columns[field] = columns[field].astype(np.float64)
+    np.testing.assert_allclose(compiled.predict_columns(columns), pipeline_predict(pipeline, records), rtol=1e-10)
+
+
+def test_predict_records_matches_pipeline(pipeline, compiled, records):
+    expected = pipeline_predict(pipeline, records)
+    np.testing.assert_allclose(compiled.predict_records(records), expected, rtol=1e-10)
+    for record, value in zip(records, expected):
+        assert compiled.predict_one(record) == pytest.approx(value, rel=1e-10)
+
+
+def test_depth_limited_artifact_is_flagged(pipeline):
+    assert not CompiledModel(*compile_pipeline(pipeline, depth_limit=4)).matches_pipeline
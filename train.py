@@ -16,6 +16,8 @@ from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
 from packaging import version
 import sklearn
 import platform
+import config
+from compiled_model import save_compiled_model
 
 # Check if running on Windows
 IS_WINDOWS = platform.system() == 'Windows'
@@ -137,8 +139,8 @@ preprocessor = ColumnTransformer([
 ], remainder='drop')
 
 # --- Enhanced Model Definitions with Hyperparameter Tuning ---
-# For Windows, use n_jobs=1 to avoid multiprocessing issues
-n_jobs_value = 1 if IS_WINDOWS else -1
+# For Windows, use n_jobs=1 to avoid multiprocessing issues; elsewhere stay within the training core allowance
+n_jobs_value = 1 if IS_WINDOWS else config.TRAINING_CORES_PER_JOB
 
 base_models = {
     "RandomForest": RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=n_jobs_value),
@@ -343,6 +345,7 @@ except Exception as e:
 
 # --- Save Artifacts ---
 dump(best_pipeline, MODELS_DIR / "model_pipeline.pkl")
+compiled_path = save_compiled_model(best_pipeline, MODELS_DIR / "model_pipeline.pkl")
 metadata = {
     "numeric_cols": numeric_cols,
     "categorical_cols": categorical_cols,
@@ -356,6 +359,8 @@ with open(MODELS_DIR / "metadata.json", "w") as f:
     json.dump(metadata, f, indent=2)
 
 print("\n✅ Saved best model pipeline to: models/model_pipeline.pkl")
+if compiled_path:
+    print(f"⚡ Saved compiled inference engine to: {compiled_path}")
 print("✅ Saved options and metadata.")
 print(f"✅ Required prediction fields: {REQUIRED_COLUMNS[:-1]}")
 print("\n🎉 Enhanced training complete!")
\ No newline at end of file
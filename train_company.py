@@ -1,18 +1,26 @@
 #  train_company.py - ENHANCED VERSION
+import time
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, KFold
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
 from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
-from joblib import dump
+from joblib import dump, load
 import json
 from pathlib import Path
 import config
 import logging
+from compiled_model import save_compiled_model, load_compiled_model
+from model_compaction import compact_company_model
+from lookup_table import save_lookup_table
+from model_registry import model_registry, company_slug
+from json_cache import json_file_cache
+from feature_encoder import DERIVED_FEATURES, DERIVED_INPUTS
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -113,13 +121,114 @@ def validate_company_dataset(df):
     
     return True, "Dataset is valid and ready for training"
 
-def train_company_model(dataset_path, company_name):
-    """Enhanced company model training with better feature engineering"""
+def holdout_cross_validate(pipeline, X_train, y_train, X_test, y_test, n_folds):
+    """
+    K-fold cross-validation whose first fold is the train/test split itself: its estimator is
+    trained on X_train and scored on X_test, so it doubles as the final model. The other folds
+    split X_train into n_folds - 1 parts, each held out in turn (X_test joins their training data).
+    Returns (final_pipeline, fold_r2_scores); n_folds fits in total.
+    """
+    final_pipeline = clone(pipeline).fit(X_train, y_train)
+    scores = [r2_score(y_test, final_pipeline.predict(X_test))]
+
+    inner = KFold(n_splits=n_folds - 1, shuffle=True, random_state=42)
+    for fit_index, held_out_index in inner.split(X_train):
+        fold_pipeline = clone(pipeline).fit(
+            pd.concat([X_train.iloc[fit_index], X_test]),
+            pd.concat([y_train.iloc[fit_index], y_test])
+        )
+        scores.append(r2_score(y_train.iloc[held_out_index], fold_pipeline.predict(X_train.iloc[held_out_index])))
+    return final_pipeline, np.array(scores)
+
+def clean_training_data(df):
+    """Fill missing values, drop duplicate rows and add engineered features"""
+    df_clean = df.copy()
+    
+    # Handle missing values strategically
+    for col in df_clean.columns:
+        if df_clean[col].dtype == 'object':
+            df_clean[col] = df_clean[col].fillna('Unknown')
+        else:
+            df_clean[col] = df_clean[col].fillna(df_clean[col].median())
+    
+    # Remove duplicates
+    initial_count = len(df_clean)
+    df_clean = df_clean.drop_duplicates()
+    duplicates_removed = initial_count - len(df_clean)
+    if duplicates_removed > 0:
+        logger.info(f"🧹 Removed {duplicates_removed} duplicate records")
+    
+    # Feature engineering
+    return create_features(df_clean)
+
+def split_training_data(X, y):
+    """80/20 train-test split, stratified by department (or role) when possible"""
+    stratification_col = None
+    if 'department' in X.columns and X['department'].nunique() > 1:
+        stratification_col = X['department']
+    elif 'role' in X.columns and X['role'].nunique() > 1:
+        stratification_col = X['role']
+    
+    if stratification_col is not None:
+        try:
+            split = train_test_split(X, y, test_size=0.2, random_state=42, stratify=stratification_col)
+            logger.info("📊 Using stratified train-test split")
+            return split
+        except ValueError:
+            # A category with a single row cannot be stratified
+            pass
+    logger.info("📊 Using random train-test split")
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+def compaction_validation_split(X_train, y_train):
+    """
+    Hold a validation set out of the training split for choosing the compaction, so the
+    test split only measures the final model. Returns (X_fit, y_fit, X_val, y_val);
+    X_val/y_val are None when compaction is disabled or the validation set would be smaller
+    than config.MODEL_COMPACT_MIN_VALIDATION_ROWS.
+    """
+    if not config.MODEL_COMPACTION_ENABLED or config.MODEL_COMPACT_VALIDATION_FRACTION <= 0:
+        return X_train, y_train, None, None
+    if len(X_train) * config.MODEL_COMPACT_VALIDATION_FRACTION < config.MODEL_COMPACT_MIN_VALIDATION_ROWS:
+        logger.info(f"🗜️ Too few records ({len(X_train)}) for a compaction validation set; compaction skipped")
+        return X_train, y_train, None, None
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train, y_train, test_size=config.MODEL_COMPACT_VALIDATION_FRACTION, random_state=42
+    )
+    return X_fit, y_fit, X_val, y_val
+
+def regression_metrics(y_test, y_pred):
+    """(r2, rmse, mae, mape) of predictions on the test set"""
+    accuracy = r2_score(y_test, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    mae = mean_absolute_error(y_test, y_pred)
+    
+    # Calculate MAPE safely
+    y_test_nonzero = y_test[y_test != 0]
+    if len(y_test_nonzero) > 0:
+        y_pred_nonzero = y_pred[y_test != 0]
+        mape = np.mean(np.abs((y_test_nonzero - y_pred_nonzero) / y_test_nonzero)) * 100
+    else:
+        mape = 0.0
+    return accuracy, rmse, mae, mape
+
+def train_company_model(dataset_path, company_name, progress=None, n_jobs=None, history=None):
+    """
+    Enhanced company model training with better feature engineering.
+    progress(fraction, stage), if given, is called as training moves through its stages.
+    n_jobs caps the cores used by the forest (default: config.TRAINING_CORES_PER_JOB).
+    history, if given, is a DataFrame of earlier rows trained on together with the dataset.
+    config.TRAINING_EVAL_MODE selects how cv_accuracy is obtained ('oob' or 'cv', see config).
+    """
+    report = progress or (lambda fraction, stage: None)
     try:
         logger.info(f"🏢 Training enhanced model for company: {company_name}")
+        report(0.02, "Loading dataset")
         
         # Load and validate dataset
         df = pd.read_csv(dataset_path)
+        if history is not None:
+            df = pd.concat([df, history], ignore_index=True)
         logger.info(f"📊 Dataset loaded with {len(df)} records and {len(df.columns)} columns")
         
         # Validate dataset
@@ -134,50 +243,20 @@ def train_company_model(dataset_path, company_name):
         logger.info("📈 Dataset analysis completed")
         
         # Enhanced preprocessing
-        df_clean = df.copy()
-        
-        # Handle missing values strategically
-        for col in df_clean.columns:
-            if df_clean[col].dtype == 'object':
-                df_clean[col] = df_clean[col].fillna('Unknown')
-            else:
-                df_clean[col] = df_clean[col].fillna(df_clean[col].median())
-        
-        # Remove duplicates
-        initial_count = len(df_clean)
-        df_clean = df_clean.drop_duplicates()
-        duplicates_removed = initial_count - len(df_clean)
-        if duplicates_removed > 0:
-            logger.info(f"🧹 Removed {duplicates_removed} duplicate records")
-        
-        # Feature engineering
-        df_clean = create_features(df_clean)
+        df_clean = clean_training_data(df)
         
         # Prepare features and target
         X = df_clean.drop('salary', axis=1)
         y = df_clean['salary']
         
-        # Split data with stratification if possible
-        stratification_col = None
-        if 'department' in X.columns and X['department'].nunique() > 1:
-            stratification_col = X['department']
-        elif 'role' in X.columns and X['role'].nunique() > 1:
-            stratification_col = X['role']
-        
-        if stratification_col is not None:
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=stratification_col
-            )
-            logger.info("📊 Using stratified train-test split")
-        else:
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42
-            )
-            logger.info("📊 Using random train-test split")
+        X_train, X_test, y_train, y_test = split_training_data(X, y)
+        X_train, y_train, X_val, y_val = compaction_validation_split(X_train, y_train)
         
         logger.info(f"📈 Training set: {len(X_train)} records")
         logger.info(f"📊 Test set: {len(X_test)} records")
-        
+        if X_val is not None:
+            logger.info(f"🗜️ Compaction validation set: {len(X_val)} records")
+
         # Define preprocessing
         numeric_features = [f for f in ['age', 'experience', 'experience_squared', 'age_experience_ratio'] if f in X.columns]
         categorical_features = [f for f in ['gender', 'role', 'sector', 'company', 'department', 'education'] if f in X.columns]
@@ -203,6 +282,8 @@ def train_company_model(dataset_path, company_name):
             ]
         )
         
+        eval_mode = config.TRAINING_EVAL_MODE if config.TRAINING_EVAL_MODE in ('oob', 'cv') else 'oob'
+        
         # Enhanced Random Forest with optimized parameters
         model = RandomForestRegressor(
             n_estimators=200,
@@ -212,7 +293,8 @@ def train_company_model(dataset_path, company_name):
             max_features='sqrt',
             bootstrap=True,
             random_state=42,
-            n_jobs=-1,
+            n_jobs=n_jobs or config.TRAINING_CORES_PER_JOB,
+            oob_score=eval_mode == 'oob',
             verbose=0
         )
         
@@ -221,89 +303,370 @@ def train_company_model(dataset_path, company_name):
             ('regressor', model)
         ])
         
-        logger.info("🚀 Training enhanced model...")
-        pipeline.fit(X_train, y_train)
+        logger.info(f"🚀 Training enhanced model ({eval_mode} evaluation)...")
+        timings = {}
+        started = time.perf_counter()
+        if eval_mode == 'cv':
+            # One pass of fold fits; the fold trained on X_train is the final model
+            report(0.1, f"Cross-validating ({config.TRAINING_CV_FOLDS} folds)")
+            pipeline, cv_scores = holdout_cross_validate(
+                pipeline, X_train, y_train, X_test, y_test, max(2, config.TRAINING_CV_FOLDS)
+            )
+            model = pipeline.named_steps['regressor']
+            timings['cross_validation_seconds'] = round(time.perf_counter() - started, 3)
+        else:
+            # Single fit; out-of-bag predictions stand in for cross-validation
+            report(0.1, "Fitting model")
+            pipeline.fit(X_train, y_train)
+            cv_scores = np.array([model.oob_score_])
+            # OOB predictions are only needed for the score; keep them out of the saved model
+            del model.oob_prediction_
+            timings['fit_seconds'] = round(time.perf_counter() - started, 3)
+        report(0.6, "Evaluating model")
         
         # Comprehensive evaluation
+        evaluate_started = time.perf_counter()
         y_pred = pipeline.predict(X_test)
-        
-        accuracy = r2_score(y_test, y_pred)
-        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-        mae = mean_absolute_error(y_test, y_pred)
-        
-        # Calculate MAPE safely
-        y_test_nonzero = y_test[y_test != 0]
-        if len(y_test_nonzero) > 0:
-            y_pred_nonzero = y_pred[y_test != 0]
-            mape = np.mean(np.abs((y_test_nonzero - y_pred_nonzero) / y_test_nonzero)) * 100
-        else:
-            mape = 0.0
-        
-        # Cross-validation
-        cv_scores = cross_val_score(pipeline, X, y, cv=5, scoring='r2')
-        cv_mean = cv_scores.mean()
-        cv_std = cv_scores.std()
+        accuracy, rmse, mae, mape = regression_metrics(y_test, y_pred)
+        
+        cv_mean = float(cv_scores.mean())
+        cv_std = float(cv_scores.std())
+        timings['evaluate_seconds'] = round(time.perf_counter() - evaluate_started, 3)
+        timings['total_seconds'] = round(time.perf_counter() - started, 3)
+        fit_seconds = timings.get('fit_seconds') or timings['cross_validation_seconds'] / len(cv_scores)
+        evaluation = {
+            'mode': eval_mode,
+            'fits': len(cv_scores) if eval_mode == 'cv' else 1,
+            'cv_scores': [round(float(score), 6) for score in cv_scores] if eval_mode == 'cv' else None,
+            'cv_std': cv_std if eval_mode == 'cv' else None,
+            'timings': timings,
+            # Used to estimate what a full rebuild would cost when retraining incrementally
+            'full_fit_seconds_per_record': fit_seconds / max(1, len(X_train))
+        }
         
         logger.info(f"✅ Model trained successfully!")
         logger.info(f"📊 R² Score: {accuracy:.4f}")
         logger.info(f"📏 RMSE: {rmse:,.2f}")
         logger.info(f"📏 MAE: {mae:,.2f}")
         logger.info(f"📏 MAPE: {mape:.2f}%")
-        logger.info(f"🎯 Cross-validation R²: {cv_mean:.4f} (±{cv_std:.4f})")
+        if eval_mode == 'cv':
+            logger.info(f"🎯 Cross-validation R²: {cv_mean:.4f} (±{cv_std:.4f}) in {timings['total_seconds']:.1f}s")
+        else:
+            logger.info(f"🎯 Out-of-bag R²: {cv_mean:.4f} in {timings['total_seconds']:.1f}s")
+        
+        model_filename, version, accuracy = save_company_model(
+            pipeline, company_name, dataset_analysis, X_val, y_val, X_test, y_test,
+            metadata={
+                'model_accuracy': accuracy,
+                'cv_accuracy': cv_mean,
+                'evaluation': evaluation,
+                'rmse': rmse,
+                'mae': mae,
+                'mape': mape,
+                'features_used': {
+                    'numeric': numeric_features,
+                    'categorical': categorical_features
+                },
+                'dataset_size': len(df_clean),
+                'training_records': len(X_train),
+                'validation_records': len(X_val) if X_val is not None else 0,
+                'test_records': len(X_test)
+            },
+            manifest={
+                'cv_accuracy': cv_mean,
+                'evaluation_mode': eval_mode,
+                'dataset_size': len(df_clean),
+                'dataset_filename': Path(dataset_path).name
+            },
+            report=report
+        )
+        
+        return model_filename, accuracy
         
-        # Save model and metadata
-        model_filename = f"{company_name.replace(' ', '_').lower()}_model.pkl"
-        model_path = config.COMPANY_MODELS_FOLDER / model_filename
+    except Exception as e:
+        logger.error(f"❌ Company model training error: {e}")
+        raise e
+
+def _unseen_categories(preprocessor, X):
+    """{column: [values]} of categories in X that the fitted one-hot encoder does not know"""
+    unseen = {}
+    for name, transformer, columns in preprocessor.transformers_:
+        if name != 'cat':
+            continue
+        encoder = transformer.named_steps['onehot']
+        for column, categories in zip(columns, encoder.categories_):
+            if column not in X.columns:
+                unseen[column] = ['<missing column>']
+                continue
+            values = set(X[column].astype(str).unique()) - set(map(str, categories))
+            if values:
+                unseen[column] = sorted(values)
+    return unseen
+
+def incremental_train_company_model(dataset_path, company_name, history=None, progress=None, n_jobs=None):
+    """
+    Grow the company's active forest with trees fit on a new dataset plus a sample of history
+    (the earlier rows behind the active model), using warm_start. The fitted preprocessing is kept.
+    - Falls back to a full rebuild on new + history when there is no active model or the rows
+      contain categories the encoder has never seen.
+    - Adds config.TRAINING_INCREMENTAL_TREES trees. Trees are kept newest first, so compaction
+      (which keeps the first trees) retains the new ones, and the oldest are dropped to stay
+      within config.TRAINING_INCREMENTAL_MAX_TREES.
+    - The test and compaction validation sets are drawn from the new upload only, so neither
+      the kept trees nor the new ones have seen them; history rows are only used for fitting.
+    Returns (model_filename, accuracy, summary); summary reports the mode used, the time
+    against an estimated full rebuild and the test accuracy of the old and new served model.
+    """
+    report = progress or (lambda fraction, stage: None)
+    started = time.perf_counter()
+    history = history if history is not None and len(history) else None
+
+    def rebuild(reason):
+        logger.info(f"🔁 Incremental retrain not possible ({reason}); rebuilding the full model")
+        model_filename, accuracy = train_company_model(dataset_path, company_name, progress, n_jobs, history=history)
+        return model_filename, accuracy, {
+            'mode': 'full',
+            'reason': reason,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    logger.info(f"🏢 Incremental retrain for company: {company_name}")
+    report(0.02, "Loading dataset")
+    df = pd.read_csv(dataset_path)
+    is_valid, validation_message = validate_company_dataset(df)
+    if not is_valid:
+        raise ValueError(validation_message)
+
+    model_path = model_registry.artifact_path(company_name, '_model.pkl')
+    if not model_path.exists():
+        return rebuild("no active model")
+    pipeline = load(model_path)
+    previous = json_file_cache.load(model_registry.artifact_path(company_name, '_metadata.json')) or {}
+
+    new_clean = clean_training_data(df)
+    history_clean = clean_training_data(history) if history is not None else new_clean.iloc[0:0]
+    preprocessor = pipeline.named_steps['preprocessor']
+    unseen = _unseen_categories(preprocessor, pd.concat([new_clean, history_clean]))
+    if unseen:
+        return rebuild(f"new categories in {', '.join(sorted(unseen))}")
+
+    # Test/validation rows come from the new upload only: every earlier row may have been
+    # used to fit the kept trees, so scoring on them would flatter both models
+    X_train, X_test, y_train, y_test = split_training_data(new_clean.drop('salary', axis=1), new_clean['salary'])
+    X_train, y_train, X_val, y_val = compaction_validation_split(X_train, y_train)
+
+    # New training rows, plus earlier rows so the forest does not drift towards the latest delta only
+    sample_size = min(len(history_clean), int(len(X_train) * config.TRAINING_INCREMENTAL_HISTORY_RATIO))
+    history_sample = history_clean.sample(n=sample_size, random_state=42)
+    X_fit = pd.concat([X_train, history_sample.drop('salary', axis=1)], ignore_index=True)
+    y_fit = pd.concat([y_train, history_sample['salary']], ignore_index=True)
+
+    # Same measure as the new model's model_accuracy: the served (compiled) artifact on the test set
+    previous_compiled = load_compiled_model(model_path)
+    if previous_compiled is not None:
+        previous_pred = previous_compiled.predict_columns({str(col): X_test[col].to_numpy() for col in X_test.columns})
+    else:
+        previous_pred = pipeline.predict(X_test)
+    previous_accuracy = r2_score(y_test, previous_pred)
+
+    # Make room under the cap by dropping the oldest trees (kept at the end)
+    forest = pipeline.named_steps['regressor']
+    trees_before = len(forest.estimators_)
+    trees_added = max(1, min(config.TRAINING_INCREMENTAL_TREES, config.TRAINING_INCREMENTAL_MAX_TREES))
+    keep = max(0, min(trees_before, config.TRAINING_INCREMENTAL_MAX_TREES - trees_added))
+    forest.estimators_ = forest.estimators_[:keep]
+    forest.set_params(
+        warm_start=True, n_estimators=keep + trees_added, oob_score=False,
+        n_jobs=n_jobs or config.TRAINING_CORES_PER_JOB
+    )
+
+    report(0.1, f"Adding {trees_added} trees")
+    fit_started = time.perf_counter()
+    forest.fit(preprocessor.transform(X_fit), y_fit)
+    forest.estimators_ = forest.estimators_[keep:] + forest.estimators_[:keep]
+    forest.set_params(warm_start=False)
+    fit_seconds = time.perf_counter() - fit_started
+
+    report(0.6, "Evaluating model")
+    y_pred = pipeline.predict(X_test)
+    accuracy, rmse, mae, mape = regression_metrics(y_test, y_pred)
+
+    # A full rebuild would fit 200 trees on 80% of new + all earlier rows
+    per_record = (previous.get('evaluation') or {}).get('full_fit_seconds_per_record')
+    full_records = int((len(new_clean) + len(history_clean)) * 0.8)
+    estimated_full_seconds = per_record * full_records if per_record else None
+    summary = {
+        'mode': 'incremental',
+        'trees_before': trees_before,
+        'trees_added': trees_added,
+        'trees_dropped': trees_before - keep,
+        'trees_total': len(forest.estimators_),
+        'new_records': len(new_clean),
+        'history_records': len(history_clean),
+        'history_records_sampled': sample_size,
+        'previous_accuracy': previous_accuracy,
+        'pipeline_accuracy': accuracy,
+        'fit_seconds': round(fit_seconds, 3),
+        'estimated_full_seconds': round(estimated_full_seconds, 3) if estimated_full_seconds else None,
+        'seconds_saved': round(estimated_full_seconds - fit_seconds, 3) if estimated_full_seconds else None
+    }
+    logger.info(
+        f"🌲 Added {trees_added} trees ({trees_before - keep} dropped) in {fit_seconds:.1f}s; "
+        f"test R² of the served model was {previous_accuracy:.4f}, new pipeline {accuracy:.4f}"
+    )
+
+    all_rows = pd.concat([df, history], ignore_index=True) if history is not None else df
+    model_filename, version, accuracy = save_company_model(
+        pipeline, company_name, analyze_dataset(all_rows), X_val, y_val, X_test, y_test,
+        metadata={
+            'model_accuracy': accuracy,
+            'cv_accuracy': None,
+            'evaluation': {
+                'mode': 'incremental',
+                'fits': 1,
+                'timings': {'fit_seconds': round(fit_seconds, 3), 'total_seconds': round(time.perf_counter() - started, 3)},
+                'full_fit_seconds_per_record': per_record
+            },
+            'incremental': summary,
+            'rmse': rmse,
+            'mae': mae,
+            'mape': mape,
+            'features_used': previous.get('features_used'),
+            'dataset_size': len(new_clean) + len(history_clean),
+            'training_records': len(X_fit),
+            'validation_records': len(X_val) if X_val is not None else 0,
+            'test_records': len(X_test)
+        },
+        manifest={
+            'evaluation_mode': 'incremental',
+            'dataset_size': len(new_clean) + len(history_clean),
+            'dataset_filename': Path(dataset_path).name
+        },
+        report=report
+    )
+    # model_accuracy in the metadata is this served accuracy, comparable to previous_accuracy
+    summary['accuracy'] = accuracy
+    summary['accuracy_change'] = accuracy - previous_accuracy
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return model_filename, accuracy, summary
+
+def save_company_model(pipeline, company_name, dataset_analysis, X_val, y_val, X_test, y_test, metadata, manifest, report):
+    """
+    Write a trained pipeline and its artifacts (compiled model, compaction, lookup table,
+    metadata, options) into a staging directory and publish it as the company's active
+    version. metadata holds the run's metrics; manifest is stored with the version.
+    Compaction is chosen on X_val/y_val (skipped if None); the stored model_accuracy, rmse,
+    mae and mape are then measured on X_test with the artifact that serves predictions.
+    Returns (model_filename, version, served_accuracy).
+    """
+    staging_dir = None
+    try:
+        # Save model and metadata into a staging directory; serving switches over on publish
+        report(0.8, "Saving model")
+        slug = company_slug(company_name)
+        model_filename = f"{slug}_model.pkl"
+        staging_dir = model_registry.staging_dir(slug)
+        model_path = staging_dir / model_filename
         dump(pipeline, model_path)
+        model = pipeline.named_steps['regressor']
+        
+        # Pure NumPy inference artifact next to the .pkl
+        compiled_path = save_compiled_model(pipeline, model_path)
+        
+        # Shrink trees/depth where validation R² does not move, then store compactly
+        compaction = None
+        if config.MODEL_COMPACTION_ENABLED and compiled_path and X_val is not None:
+            report(0.85, "Compacting model")
+            try:
+                compaction = compact_company_model(
+                    pipeline, X_val, y_val, model_path,
+                    max_r2_drop=config.MODEL_COMPACT_MAX_R2_DROP,
+                    compress_level=config.MODEL_COMPACT_COMPRESS_LEVEL
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Model compaction skipped: {e}")
+        
+        # Frontend options also define the grid for the optional lookup table
+        options = generate_frontend_options(dataset_analysis)
+        report(0.9, "Building lookup table")
+        lookup_path = save_lookup_table(
+            pipeline, options, model_path, config.LOOKUP_TABLE_MAX_CELLS,
+            compiled=load_compiled_model(model_path) if compaction else None
+        )
+        
+        # Measure what is served: the compiled artifact (pruned and depth-limited by compaction)
+        # answers predictions; the sklearn pipeline only when no compiled artifact exists
+        served = load_compiled_model(model_path)
+        if served is not None:
+            y_pred = served.predict_columns({str(col): X_test[col].to_numpy() for col in X_test.columns})
+        else:
+            y_pred = pipeline.predict(X_test)
+        accuracy, rmse, mae, mape = regression_metrics(y_test, y_pred)
+        logger.info(f"📊 Served model R² on the test set: {accuracy:.4f} (trained pipeline {metadata.get('model_accuracy', accuracy):.4f})")
         
-        # Enhanced metadata with options
+        # Summary metadata (metrics, features, sizes) read by the dashboard endpoints;
+        # per-category analysis, model parameters and the compaction report go to the detail file
+        detail_filename = f"{slug}_metadata_detail.json"
         metadata = {
             'company_name': company_name,
+            **metadata,
+            'pipeline_accuracy': metadata.get('model_accuracy'),
             'model_accuracy': accuracy,
-            'cv_accuracy': cv_mean,
             'rmse': rmse,
             'mae': mae,
             'mape': mape,
-            'features_used': {
-                'numeric': numeric_features,
-                'categorical': categorical_features
-            },
+            'category_counts': {col: len(values) for col, values in options.get('categorical', {}).items()},
+            'n_estimators': model.n_estimators,
+            'compiled_model': compiled_path.name if compiled_path else None,
+            'lookup_table': lookup_path.name if lookup_path else None,
+            'compaction': {
+                'n_trees': compaction['n_trees']['after'],
+                'depth_limit': compaction['depth_limit'],
+                'accuracy_delta': compaction['accuracy_delta']
+            } if compaction else None,
+            'detail': detail_filename,
+            'training_date': pd.Timestamp.now().isoformat()
+        }
+        metadata_detail = {
+            'company_name': company_name,
             'dataset_analysis': dataset_analysis,
-            'dataset_size': len(df_clean),
-            'training_records': len(X_train),
-            'test_records': len(X_test),
             'model_parameters': model.get_params(),
-            'training_date': pd.Timestamp.now().isoformat()
+            'compaction': compaction
         }
         
-        metadata_path = config.COMPANY_MODELS_FOLDER / f"{company_name.replace(' ', '_').lower()}_metadata.json"
+        metadata_path = staging_dir / f"{slug}_metadata.json"
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2, default=str)
+        with open(staging_dir / detail_filename, 'w') as f:
+            json.dump(metadata_detail, f, indent=2, default=str)
         
         # Save options for frontend
-        options = generate_frontend_options(dataset_analysis)
-        options_path = config.COMPANY_MODELS_FOLDER / f"{company_name.replace(' ', '_').lower()}_options.json"
+        options_path = staging_dir / f"{slug}_options.json"
         with open(options_path, 'w') as f:
             json.dump(options, f, indent=2)
         
-        logger.info(f"💾 Model saved to: {model_path}")
-        logger.info(f"📄 Metadata saved to: {metadata_path}")
-        logger.info(f"🎛️  Frontend options saved to: {options_path}")
+        # Atomically make this run the company's active model version
+        report(0.97, "Publishing model version")
+        version = model_registry.publish(slug, staging_dir, dict(manifest, model_accuracy=accuracy))
+        staging_dir = None
         
-        return model_filename, accuracy
+        logger.info(f"💾 Model saved as version {version}: {model_registry.resolve(model_filename)}")
         
-    except Exception as e:
-        logger.error(f"❌ Company model training error: {e}")
-        raise e
+        return model_filename, version, accuracy
+        
+    except Exception:
+        model_registry.discard(staging_dir)
+        raise
 
 def create_features(df):
     """Create enhanced features for better model performance"""
     df = df.copy()
     
-    # Basic feature engineering
+    # Basic feature engineering, shared with the serving paths
     if 'experience' in df.columns and 'age' in df.columns:
-        df['experience_squared'] = df['experience'] ** 2
-        df['age_experience_ratio'] = df['age'] / (df['experience'] + 1)  # +1 to avoid division by zero
+        inputs = {col: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) for col in DERIVED_INPUTS}
+        for name, (derive, _) in DERIVED_FEATURES.items():
+            df[name] = derive(inputs, len(df))
     
     # Salary percentiles for potential benchmarking
     if 'salary' in df.columns:
@@ -378,11 +741,8 @@ def generate_frontend_options(dataset_analysis):
 def get_company_options(company_name):
     """Retrieve options for a specific company"""
     try:
-        options_path = config.COMPANY_MODELS_FOLDER / f"{company_name.replace(' ', '_').lower()}_options.json"
-        if options_path.exists():
-            with open(options_path, 'r') as f:
-                return json.load(f)
-        return None
+        # Shared parsed copy; callers must not modify it
+        return json_file_cache.load(model_registry.artifact_path(company_name, "_options.json"))
     except Exception as e:
         logger.error(f"Error loading options for {company_name}: {e}")
         return None
\ No newline at end of file
@@ -0,0 +1,151 @@
+# training_executor.py - Runs company model training in separate, core-limited processes
+#
+# The web process calls TrainingExecutor.train(); each job is started as
+#   python training_executor.py --job-id N --dataset PATH --company NAME --cores K --result-path FILE
+#                               [--incremental --history PATH ...]
+# with BLAS/OpenMP thread pools and the forest's n_jobs capped at K cores.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import threading
+from pathlib import Path
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Thread pool variables honoured by numpy/scipy/sklearn native code
+THREAD_LIMIT_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+class TrainingExecutor:
+    """
+    Runs train_company.train_company_model for one job in a child process.
+    The caller (a training worker thread) has already reserved `cores` from the global
+    budget when claiming the job; the child is limited to that many threads and runs
+    at TRAINING_NICE so request handling keeps priority on the reserved cores.
+    Progress is written to the job row by the child; the result comes back as JSON.
+    """
+
+    def __init__(self):
+        self._running = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def train(self, job_id, dataset_path, company_name, cores, incremental=False, history_paths=()):
+        """
+        Train in a subprocess; returns the result dict (model_filename, accuracy and, for
+        incremental runs, summary) or raises RuntimeError
+        """
+        fd, result_path = tempfile.mkstemp(prefix=f"training-{job_id}-", suffix=".json")
+        os.close(fd)
+        env = dict(os.environ, **{name: str(cores) for name in THREAD_LIMIT_VARIABLES})
+        command = [
+            sys.executable, str(Path(__file__).resolve()),
+            "--job-id", str(job_id), "--dataset", str(dataset_path), "--company", company_name,
+            "--cores", str(cores), "--result-path", result_path
+        ]
+        if incremental:
+            command.append("--incremental")
+            if history_paths:
+                command += ["--history", *map(str, history_paths)]
+        started = time.monotonic()
+        try:
+            process = subprocess.Popen(command, cwd=str(config.BASE_DIR), env=env)
+            with self._lock:
+                self._running[job_id] = {
+                    "job_id": job_id, "pid": process.pid, "company_name": company_name,
+                    "cores": cores, "started": started
+                }
+            returncode = process.wait()
+
+            try:
+                with open(result_path, "r") as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                result = {}
+            if returncode != 0 or "error" in result or "model_filename" not in result:
+                self.failed += 1
+                raise RuntimeError(result.get("error") or f"Training process exited with code {returncode}")
+            self.completed += 1
+            logger.info(f"🏁 Training job {job_id} finished in {time.monotonic() - started:.1f}s on {cores} core(s)")
+            return result
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            Path(result_path).unlink(missing_ok=True)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            running = [
+                {**{key: value for key, value in entry.items() if key != "started"}, "seconds": round(now - entry["started"], 1)}
+                for entry in self._running.values()
+            ]
+        return {
+            'processes': running,
+            'cores_in_use': sum(entry["cores"] for entry in running),
+            'completed': self.completed,
+            'failed': self.failed
+        }
+
+
+# Initialize training executor
+training_executor = TrainingExecutor()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train one company model inside a core-limited process")
+    parser.add_argument('--job-id', type=int, required=True)
+    parser.add_argument('--dataset', required=True)
+    parser.add_argument('--company', required=True)
+    parser.add_argument('--cores', type=int, required=True)
+    parser.add_argument('--result-path', required=True)
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--history', nargs='*', default=[])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if config.TRAINING_NICE:
+        try:
+            os.nice(config.TRAINING_NICE)
+        except OSError:
+            pass
+
+    import pandas as pd
+    from threadpoolctl import threadpool_limits
+    import train_company
+    from training_jobs import training_jobs
+
+    def progress(fraction, stage):
+        training_jobs.report_progress(args.job_id, fraction, stage)
+
+    try:
+        with threadpool_limits(limits=args.cores):
+            if args.incremental:
+                history = pd.concat([pd.read_csv(path) for path in args.history], ignore_index=True) if args.history else None
+                model_filename, accuracy, summary = train_company.incremental_train_company_model(
+                    args.dataset, args.company, history=history, progress=progress, n_jobs=args.cores
+                )
+                result = {"model_filename": model_filename, "accuracy": accuracy, "summary": summary}
+            else:
+                model_filename, accuracy = train_company.train_company_model(
+                    args.dataset, args.company, progress=progress, n_jobs=args.cores
+                )
+                result = {"model_filename": model_filename, "accuracy": accuracy}
+    except Exception as e:
+        result = {"error": str(e)}
+
+    with open(args.result_path, "w") as f:
+        json.dump(result, f)
+    sys.exit(1 if "error" in result else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+# training_jobs.py - Persistent queue of model training jobs run by background worker threads
+import os
+import socket
+import threading
+from datetime import datetime, timezone, timedelta
+import logging
+
+from sqlalchemy import func
+
+import config
+from database import SessionLocal, TrainingJob
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class TrainingJobQueue:
+    """
+    Training jobs are rows in training_jobs, so they survive restarts and can be claimed
+    by any worker process:
+    - enqueue() inserts a 'queued' row; the HTTP request returns right away.
+    - Worker threads claim the oldest queued job with a conditional UPDATE (only one
+      process wins), run the handler registered for its job_type and store the result.
+    - A claim also reserves cores_per_job cores; it only succeeds while the cores held by
+      all running jobs (in every process) stay within cpu_budget, otherwise the job waits.
+    - A running job's heartbeat is refreshed while its handler runs. Jobs whose heartbeat
+      is older than stale_seconds (the process died) are requeued, or failed once they
+      have been attempted max_attempts times.
+    Handlers are called as handler(job_id, payload, report, cores) and return a JSON-able
+    result; report(progress, stage) records progress between 0 and 1.
+    """
+
+    def __init__(self, workers, poll_seconds, stale_seconds, max_attempts, cpu_budget, cores_per_job):
+        self.workers = workers
+        self.cpu_budget = cpu_budget
+        self.cores_per_job = max(1, min(cores_per_job, cpu_budget))
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+
+    def register(self, job_type, handler):
+        self._handlers[job_type] = handler
+
+    def enqueue(self, db, company_id, job_type, payload=None, requested_by=None):
+        """Insert a queued job (committed) and wake the local workers"""
+        job = TrainingJob(
+            company_id=company_id,
+            job_type=job_type,
+            status="queued",
+            progress=0.0,
+            stage="Queued",
+            payload=payload,
+            requested_by=requested_by,
+            attempts=0
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._wakeup.set()
+        logger.info(f"🗂️ Queued {job_type} job {job.id} for company {company_id}")
+        return job
+
+    def active_job(self, db, company_id):
+        """The company's queued or running job, if any"""
+        return db.query(TrainingJob).filter(
+            TrainingJob.company_id == company_id,
+            TrainingJob.status.in_(ACTIVE_STATUSES)
+        ).order_by(TrainingJob.id.desc()).first()
+
+    def start(self):
+        """Start the worker threads of this process (no-op if already running or workers is 0)"""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"training-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"🏭 Started {self.workers} training worker(s) in {self.worker_id}")
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                self.recover_stale()
+                claimed = self._claim()
+                if claimed is None:
+                    self._wakeup.wait(self.poll_seconds)
+                    self._wakeup.clear()
+                    continue
+                self._execute(*claimed)
+            except Exception as e:
+                logger.error(f"❌ Training worker error: {e}")
+                self._wakeup.wait(self.poll_seconds)
+
+    def _cores_in_use_query(self, db):
+        return db.query(func.coalesce(func.sum(TrainingJob.cores), 0)).filter(
+            TrainingJob.status == "running"
+        ).scalar_subquery()
+
+    def _claim(self):
+        """
+        Atomically move the oldest queued job to running if its cores fit the budget;
+        returns (job_id, cores) or None
+        """
+        db = SessionLocal()
+        try:
+            candidates = db.query(TrainingJob.id).filter(
+                TrainingJob.status == "queued"
+            ).order_by(TrainingJob.id).limit(5).all()
+            now = datetime.now(timezone.utc)
+            for (job_id,) in candidates:
+                # Budget check and claim in one statement, so concurrent claims cannot oversubscribe
+                claimed = db.query(TrainingJob).filter(
+                    TrainingJob.id == job_id, TrainingJob.status == "queued",
+                    self._cores_in_use_query(db) + self.cores_per_job <= self.cpu_budget
+                ).update({
+                    TrainingJob.status: "running",
+                    TrainingJob.worker_id: self.worker_id,
+                    TrainingJob.attempts: TrainingJob.attempts + 1,
+                    TrainingJob.started_at: now,
+                    TrainingJob.heartbeat_at: now,
+                    TrainingJob.cores: self.cores_per_job,
+                    TrainingJob.stage: "Starting"
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return job_id, self.cores_per_job
+            return None
+        finally:
+            db.close()
+
+    def _update(self, job_id, **values):
+        db = SessionLocal()
+        try:
+            db.query(TrainingJob).filter(TrainingJob.id == job_id).update(
+                {getattr(TrainingJob, key): value for key, value in values.items()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def report_progress(self, job_id, progress, stage):
+        """Record a running job's progress (also called from training processes)"""
+        self._update(job_id, progress=round(float(progress), 4), stage=stage, heartbeat_at=datetime.now(timezone.utc))
+
+    def _execute(self, job_id, cores):
+        db = SessionLocal()
+        try:
+            job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+            job_type, payload = job.job_type, job.payload or {}
+        finally:
+            db.close()
+
+        handler = self._handlers.get(job_type)
+        if handler is None:
+            self._finish(job_id, error=f"No handler for job type '{job_type}'")
+            return
+
+        # Keep the heartbeat fresh while the handler runs, even during a long fit
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(max(1.0, self.stale_seconds / 4)):
+                try:
+                    self._update(job_id, heartbeat_at=datetime.now(timezone.utc))
+                except Exception as e:
+                    logger.warning(f"⚠️ Heartbeat failed for training job {job_id}: {e}")
+
+        beat = threading.Thread(target=heartbeat, name=f"training-heartbeat-{job_id}", daemon=True)
+        beat.start()
+        logger.info(f"🏋️ Running {job_type} job {job_id}")
+        try:
+            result = handler(job_id, payload, lambda progress, stage: self.report_progress(job_id, progress, stage), cores)
+            self._finish(job_id, result=result)
+        except Exception as e:
+            logger.error(f"❌ Training job {job_id} failed: {e}")
+            self._finish(job_id, error=str(e))
+        finally:
+            done.set()
+
+    def _finish(self, job_id, result=None, error=None):
+        values = {
+            "status": "failed" if error else "succeeded",
+            "cores": 0,
+            "finished_at": datetime.now(timezone.utc),
+            "heartbeat_at": datetime.now(timezone.utc),
+            "error": error
+        }
+        if error:
+            values["stage"] = "Failed"
+            self.failed += 1
+        else:
+            values.update(result=result, progress=1.0, stage="Completed")
+            self.completed += 1
+        self._update(job_id, **values)
+
+    def recover_stale(self):
+        """Requeue (or fail) running jobs whose worker stopped sending heartbeats"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_seconds)
+        db = SessionLocal()
+        try:
+            stale = db.query(TrainingJob).filter(
+                TrainingJob.status == "running", TrainingJob.heartbeat_at < cutoff
+            ).all()
+            for job in stale:
+                if (job.attempts or 0) >= self.max_attempts:
+                    job.status = "failed"
+                    job.stage = "Failed"
+                    job.cores = 0
+                    job.error = f"Worker {job.worker_id} stopped responding ({job.attempts} attempts)"
+                    job.finished_at = datetime.now(timezone.utc)
+                else:
+                    job.status = "queued"
+                    job.stage = "Requeued after worker loss"
+                    job.cores = 0
+                    job.progress = 0.0
+                    self.requeued += 1
+                logger.warning(f"⚠️ Training job {job.id} lost its worker {job.worker_id}; now {job.status}")
+            if stale:
+                db.commit()
+        finally:
+            db.close()
+
+    def stats(self):
+        db = SessionLocal()
+        try:
+            counts = {
+                status: db.query(TrainingJob).filter(TrainingJob.status == status).count()
+                for status in ("queued", "running", "succeeded", "failed")
+            }
+            allocations = [
+                {'job_id': job.id, 'company_id': job.company_id, 'job_type': job.job_type,
+                 'cores': job.cores, 'worker_id': job.worker_id, 'progress': job.progress, 'stage': job.stage}
+                for job in db.query(TrainingJob).filter(TrainingJob.status == "running").order_by(TrainingJob.id)
+            ]
+        finally:
+            db.close()
+        return {
+            'worker_id': self.worker_id,
+            'workers': len(self._threads),
+            'cpu_budget': self.cpu_budget,
+            'cores_per_job': self.cores_per_job,
+            'cores_in_use': sum(allocation['cores'] or 0 for allocation in allocations),
+            'allocations': allocations,
+            'jobs': counts,
+            'completed': self.completed,
+            'failed': self.failed,
+            'requeued': self.requeued
+        }
+
+
+# Initialize training job queue
+training_jobs = TrainingJobQueue(
+    config.TRAINING_WORKERS,
+    config.TRAINING_JOB_POLL_SECONDS,
+    config.TRAINING_JOB_STALE_SECONDS,
+    config.TRAINING_JOB_MAX_ATTEMPTS,
+    config.TRAINING_CPU_BUDGET,
+    config.TRAINING_CORES_PER_JOB
+)
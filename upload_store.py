@@ -0,0 +1,230 @@
+# upload_store.py - Content-addressed storage for uploaded training datasets
+#
+# uploads/blobs/{sha256}.csv   prepared (column-mapped) dataset, shared by every upload with the same content
+# uploads/blobs/{sha256}.json  outcome of validating/preparing a raw upload with that hash
+# CompanyDataset rows (and queued/running training jobs) reference blobs through file_hash;
+# unreferenced blobs are deleted once idle for config.UPLOAD_BLOB_GRACE_SECONDS.
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+import logging
+
+from sqlalchemy import cast, String
+
+import config
+from database import CompanyDataset, TrainingJob
+
+logger = logging.getLogger(__name__)
+
+BLOB_FOLDER = "blobs"
+HASH_CHUNK_BYTES = 1024 * 1024
+TOMBSTONE_PREFIX = ".deleting-"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadStore:
+    """
+    Stores datasets by SHA-256 of their content.
+    - stage() streams an upload to a temp file while hashing it.
+    - processed()/record() keep the outcome of successfully preparing a raw upload, so a
+      byte-identical resubmission skips validation and preparation and points at the existing
+      blob. Failed validations are not stored (the validator may change, the file is small).
+    - release()/sweep() delete blobs that nothing references. Deletion never relies on a lock:
+      every reuse of a blob refreshes its mtime, only blobs idle for grace_seconds are
+      collected, and a collected blob is first renamed to a tombstone and restored if it was
+      touched in the meantime, so uploads in other worker processes keep their blob.
+    Blob names are relative to upload_folder, so they can be stored in
+    CompanyRequest.dataset_filename / CompanyDataset.file_path like plain uploads.
+    """
+
+    def __init__(self, upload_folder, grace_seconds):
+        self.upload_folder = Path(upload_folder)
+        self.blob_folder = self.upload_folder / BLOB_FOLDER
+        self.grace_seconds = grace_seconds
+        self._lock = threading.Lock()
+        self.dedup_hits = 0
+        self.collected = 0
+
+    def is_blob(self, name):
+        """True for dataset filenames that point into the store (not plain per-upload files)"""
+        return bool(name) and name.startswith(f"{BLOB_FOLDER}/")
+
+    def blob_name(self, file_hash):
+        return f"{BLOB_FOLDER}/{file_hash}.csv"
+
+    def blob_path(self, file_hash):
+        return self.blob_folder / f"{file_hash}.csv"
+
+    def _result_path(self, raw_hash):
+        return self.blob_folder / f"{raw_hash}.json"
+
+    def stage(self, file_storage):
+        """Save an uploaded file to a temp path; returns (temp_path, sha256, size)"""
+        self.blob_folder.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=".upload-", suffix=".csv", dir=self.blob_folder)
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, "wb") as f:
+            for block in iter(lambda: file_storage.stream.read(HASH_CHUNK_BYTES), b""):
+                digest.update(block)
+                f.write(block)
+                size += len(block)
+        return Path(temp_name), digest.hexdigest(), size
+
+    def temp_path(self):
+        """A fresh temp file path inside the blob folder (same filesystem as the blobs)"""
+        self.blob_folder.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=".prepared-", suffix=".csv", dir=self.blob_folder)
+        os.close(fd)
+        return Path(temp_name)
+
+    def processed(self, raw_hash):
+        """
+        The stored outcome for a raw upload hash, or None if it was never processed
+        (or its prepared blob has since been deleted).
+        """
+        try:
+            with open(self._result_path(raw_hash), "r") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if result.get("error") or not self._touch(result.get("file_hash")):
+            # Failures are re-validated; a collected blob is prepared again
+            return None
+        self.dedup_hits += 1
+        return result
+
+    def _touch(self, file_hash):
+        """Mark a blob as in use (refreshes its idle time); False if it does not exist"""
+        if not file_hash:
+            return False
+        try:
+            os.utime(self.blob_path(file_hash))
+            return True
+        except OSError:
+            return False
+
+    def record(self, raw_hash, result, prepared_path=None):
+        """
+        Store the outcome of successfully processing a raw upload. The prepared file is
+        moved into the store under its own hash (or dropped if that blob already exists),
+        and result['file_hash'] is set. Returns the result.
+        """
+        if prepared_path is not None:
+            file_hash = file_sha256(prepared_path)
+            target = self.blob_path(file_hash)
+            if self._touch(file_hash):
+                Path(prepared_path).unlink(missing_ok=True)
+            else:
+                os.replace(prepared_path, target)
+            result = dict(result, file_hash=file_hash, file_size=target.stat().st_size)
+
+        result_path = self._result_path(raw_hash)
+        temp_result = result_path.with_name(result_path.name + ".tmp")
+        with open(temp_result, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+        os.replace(temp_result, result_path)
+        return result
+
+    def references(self, db, file_hash):
+        """Dataset rows plus queued/running training jobs (whose payload holds the upload) using a blob"""
+        datasets = db.query(CompanyDataset).filter(CompanyDataset.file_hash == file_hash).count()
+        jobs = db.query(TrainingJob).filter(
+            TrainingJob.status.in_(("queued", "running")),
+            cast(TrainingJob.payload, String).contains(file_hash)
+        ).count()
+        return datasets + jobs
+
+    def _idle(self, path):
+        try:
+            return time.time() - path.stat().st_mtime >= self.grace_seconds
+        except OSError:
+            return False
+
+    def release(self, db, file_hash):
+        """
+        Delete a blob (and the stored outcomes that point at it) if nothing references it and
+        it has been idle for grace_seconds; otherwise it is left for a later sweep().
+        Call after the referencing rows were deleted and committed. Returns True if removed.
+        """
+        path = self.blob_path(file_hash) if file_hash else None
+        if path is None or not self._idle(path) or self.references(db, file_hash) > 0:
+            return False
+
+        # Move the blob out of reach first; an upload touching it before the move shows up as a
+        # fresh mtime on the tombstone and gets it back, one touching it after finds no blob
+        tombstone = path.with_name(f"{TOMBSTONE_PREFIX}{path.name}")
+        try:
+            os.rename(path, tombstone)
+        except OSError:
+            return False
+        if not self._idle(tombstone):
+            if path.exists():
+                tombstone.unlink(missing_ok=True)
+            else:
+                os.rename(tombstone, path)
+            return False
+        tombstone.unlink(missing_ok=True)
+
+        for result_path in self.blob_folder.glob("*.json"):
+            try:
+                with open(result_path, "r") as f:
+                    if json.load(f).get("file_hash") == file_hash:
+                        result_path.unlink()
+            except (OSError, ValueError):
+                continue
+        with self._lock:
+            self.collected += 1
+        logger.info(f"🗑️ Released dataset blob {file_hash[:12]}")
+        return True
+
+    def sweep(self, db):
+        """Release every unreferenced idle blob and drop stale temp/tombstone files; returns the number removed"""
+        if not self.blob_folder.exists():
+            return 0
+        removed = 0
+        for path in self.blob_folder.glob("*.csv"):
+            if path.name.startswith("."):
+                # Temp files of crashed uploads and tombstones of interrupted releases
+                try:
+                    if time.time() - path.stat().st_mtime >= 24 * 3600:
+                        path.unlink(missing_ok=True)
+                except OSError:
+                    pass
+                continue
+            if self.release(db, path.stem):
+                removed += 1
+        for result_path in self.blob_folder.glob("*.json"):
+            # Outcomes of failed validations stored before failures stopped being recorded
+            try:
+                with open(result_path, "r") as f:
+                    if json.load(f).get("error"):
+                        result_path.unlink()
+            except (OSError, ValueError):
+                continue
+        return removed
+
+    def stats(self):
+        blobs = [p for p in self.blob_folder.glob("*.csv") if not p.name.startswith(".")] if self.blob_folder.exists() else []
+        return {
+            'blobs': len(blobs),
+            'blob_bytes': sum(p.stat().st_size for p in blobs),
+            'dedup_hits': self.dedup_hits,
+            'collected': self.collected,
+            'grace_seconds': self.grace_seconds
+        }
+
+
+# Initialize upload store
+upload_store = UploadStore(config.UPLOAD_FOLDER, config.UPLOAD_BLOB_GRACE_SECONDS)
@@ -0,0 +1,109 @@
+# warmup.py - Background model preloading after worker start
+import time
+import threading
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_record(options):
+    """
+    Build a representative prediction input from an options.json dict:
+    the first value of every categorical field and the median of age/experience.
+    """
+    record = {"age": 30.0, "experience": 5.0}
+    for field, meta in (options or {}).get("numeric_meta", {}).items():
+        if isinstance(meta, dict) and meta.get("median") is not None:
+            record[field] = float(meta["median"])
+    for field, values in (options or {}).get("categorical", {}).items():
+        if values:
+            record[field] = str(values[0])
+    return record
+
+
+class ModelWarmup:
+    """
+    Runs a list of named warm-up tasks (load a model, push a dummy prediction through it)
+    on a background thread and tracks their progress for the readiness endpoint.
+    Task failures are recorded and do not stop the remaining tasks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.status = "idle"  # idle, running, ready
+        self.started_at = None
+        self.finished_at = None
+        self.tasks = []
+
+    def start(self, plan):
+        """
+        Start warming up in the background.
+        plan() is called on the warm-up thread and returns a list of (name, callable);
+        this lets the plan itself (e.g. a DB query for active companies) run off the boot path.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self.status = "running"
+            self.started_at = datetime.now(timezone.utc)
+            self.finished_at = None
+            self.tasks = []
+            self._thread = threading.Thread(target=self._run, args=(plan,), name="model-warmup", daemon=True)
+            self._thread.start()
+        return True
+
+    def _run(self, plan):
+        started = time.perf_counter()
+        try:
+            steps = list(plan())
+        except Exception as e:
+            logger.error(f"❌ Could not plan model warm-up: {e}")
+            steps = []
+
+        with self._lock:
+            self.tasks = [{"name": name, "status": "pending", "seconds": None, "error": None} for name, _ in steps]
+
+        for task, (name, func) in zip(self.tasks, steps):
+            task["status"] = "running"
+            task_started = time.perf_counter()
+            try:
+                func()
+                task["status"] = "done"
+            except Exception as e:
+                task["status"] = "failed"
+                task["error"] = str(e)
+                logger.warning(f"⚠️ Warm-up task '{name}' failed: {e}")
+            task["seconds"] = round(time.perf_counter() - task_started, 3)
+
+        with self._lock:
+            self.status = "ready"
+            self.finished_at = datetime.now(timezone.utc)
+        failed = sum(1 for task in self.tasks if task["status"] == "failed")
+        logger.info(f"🔥 Model warm-up finished in {time.perf_counter() - started:.1f}s "
+                    f"({len(self.tasks) - failed} ok, {failed} failed)")
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def progress(self):
+        with self._lock:
+            tasks = [dict(task) for task in self.tasks]
+            status = self.status
+        completed = sum(1 for task in tasks if task["status"] in ("done", "failed"))
+        return {
+            "status": status,
+            "ready": status == "ready",
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "total": len(tasks),
+            "completed": completed,
+            "failed": sum(1 for task in tasks if task["status"] == "failed"),
+            "tasks": tasks
+        }
+
+
+# Initialize model warm-up tracker
+model_warmup = ModelWarmup()